@@ -7,30 +7,70 @@ import csv
 import json
 from collections import defaultdict
 
-def analizar_csv():
-    # Leer el CSV generado
-    with open('steps_apollo_resultado.csv', 'r', encoding='utf-8') as f:
+import eventos_columnar
+
+STEPS_FILE = 'steps_apollo_resultado.csv'
+COLUMNAS_DETALLE = ['Contact Name', 'Account', 'Type', 'Task Status', 'Sequence', 'Step', 'Subject',
+                    'Due Date (PST)', 'Completed Date (PST)']
+COLUMNAS_VACIAS = ['Sequence', 'Step', 'Subject', 'Due Date (PST)']
+CONTACTOS_DETALLE = 3
+
+
+def _resumen_csv():
+    """(total de filas, contactos únicos, [(contacto, steps)] de los primeros, {columna: vacíos})"""
+    with open(STEPS_FILE, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         rows = list(reader)
 
-    print("="*80)
-    print(f"ANÁLISIS DE DUPLICADOS - Total de registros: {len(rows)}")
-    print("="*80)
-
     # Agrupar por contacto
     por_contacto = defaultdict(list)
     for row in rows:
         contacto = row.get('Contact Name', 'Sin nombre')
         por_contacto[contacto].append(row)
 
-    print(f"\nTotal de contactos únicos: {len(por_contacto)}")
+    vacios = {col: sum(1 for r in rows if not r.get(col)) for col in COLUMNAS_VACIAS}
+    return len(rows), len(por_contacto), list(por_contacto.items())[:CONTACTOS_DETALLE], vacios
+
+
+def _resumen_snapshot(snapshot):
+    """Lo mismo que _resumen_csv contando sobre los códigos del snapshot por columnas"""
+    np = eventos_columnar.np
+    contactos = snapshot.codigos('Contact Name')
+    unicos, primera = np.unique(contactos, return_index=True)
+    primeros = []
+    for codigo in unicos[np.argsort(primera)][:CONTACTOS_DETALLE]:
+        indices = np.flatnonzero(contactos == codigo)
+        primeros.append((snapshot.valores('Contact Name')[codigo],
+                         list(snapshot.filas_dict(COLUMNAS_DETALLE, indices))))
+
+    vacios = {}
+    for col in COLUMNAS_VACIAS:
+        valores = snapshot.valores(col)
+        vacios[col] = int(np.count_nonzero(snapshot.codigos(col) == valores.index(''))) if '' in valores else 0
+    return snapshot.filas, len(unicos), primeros, vacios
+
+
+def analizar_csv():
+    # Leer el CSV generado (o su snapshot por columnas si está al día)
+    snapshot = eventos_columnar.abrir(STEPS_FILE)
+    if snapshot is not None and snapshot.tiene(COLUMNAS_DETALLE):
+        total, n_contactos, primeros, vacios = _resumen_snapshot(snapshot)
+        snapshot.cerrar()
+    else:
+        total, n_contactos, primeros, vacios = _resumen_csv()
+
+    print("="*80)
+    print(f"ANÁLISIS DE DUPLICADOS - Total de registros: {total}")
+    print("="*80)
+
+    print(f"\nTotal de contactos únicos: {n_contactos}")
 
     # Analizar los primeros 3 contactos en detalle
     print("\n" + "="*80)
     print("ANÁLISIS DETALLADO DE LOS PRIMEROS 3 CONTACTOS:")
     print("="*80)
 
-    for i, (contacto, steps) in enumerate(list(por_contacto.items())[:3], 1):
+    for i, (contacto, steps) in enumerate(primeros, 1):
         print(f"\n{i}. CONTACTO: {contacto}")
         print(f"   Total de steps: {len(steps)}")
         print(f"   Empresa: {steps[0].get('Account', 'N/A')}")
@@ -63,15 +103,15 @@ def analizar_csv():
     print("="*80)
 
     # Contar registros con campos vacíos
-    vacios_sequence = sum(1 for r in rows if not r.get('Sequence'))
-    vacios_step = sum(1 for r in rows if not r.get('Step'))
-    vacios_subject = sum(1 for r in rows if not r.get('Subject'))
-    vacios_fecha = sum(1 for r in rows if not r.get('Due Date (PST)'))
-
-    print(f"Registros con Sequence vacío: {vacios_sequence} ({vacios_sequence/len(rows)*100:.1f}%)")
-    print(f"Registros con Step # vacío: {vacios_step} ({vacios_step/len(rows)*100:.1f}%)")
-    print(f"Registros con Subject vacío: {vacios_subject} ({vacios_subject/len(rows)*100:.1f}%)")
-    print(f"Registros con Fecha vacía: {vacios_fecha} ({vacios_fecha/len(rows)*100:.1f}%)")
+    vacios_sequence = vacios['Sequence']
+    vacios_step = vacios['Step']
+    vacios_subject = vacios['Subject']
+    vacios_fecha = vacios['Due Date (PST)']
+
+    print(f"Registros con Sequence vacío: {vacios_sequence} ({vacios_sequence/total*100:.1f}%)")
+    print(f"Registros con Step # vacío: {vacios_step} ({vacios_step/total*100:.1f}%)")
+    print(f"Registros con Subject vacío: {vacios_subject} ({vacios_subject/total*100:.1f}%)")
+    print(f"Registros con Fecha vacía: {vacios_fecha} ({vacios_fecha/total*100:.1f}%)")
 
 if __name__ == "__main__":
     analizar_csv()
@@ -4,16 +4,34 @@ Platam CRM API Server
 FastAPI backend para servir datos del CRM y sincronizar con Apollo
 """
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
-import json
-import subprocess
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
-app = FastAPI(title="Platam CRM API", version="1.0.0")
+import crm_engine
+import metricas
+import sync_jobs
+from dashboard_cache import DashboardCache
+
+@asynccontextmanager
+async def lifespan(app):
+    """Abre la cola de sync y arranca su planificador (reanuda jobs huérfanos tras un reinicio)"""
+    cola_sync()
+    tarea = asyncio.create_task(planificador())
+    yield
+    tarea.cancel()
+
+app = FastAPI(title="Platam CRM API", version="1.0.0", lifespan=lifespan)
 
 # CORS para desarrollo local
 app.add_middleware(
@@ -24,18 +42,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def medir_peticiones(request: Request, call_next):
+    """Latencia y tamaño de respuesta por ruta (la plantilla, no la URL concreta)"""
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    ruta = request.scope.get("route")
+    ruta = ruta.path if ruta is not None else "otra"
+    metricas.HTTP_DURACION.observe(time.perf_counter() - inicio, metodo=request.method,
+                                   ruta=ruta, status=response.status_code)
+    tamano = response.headers.get("content-length")
+    if tamano is not None:
+        metricas.HTTP_BYTES.observe(int(tamano), ruta=ruta)
+    return response
+
 # Rutas de archivos
 BASE_DIR = Path(__file__).parent
 DATA_FILE = BASE_DIR / "crm_dashboard_data_full.json"
-ENGINE_SCRIPT = BASE_DIR / "crm_engine.py"
+TABLA_FILE = BASE_DIR / "TablaBase.csv"
+STEPS_FILE = BASE_DIR / "steps_apollo_resultado.csv"
 SYNC_SCRIPT = BASE_DIR / "apollo_super_sync.py"
+SYNC_TIMEOUT = 300  # Segundos sin salida del script antes de darlo por colgado
+SYNC_LOG_LINES = 50  # Últimas líneas de salida guardadas con cada job
+SYNC_POLL = 1.0  # Segundos entre latidos / consultas a la cola
+CANCEL_GRACE = 30  # Segundos que se espera al script tras pedir cancelar antes de matarlo
+
+# Payload del dashboard en memoria (se recarga si cambia DATA_FILE)
+dashboard_cache = DashboardCache(DATA_FILE)
+engine_lock = threading.Lock()  # Un solo cálculo del engine a la vez
 
-# Estado de sincronización
-sync_status = {
-    "is_syncing": False,
-    "last_sync": None,
-    "last_error": None
-}
+# Cola persistente de sincronizaciones (compartida por todos los workers).
+# Se abre al arrancar el servidor, no al importar el módulo: importar api_server
+# (benchmarks, herramientas) no crea sync_jobs.sqlite3
+_jobs = None
+_jobs_lock = threading.Lock()
+
+def cola_sync() -> sync_jobs.SyncJobs:
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = sync_jobs.SyncJobs(str(BASE_DIR / sync_jobs.DB_FILE))
+        return _jobs
+
+def regenerar_dashboard():
+    """Calcula los KPIs en este proceso (sin subprocess) y recarga la caché con los bytes escritos"""
+    with engine_lock:
+        crm_engine.generate_full_data(str(TABLA_FILE), str(STEPS_FILE), str(DATA_FILE), compacto=True,
+                                      cache=dashboard_cache)
+        return dashboard_cache.obtener()
 
 @app.get("/")
 async def root():
@@ -51,101 +105,177 @@ async def health_check():
         "data_file_exists": DATA_FILE.exists()
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """Métricas en formato Prometheus (este servidor + volcados de los scripts de sync)"""
+    texto = metricas.exponer_todo(directorio=str(BASE_DIR / metricas.METRICAS_DIR))
+    return Response(content=texto, media_type=metricas.CONTENT_TYPE)
+
 @app.get("/api/dashboard/data")
-async def get_dashboard_data():
-    """Obtener datos del dashboard"""
+async def get_dashboard_data(request: Request):
+    """Obtener datos del dashboard (ETag + br/gzip precomprimidos, 304 si no cambió)"""
     try:
         if not DATA_FILE.exists():
-            # Generar datos si no existen
-            import sys
-            result = subprocess.run([
-                sys.executable,  # Usar el Python actual en lugar de ruta hardcodeada
-                str(ENGINE_SCRIPT)
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode != 0:
-                raise Exception(f"Error generando datos: {result.stderr}")
-        
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        return data
+            # Generar datos si no existen (en un hilo, sin bloquear el event loop)
+            payload = await run_in_threadpool(regenerar_dashboard)
+        else:
+            payload = dashboard_cache.obtener()
     except FileNotFoundError as e:
         raise HTTPException(status_code=500, detail=f"Archivo no encontrado: {str(e)}")
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=500, detail="Timeout generando datos")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading data: {str(e)}")
 
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": "no-cache",  # El navegador revalida siempre con If-None-Match
+        "Vary": "Accept-Encoding"
+    }
+    if payload.coincide(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    encoding, contenido = payload.codificar(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=contenido, media_type="application/json", headers=headers)
+
 @app.post("/api/sync/apollo")
-async def trigger_apollo_sync(background_tasks: BackgroundTasks, limit: int = 20):
-    """Iniciar sincronización con Apollo en background"""
-    if sync_status["is_syncing"]:
-        return {
-            "status": "already_syncing",
-            "message": "Ya hay una sincronización en progreso"
-        }
-    
-    background_tasks.add_task(run_apollo_sync, limit)
+def trigger_apollo_sync(limit: int = 20):
+    """Encolar una sincronización con Apollo"""
+    en_cola = [j for j in cola_sync().listar() if j["estado"] in (sync_jobs.PENDIENTE, sync_jobs.EJECUTANDO)]
+    job = cola_sync().crear(limit)
     
     return {
-        "status": "started",
-        "message": f"Sincronización iniciada para {limit} contactos",
+        "status": "queued" if en_cola else "started",
+        "job_id": job["id"],
+        "message": f"Sincronización encolada para {limit} contactos",
         "timestamp": datetime.now().isoformat()
     }
 
 @app.get("/api/sync/status")
-async def get_sync_status():
-    """Obtener estado de la sincronización"""
-    return sync_status
+def get_sync_status():
+    """Resumen de la cola de sincronización (formato anterior + últimos jobs)"""
+    recientes = cola_sync().listar()
+    terminados = [j for j in recientes if j["estado"] in sync_jobs.TERMINALES]
+    completados = [j for j in terminados if j["estado"] == sync_jobs.COMPLETADO]
+    return {
+        "is_syncing": any(j["estado"] in (sync_jobs.PENDIENTE, sync_jobs.EJECUTANDO) for j in recientes),
+        "last_sync": datetime.fromtimestamp(completados[0]["terminado_en"]).isoformat() if completados else None,
+        "last_error": terminados[0]["error"] if terminados else None,
+        "jobs": recientes
+    }
+
+@app.get("/api/sync/status/{job_id}")
+def get_sync_job(job_id: str):
+    """Progreso, ritmo y ETA de un job de sincronización"""
+    job = cola_sync().obtener(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job no encontrado: {job_id}")
+    return job
+
+@app.post("/api/sync/{job_id}/cancel")
+def cancel_sync_job(job_id: str):
+    """Cancelar un job (si está en curso, se detiene tras el contacto actual)"""
+    job = cola_sync().solicitar_cancelacion(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job no encontrado: {job_id}")
+    return job
 
 @app.post("/api/data/regenerate")
 async def regenerate_data():
     """Regenerar datos del dashboard"""
     try:
-        import sys
-        result = subprocess.run([
-            sys.executable,
-            str(ENGINE_SCRIPT)
-        ], capture_output=True, text=True, check=True, timeout=30)
+        inicio = time.perf_counter()
+        await run_in_threadpool(regenerar_dashboard)
         
         return {
             "status": "success",
             "message": "Datos regenerados correctamente",
             "timestamp": datetime.now().isoformat(),
-            "output": result.stdout
+            "duration_seconds": round(time.perf_counter() - inicio, 3)
         }
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error regenerando datos: {e.stderr}"
+            detail=f"Error regenerando datos: {str(e)}"
         )
 
-async def run_apollo_sync(limit: int):
-    """Ejecutar sincronización de Apollo en background"""
-    sync_status["is_syncing"] = True
-    sync_status["last_error"] = None
+async def planificador():
+    """Bucle de fondo: toma jobs de la cola y los ejecuta de uno en uno"""
+    jobs = cola_sync()
+    while True:
+        try:
+            job = await run_in_threadpool(jobs.tomar_siguiente)
+            if job is None:
+                await asyncio.sleep(SYNC_POLL)
+                continue
+            await run_apollo_sync(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Planificador de sync: {e}")
+            await asyncio.sleep(SYNC_POLL)
+
+async def _leer_salida(stream, salida: deque, actividad: dict):
+    """Guarda la salida del sync línea a línea según va llegando"""
+    async for linea in stream:
+        salida.append(linea.decode('utf-8', errors='replace').rstrip())
+        actividad["ultima"] = time.monotonic()
+
+async def run_apollo_sync(job: dict):
+    """Ejecutar un job de sync (subprocess asyncio, no bloquea el event loop)"""
+    jobs = cola_sync()
+    job_id = job["id"]
+    salida = deque(maxlen=SYNC_LOG_LINES)
+    actividad = {"ultima": time.monotonic()}
+    error = None
     
+    # Ejecutar script de sincronización (-u: salida sin buffer para verla en vivo)
+    proceso = await asyncio.create_subprocess_exec(
+        sys.executable, "-u", str(SYNC_SCRIPT),
+        "--limit", str(job["limite"]), "--job-id", job_id,
+        cwd=str(BASE_DIR),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    lector = asyncio.create_task(_leer_salida(proceso.stdout, salida, actividad))
+    cancelado_en = None
     try:
-        import sys
-        # Ejecutar script de sincronización
-        result = subprocess.run([
-            sys.executable,
-            str(SYNC_SCRIPT)
-        ], capture_output=True, text=True, timeout=300)
-        
-        # Regenerar datos del dashboard
-        subprocess.run([
-            sys.executable,
-            str(ENGINE_SCRIPT)
-        ], check=True, timeout=30)
-        
-        sync_status["last_sync"] = datetime.now().isoformat()
-        
+        while proceso.returncode is None:
+            try:
+                await asyncio.wait_for(proceso.wait(), timeout=SYNC_POLL)
+                break
+            except asyncio.TimeoutError:
+                pass
+            await run_in_threadpool(jobs.latido, job_id, "\n".join(salida))
+            ahora = time.monotonic()
+            if cancelado_en is None and await run_in_threadpool(jobs.cancelacion_solicitada, job_id):
+                cancelado_en = ahora
+            if cancelado_en is not None and ahora - cancelado_en > CANCEL_GRACE:
+                proceso.kill()
+            elif ahora - actividad["ultima"] > SYNC_TIMEOUT:
+                error = f"Timeout: sin salida del sync durante {SYNC_TIMEOUT}s"
+                proceso.kill()
+        await proceso.wait()
+        await lector
+    except asyncio.CancelledError:
+        # El servidor se apaga: el job queda 'ejecutando' y se reanuda al volver
+        proceso.kill()
+        raise
+    
+    await run_in_threadpool(jobs.latido, job_id, "\n".join(salida))
+    if cancelado_en is not None:
+        await run_in_threadpool(jobs.terminar, job_id, sync_jobs.CANCELADO)
+    elif error or proceso.returncode != 0:
+        await run_in_threadpool(jobs.terminar, job_id, sync_jobs.ERROR,
+                                error or f"apollo_super_sync terminó con código {proceso.returncode}")
+    else:
+        await run_in_threadpool(jobs.terminar, job_id, sync_jobs.COMPLETADO)
+    
+    # Regenerar datos del dashboard (también con un sync parcial hay contactos nuevos)
+    try:
+        await run_in_threadpool(regenerar_dashboard)
     except Exception as e:
-        sync_status["last_error"] = str(e)
-    finally:
-        sync_status["is_syncing"] = False
+        print(f"⚠️  Error regenerando dashboard tras el sync {job_id}: {e}")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,60 +1,43 @@
 #!/usr/bin/env python3
 """
-Script automático que espera el reset del rate limit y completa TODOS los datos de Apollo
-Se ejecuta automáticamente cuando la API esté disponible
+Script automático que completa TODOS los datos de Apollo respetando la cuota
+Lee las cabeceras de rate limit / Retry-After de cada respuesta, duerme justo
+hasta que vuelve a haber cuota y continúa con la lista de pendientes.
 """
 
 import csv
-import requests
-import json
-import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
-# Configuración
-APOLLO_API_KEY = "_KzNd14cLtj4Mpjj7RsJJw"
-WAIT_TIME_HOURS = 1  # Tiempo de espera para el rate limit
-MAX_RETRIES = 3
-
-def verificar_rate_limit():
-    """Verifica si el rate limit se ha reseteado haciendo una llamada de prueba"""
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    # Hacer una llamada pequeña de prueba
-    url = "https://api.apollo.io/api/v1/people/match"
-    payload = {"email": "test@example.com"}
+import metricas
+from apollo_client import get_client
+from sync_journal import SyncJournal
 
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-
-        if response.status_code == 429:
-            return False, "Rate limit activo"
-        elif response.status_code in [200, 404]:
-            return True, "API disponible"
-        else:
-            return True, f"API respondió con código {response.status_code}"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
+# Configuración
+MAX_RETRIES = 3  # 429 seguidos sobre el mismo contacto antes de rendirse
+JOURNAL_FILE = 'apollo_auto_completer.journal.jsonl'  # Contactos ya hechos de la pasada en curso
+
+def esperar_capacidad() -> float:
+    """Duerme hasta que la cuota de Apollo (según sus cabeceras) permita otra llamada"""
+    def aviso(segundos):
+        reanudar = datetime.now() + timedelta(seconds=segundos)
+        duracion = f"{segundos:.0f} segundos" if segundos < 120 else f"{segundos/60:.1f} minutos"
+        print(f"\n   ⏳ Sin cuota de Apollo por ahora (restante: {formatear_cuota()}).")
+        print(f"   Reanudando a las {reanudar.strftime('%Y-%m-%d %H:%M:%S')} ({duracion})...")
+    return get_client().esperar_cuota(aviso)
+
+def formatear_cuota() -> str:
+    restantes = get_client().cuota.estado()['restantes']
+    return ", ".join(f"{ventana}: {n}" for ventana, n in restantes.items()) or "sin cabeceras"
 
 def obtener_contact_id_y_sequences(email: str) -> Dict:
     """Obtiene el ID del contacto y sus secuencias activas"""
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    url = "https://api.apollo.io/api/v1/people/match"
-    payload = {"email": email}
-
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = get_client().people_match(email)
 
         if response.status_code == 200:
             data = response.json()
-            person = data.get('person', {})
+            person = data.get('person') or {}
 
             return {
                 'success': True,
@@ -85,12 +68,17 @@ def procesar_contactos_pendientes(archivo_pendientes: str):
 
     print(f"Total de contactos a procesar: {len(contactos)}")
 
-    resultados = []
-    errores = []
+    # Reanudar: lo que ya está en el diario no se vuelve a pedir a Apollo
+    journal = SyncJournal(JOURNAL_FILE)
+    resultados = [r['resultado'] for r in journal.hechos.values() if r['ok']]
+    errores = [r['error'] for r in journal.hechos.values() if not r['ok']]
+    if len(journal):
+        print(f"Reanudando pasada anterior: {len(journal)} contactos ya procesados ({JOURNAL_FILE})")
+    completa = True
 
     for i, contacto in enumerate(contactos, 1):
         email = contacto.get('EMAIL_LIMPIO', '').strip()
-        if not email:
+        if not email or email in journal:
             continue
 
         nombre = contacto.get('Contacto', 'Sin nombre')
@@ -99,52 +87,47 @@ def procesar_contactos_pendientes(archivo_pendientes: str):
         print(f"\n[{i}/{len(contactos)}] Procesando: {nombre} - {empresa}")
         print(f"   Email: {email}")
 
-        # Obtener información de Apollo
-        info = obtener_contact_id_y_sequences(email)
+        # Obtener información de Apollo (esperando a que haya cuota si hace falta)
+        for intento in range(MAX_RETRIES):
+            esperar_capacidad()
+            info = obtener_contact_id_y_sequences(email)
+            if info.get('error') != 'rate_limit':
+                break
+            print(f"   ⚠ Rate limit alcanzado. Esperando a que vuelva la cuota...")
+            metricas.APOLLO_REINTENTOS.inc(motivo='429')
 
         if info.get('success'):
             print(f"   ✓ Contact ID: {info.get('contact_id')}")
             print(f"   ✓ Secuencias activas: {len(info.get('sequences', []))}")
 
-            # Guardar resultado
+            # Guardar resultado (sin el person completo, que no va al CSV)
             resultado = {
                 'contacto_original': contacto,
-                'apollo_info': info
+                'apollo_info': {k: v for k, v in info.items() if k != 'data'}
             }
             resultados.append(resultado)
+            journal.registrar(email, ok=True, resultado=resultado)
 
         elif info.get('error') == 'rate_limit':
-            print(f"   ⚠ Rate limit alcanzado nuevamente. Deteniendo...")
+            print(f"   ⚠ Rate limit persistente tras {MAX_RETRIES} esperas. Deteniendo...")
+            completa = False
             break
         else:
             print(f"   ✗ Error: {info.get('error')}")
-            errores.append({'contacto': nombre, 'email': email, 'error': info.get('error')})
-
-        # Pequeña pausa para no saturar la API
-        time.sleep(0.5)
-
-        # Guardar progreso cada 50 contactos
-        if i % 50 == 0:
-            guardar_progreso(resultados, errores)
+            error = {'contacto': nombre, 'email': email, 'error': info.get('error')}
+            errores.append(error)
+            journal.registrar(email, ok=False, error=error)
 
     # Guardar resultados finales
     guardar_resultados_finales(resultados, errores)
+    if completa:
+        journal.completar()
+    else:
+        journal.cerrar()
+        print(f"💾 Progreso en {JOURNAL_FILE}: la próxima ejecución continúa desde aquí")
 
     return resultados, errores
 
-def guardar_progreso(resultados, errores):
-    """Guarda el progreso parcial"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    with open(f'apollo_progreso_{timestamp}.json', 'w', encoding='utf-8') as f:
-        json.dump({
-            'resultados': resultados,
-            'errores': errores,
-            'timestamp': timestamp
-        }, f, indent=2, ensure_ascii=False)
-
-    print(f"\n   💾 Progreso guardado: apollo_progreso_{timestamp}.json")
-
 def guardar_resultados_finales(resultados, errores):
     """Guarda los resultados finales en CSV"""
     print("\n" + "="*80)
@@ -217,45 +200,20 @@ def main():
         print("   Ejecuta primero: obtener_steps_apollo_MEJORADO.py")
         return
 
-    # Verificar estado del rate limit
-    print("\n1. Verificando estado de la API...")
-    disponible, mensaje = verificar_rate_limit()
-
-    if not disponible:
-        print(f"   ⏳ {mensaje}")
-        print(f"   Esperando {WAIT_TIME_HOURS} hora(s) para el reset del rate limit...")
-
-        tiempo_espera = WAIT_TIME_HOURS * 3600  # Convertir a segundos
-        hora_reinicio = datetime.now() + timedelta(seconds=tiempo_espera)
-        print(f"   Reinicio programado para: {hora_reinicio.strftime('%Y-%m-%d %H:%M:%S')}")
-
-        # Esperar con actualizaciones cada 5 minutos
-        for i in range(0, tiempo_espera, 300):
-            tiempo_restante = tiempo_espera - i
-            minutos = tiempo_restante // 60
-            print(f"   ⏰ Tiempo restante: {minutos} minutos... ", end='', flush=True)
-            time.sleep(300)  # Esperar 5 minutos
-            print("✓")
-
-        print("\n   ✓ Tiempo de espera completado. Verificando nuevamente...")
-        disponible, mensaje = verificar_rate_limit()
-
-    if disponible:
-        print(f"   ✓ {mensaje}")
-        print("\n2. Iniciando procesamiento de contactos...")
-
-        resultados, errores = procesar_contactos_pendientes(archivo_pendientes)
-
-        print("\n" + "="*80)
-        print("PROCESO COMPLETADO")
-        print("="*80)
-        print(f"✓ Contactos procesados exitosamente: {len(resultados)}")
-        print(f"✗ Errores encontrados: {len(errores)}")
-        print(f"Hora de finalización: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print("="*80)
-    else:
-        print(f"   ✗ API aún no disponible: {mensaje}")
-        print("   Por favor, intenta nuevamente más tarde.")
+    # Sin llamada de prueba: la cuota se conoce por las cabeceras de cada respuesta
+    print("\n1. Iniciando procesamiento de contactos...")
+
+    resultados, errores = procesar_contactos_pendientes(archivo_pendientes)
+
+    print("\n" + "="*80)
+    print("PROCESO COMPLETADO")
+    print("="*80)
+    print(f"✓ Contactos procesados exitosamente: {len(resultados)}")
+    print(f"✗ Errores encontrados: {len(errores)}")
+    print(f"Cuota restante: {formatear_cuota()}")
+    print(f"Hora de finalización: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("="*80)
 
 if __name__ == "__main__":
+    metricas.iniciar_volcado('apollo_auto_completer')
     main()
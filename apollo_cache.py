@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Apollo Cache - Caché persistente en disco (SQLite) de respuestas de Apollo
+Guarda people/match y emailer_messages/search por email normalizado, con TTL
+por endpoint, caché negativa más corta para "no encontrado" y expulsión por
+tamaño total.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import metricas
+
+# Configuración
+CACHE_FILE = os.getenv("APOLLO_CACHE_FILE", "apollo_cache.sqlite3")
+MAX_BYTES = int(os.getenv("APOLLO_CACHE_MAX_MB", 200)) * 1024 * 1024
+HORA = 3600
+
+# TTL de respuestas con datos, por endpoint (segundos)
+TTL_POSITIVO = {
+    'people/match': 7 * 24 * HORA,           # Los datos de la persona cambian poco
+    'emailer_messages/search': 12 * HORA,    # El historial avanza cada día
+}
+# TTL de respuestas "no encontrado" (persona vacía / sin mensajes)
+TTL_NEGATIVO = {
+    'people/match': 24 * HORA,
+    'emailer_messages/search': 2 * HORA,
+}
+TTL_DEFAULT = 12 * HORA
+EVICTION_CHECK_EVERY = 100  # Escrituras entre comprobaciones de tamaño
+
+
+def normalizar_email(email: str) -> str:
+    return (email or '').strip().lower()
+
+
+class ApolloCache:
+    """Caché SQLite thread-safe indexada por (endpoint, clave)"""
+
+    def __init__(self, path: str = CACHE_FILE, ttl_positivo: Optional[Dict[str, float]] = None,
+                 ttl_negativo: Optional[Dict[str, float]] = None, max_bytes: int = MAX_BYTES):
+        self.path = path
+        self.ttl_positivo = dict(TTL_POSITIVO, **(ttl_positivo or {}))
+        self.ttl_negativo = dict(TTL_NEGATIVO, **(ttl_negativo or {}))
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.escrituras = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                endpoint TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                encontrado INTEGER NOT NULL,
+                guardado_en REAL NOT NULL,
+                accedido_en REAL NOT NULL,
+                bytes INTEGER NOT NULL,
+                PRIMARY KEY (endpoint, clave)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accedido ON respuestas (accedido_en)")
+        self.conn.commit()
+
+    def _ttl(self, endpoint: str, encontrado: bool) -> float:
+        tabla = self.ttl_positivo if encontrado else self.ttl_negativo
+        return tabla.get(endpoint, TTL_DEFAULT)
+
+    def get(self, endpoint: str, clave: str) -> Optional[Dict]:
+        """Devuelve el payload guardado si no ha expirado, si no None"""
+        ahora = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT payload, encontrado, guardado_en FROM respuestas WHERE endpoint = ? AND clave = ?",
+                (endpoint, clave)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metricas.APOLLO_CACHE.inc(endpoint=endpoint, resultado='miss')
+                return None
+
+            payload, encontrado, guardado_en = row
+            if ahora - guardado_en > self._ttl(endpoint, bool(encontrado)):
+                self.conn.execute("DELETE FROM respuestas WHERE endpoint = ? AND clave = ?", (endpoint, clave))
+                self.conn.commit()
+                self.misses += 1
+                metricas.APOLLO_CACHE.inc(endpoint=endpoint, resultado='expirado')
+                return None
+
+            self.conn.execute(
+                "UPDATE respuestas SET accedido_en = ? WHERE endpoint = ? AND clave = ?",
+                (ahora, endpoint, clave)
+            )
+            self.conn.commit()
+            self.hits += 1
+            metricas.APOLLO_CACHE.inc(endpoint=endpoint, resultado='hit')
+        return json.loads(payload)
+
+    def put(self, endpoint: str, clave: str, data: Dict, encontrado: bool):
+        """Guarda una respuesta. `encontrado=False` la marca como negativa (TTL corto)"""
+        payload = json.dumps(data, ensure_ascii=False)
+        ahora = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (endpoint, clave, payload, int(encontrado), ahora, ahora, len(payload))
+            )
+            self.conn.commit()
+            self.escrituras += 1
+            if self.escrituras % EVICTION_CHECK_EVERY == 0:
+                self._expulsar()
+
+    def _expulsar(self):
+        """Borra expirados y, si aún se supera max_bytes, los menos usados recientemente"""
+        ahora = time.time()
+        for endpoint in set(self.ttl_positivo) | set(self.ttl_negativo):
+            self.conn.execute(
+                "DELETE FROM respuestas WHERE endpoint = ? AND guardado_en < ? - "
+                "(CASE encontrado WHEN 1 THEN ? ELSE ? END)",
+                (endpoint, ahora, self._ttl(endpoint, True), self._ttl(endpoint, False))
+            )
+
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM respuestas").fetchone()[0]
+        if total > self.max_bytes:
+            exceso = total - self.max_bytes
+            liberado = 0
+            borrar = []
+            for endpoint, clave, size in self.conn.execute(
+                    "SELECT endpoint, clave, bytes FROM respuestas ORDER BY accedido_en"):
+                borrar.append((endpoint, clave))
+                liberado += size
+                if liberado >= exceso:
+                    break
+            self.conn.executemany("DELETE FROM respuestas WHERE endpoint = ? AND clave = ?", borrar)
+        self.conn.commit()
+
+    def invalidar(self, endpoint: str, clave: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM respuestas WHERE endpoint = ? AND clave = ?", (endpoint, clave))
+            self.conn.commit()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            entradas, total = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM respuestas"
+            ).fetchone()
+        return {'entradas': entradas, 'bytes': total, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Apollo Cassette - Grabación y reproducción del tráfico con Apollo
+En modo 'grabar' cada petición que sale por apollo_client se añade, con su
+respuesta, a un JSONL comprimido con gzip (una línea por petición). En modo
+'reproducir' las respuestas salen del cassette sin tocar la red: la misma
+petición (método, endpoint, parámetros y cuerpo) devuelve lo grabado, en el
+mismo orden si se grabó varias veces. Así un sync se puede repetir y
+perfilar sobre exactamente los mismos datos de producción.
+Uso: APOLLO_CASSETTE_MODO=grabar|reproducir APOLLO_CASSETTE=ruta.jsonl.gz
+     python apollo_cassette.py ruta.jsonl.gz   (resumen del contenido)
+"""
+
+import argparse
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+MODOS = ('grabar', 'reproducir')
+# Cabeceras de la respuesta que se graban (cuota y tipo); el resto no aporta al reproducir
+CABECERAS_GRABADAS = ('content-type', 'retry-after',
+                      'x-rate-limit-minute', 'x-minute-requests-left',
+                      'x-rate-limit-hourly', 'x-hourly-requests-left',
+                      'x-rate-limit-24-hour', 'x-24-hour-requests-left')
+
+
+class PeticionNoGrabada(requests.RequestException):
+    """Reproduciendo, la petición no está en el cassette (se trata como un fallo de red)"""
+
+
+def _registros(path: str):
+    """Genera los registros del cassette, tolerando una grabación interrumpida a medias"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue  # Línea cortada
+        except EOFError:
+            return  # El proceso que grababa murió sin cerrar el último miembro gzip
+
+
+def _clave(metodo: str, endpoint: str, params: Optional[Dict], cuerpo: Optional[Dict]) -> str:
+    return json.dumps([metodo.upper(), endpoint, params or {}, cuerpo or {}],
+                      sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+class RespuestaGrabada:
+    """Imita lo que los scripts usan de requests.Response para una respuesta del cassette"""
+
+    from_cache = True
+
+    def __init__(self, registro: Dict):
+        self.status_code = registro['status']
+        self.headers = CaseInsensitiveDict(registro.get('headers') or {})
+        self._body = registro.get('body')
+        self._texto = registro.get('texto')
+
+    def json(self):
+        if self._body is None:
+            return json.loads(self._texto or '')
+        return self._body
+
+    @property
+    def text(self) -> str:
+        if self._body is None:
+            return self._texto or ''
+        return json.dumps(self._body, ensure_ascii=False)
+
+
+class Cassette:
+    """Un archivo .jsonl.gz abierto para grabar o cargado en memoria para reproducir"""
+
+    def __init__(self, path: str, modo: str):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de cassette desconocido: {modo!r} (usar {' o '.join(MODOS)})")
+        self.path = path
+        self.modo = modo
+        self.lock = threading.Lock()
+        self.grabadas = 0
+        self.reproducidas = 0
+        self._respuestas = {}  # clave -> deque de registros, en orden de grabación
+        self._archivo = None
+        if modo == 'reproducir':
+            self.cargar()
+        else:
+            # 'at' añade un miembro gzip nuevo; gzip lee los miembros concatenados como uno solo
+            self._archivo = gzip.open(path, 'at', encoding='utf-8')
+            atexit.register(self.cerrar)
+
+    def cargar(self):
+        for registro in _registros(self.path):
+            clave = _clave(registro['metodo'], registro['endpoint'], registro.get('params'), registro.get('json'))
+            self._respuestas.setdefault(clave, deque()).append(registro)
+
+    def grabar(self, metodo: str, endpoint: str, params: Optional[Dict], cuerpo: Optional[Dict],
+               response, segundos: float):
+        try:
+            body, texto = response.json(), None
+        except ValueError:
+            body, texto = None, response.text
+        registro = {
+            'ts': time.time(),
+            'metodo': metodo.upper(),
+            'endpoint': endpoint,
+            'params': params,
+            'json': cuerpo,
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() in CABECERAS_GRABADAS},
+            'segundos': round(segundos, 4),
+            'body': body,
+            'texto': texto,
+        }
+        linea = json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self.lock:
+            self._archivo.write(linea)
+            self._archivo.flush()  # Legible aunque el proceso muera a medias
+            self.grabadas += 1
+
+    def reproducir(self, metodo: str, endpoint: str, params: Optional[Dict],
+                   cuerpo: Optional[Dict]) -> RespuestaGrabada:
+        """La siguiente respuesta grabada para esta petición; la última se repite indefinidamente"""
+        clave = _clave(metodo, endpoint, params, cuerpo)
+        with self.lock:
+            pendientes = self._respuestas.get(clave)
+            if not pendientes:
+                raise PeticionNoGrabada(f"Sin respuesta grabada para {metodo.upper()} {endpoint} {cuerpo or params or ''}")
+            registro = pendientes.popleft() if len(pendientes) > 1 else pendientes[0]
+            self.reproducidas += 1
+        return RespuestaGrabada(registro)
+
+    def cerrar(self):
+        with self.lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+
+def resumir(path: str):
+    peticiones = Counter()
+    segundos = 0.0
+    for registro in _registros(path):
+        peticiones[(registro['endpoint'], registro['status'])] += 1
+        segundos += registro.get('segundos') or 0
+    print("="*80)
+    print(f"CASSETTE {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    print("="*80)
+    for (endpoint, status), n in sorted(peticiones.items()):
+        print(f"{endpoint:<45} {status:>4} {n:>7}")
+    print(f"\nTotal: {sum(peticiones.values())} peticiones, {segundos:.1f}s de red grabados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumen de un cassette de tráfico con Apollo")
+    parser.add_argument('path')
+    resumir(parser.parse_args().path)
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Apollo Client - Cliente HTTP compartido para la API de Apollo
+Una sola sesión con pool de conexiones (keep-alive) y un limitador
+token-bucket global dimensionado a la cuota de la cuenta.
+people/match y emailer_messages/search consultan antes la caché en disco.
+emailer_messages_paginas() recorre todas las páginas de un historial.
+CuotaApollo sigue la cuota restante a partir de las cabeceras de cada respuesta.
+Cada petición se cuenta en metricas (endpoint, status, latencia, 429, cuota).
+Con APOLLO_CASSETTE_MODO=grabar|reproducir el tráfico se graba en (o se sirve
+desde) el cassette APOLLO_CASSETTE, ver apollo_cassette.
+"""
+
+import json as jsonlib
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metricas
+from apollo_cache import ApolloCache, normalizar_email
+from apollo_cassette import Cassette
+
+# Configuración
+APOLLO_API_KEY = os.getenv("APOLLO_API_KEY", "_KzNd14cLtj4Mpjj7RsJJw")
+APOLLO_BASE_URL = os.getenv("APOLLO_BASE_URL", "https://api.apollo.io/api/v1")
+CALLS_PER_HOUR = int(os.getenv("APOLLO_CALLS_PER_HOUR", 400))  # Cuota de la cuenta
+BURST = int(os.getenv("APOLLO_BURST", 10))  # Llamadas seguidas permitidas antes de espaciar
+POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+USE_CACHE = os.getenv("APOLLO_CACHE", "1") != "0"
+CASSETTE_MODO = os.getenv("APOLLO_CASSETTE_MODO", "")  # '', 'grabar' o 'reproducir'
+CASSETTE_FILE = os.getenv("APOLLO_CASSETTE", "apollo_cassette.jsonl.gz")
+PAGE_SIZE = 100  # per_page máximo que acepta emailer_messages/search
+PAGE_WORKERS = 4  # Páginas pedidas en paralelo (todas pasan por el limitador)
+BULK_MATCH_SIZE = 10  # Máximo de personas por petición a people/bulk_match
+BACKOFF_429 = 60  # Espera inicial tras un 429 sin Retry-After ni cuota agotada (se duplica)
+BACKOFF_429_MAX = 3600
+
+# Cabeceras de cuota de Apollo: ventana -> (límite, peticiones restantes, segundos)
+VENTANAS_CUOTA = {
+    'minuto': ('x-rate-limit-minute', 'x-minute-requests-left', 60),
+    'hora': ('x-rate-limit-hourly', 'x-hourly-requests-left', 3600),
+    'dia': ('x-rate-limit-24-hour', 'x-24-hour-requests-left', 86400),
+}
+
+
+_ID_EN_RUTA = re.compile(r'/[0-9a-f]{16,}(?=/|$)')
+
+
+def _endpoint(path: str) -> str:
+    """Ruta sin base ni ids, para que la etiqueta de las métricas no crezca sin límite"""
+    path = path.split('?', 1)[0]
+    if path.startswith(APOLLO_BASE_URL):
+        path = path[len(APOLLO_BASE_URL):]
+    return _ID_EN_RUTA.sub('/:id', '/' + path.lstrip('/')).lstrip('/')
+
+
+def _ruta(path: str) -> str:
+    """Ruta relativa a la base, con ids: identifica la petición en un cassette"""
+    if path.startswith(APOLLO_BASE_URL):
+        path = path[len(APOLLO_BASE_URL):]
+    return path.lstrip('/')
+
+
+class ApolloError(Exception):
+    """Respuesta no-200 de Apollo en medio de una operación de varias peticiones"""
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        super().__init__(f"Apollo respondió {response.status_code}: {response.text[:100]}")
+
+
+class TokenBucket:
+    """
+    Limitador token-bucket thread-safe.
+    Se rellena a `rate` tokens por segundo hasta un máximo de `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Bloquea hasta disponer de `tokens`. Devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+def _entero(valor) -> Optional[int]:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _segundos_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Retry-After puede venir en segundos o como fecha HTTP"""
+    if not valor:
+        return None
+    segundos = _entero(valor)
+    if segundos is not None:
+        return max(0.0, float(segundos))
+    try:
+        fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (fecha - datetime.now(timezone.utc)).total_seconds())
+
+
+class CuotaApollo:
+    """
+    Cuota restante por ventana (minuto / hora / día) según las cabeceras
+    x-*-requests-left de cada respuesta, descontando localmente lo enviado
+    desde entonces. Sin Retry-After, una ventana agotada se da por renovada
+    al empezar la siguiente ventana de reloj (minuto, hora o día UTC).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limites = {}
+        self.restantes = {}
+        self.renueva_en = {}  # ventana agotada -> cuándo vuelve a tener cuota
+        self.bloqueado_hasta = 0.0
+        self.consecutivos_429 = 0
+
+    def _anotar(self, ventana: str, restantes: int, ahora: float):
+        self.restantes[ventana] = restantes
+        if restantes <= 0:
+            segundos = VENTANAS_CUOTA[ventana][2]
+            self.renueva_en.setdefault(ventana, (ahora // segundos + 1) * segundos)
+        else:
+            self.renueva_en.pop(ventana, None)
+
+    def consumir(self):
+        """Descuenta una petición enviada (antes de conocer sus cabeceras)"""
+        ahora = time.time()
+        with self.lock:
+            for ventana, restantes in list(self.restantes.items()):
+                self._anotar(ventana, max(0, restantes - 1), ahora)
+
+    def actualizar(self, status_code: int, headers):
+        """Toma la cuota real de las cabeceras de una respuesta"""
+        ahora = time.time()
+        with self.lock:
+            for ventana, (cab_limite, cab_restantes, _) in VENTANAS_CUOTA.items():
+                limite = _entero(headers.get(cab_limite))
+                restantes = _entero(headers.get(cab_restantes))
+                if limite is not None:
+                    self.limites[ventana] = limite
+                if restantes is not None:
+                    self._anotar(ventana, restantes, ahora)
+
+            if status_code != 429:
+                self.consecutivos_429 = 0
+                return
+
+            retry_after = _segundos_retry_after(headers.get('retry-after'))
+            if retry_after is None and self._espera_ventanas(ahora) == 0:
+                # 429 sin pistas: backoff exponencial
+                retry_after = min(BACKOFF_429 * 2 ** self.consecutivos_429, BACKOFF_429_MAX)
+            if retry_after is not None:
+                self.bloqueado_hasta = max(self.bloqueado_hasta, ahora + retry_after)
+            self.consecutivos_429 += 1
+
+    def _espera_ventanas(self, ahora: float) -> float:
+        espera = 0.0
+        for ventana, renueva_en in list(self.renueva_en.items()):
+            if renueva_en <= ahora:
+                # La ventana ya se renovó: cuota desconocida hasta la próxima cabecera
+                del self.renueva_en[ventana]
+                self.restantes.pop(ventana, None)
+            else:
+                espera = max(espera, renueva_en - ahora)
+        return espera
+
+    def segundos_hasta_capacidad(self) -> float:
+        """0 si se puede llamar ya; si no, cuánto falta para que vuelva a haber cuota"""
+        ahora = time.time()
+        with self.lock:
+            return max(0.0, self.bloqueado_hasta - ahora, self._espera_ventanas(ahora))
+
+    def estado(self) -> Dict:
+        with self.lock:
+            return {
+                'limites': dict(self.limites),
+                'restantes': dict(self.restantes),
+                'bloqueado_hasta': self.bloqueado_hasta or None,
+            }
+
+
+class RespuestaCacheada:
+    """Imita lo que los scripts usan de requests.Response para un hit de caché"""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, data: Dict):
+        self._data = data
+        self.headers = {}
+
+    def json(self) -> Dict:
+        return self._data
+
+    @property
+    def text(self) -> str:
+        return jsonlib.dumps(self._data, ensure_ascii=False)
+
+
+class ApolloClient:
+    """Cliente reutilizable: headers comunes, keep-alive y ritmo según la cuota"""
+
+    def __init__(self, api_key: str = APOLLO_API_KEY, base_url: str = APOLLO_BASE_URL,
+                 calls_per_hour: int = CALLS_PER_HOUR, burst: int = BURST,
+                 pool_size: int = POOL_SIZE, cache: Optional[ApolloCache] = None,
+                 cassette: Optional[Cassette] = None):
+        self.cache = cache
+        self.cassette = cassette
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers.update({
+            'X-Api-Key': api_key,
+            'Content-Type': 'application/json'
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.limiter = TokenBucket(calls_per_hour / 3600.0, burst)
+        self.cuota = CuotaApollo()
+
+    def _url(self, path: str) -> str:
+        if path.startswith('http'):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method: str, path: str, json: Optional[Dict] = None,
+                params: Optional[Dict] = None, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+        """Envía una petición respetando el limitador global y anota la cuota de la respuesta"""
+        endpoint = _endpoint(path)
+        if self.cassette is not None and self.cassette.modo == 'reproducir':
+            # Sin red: ni limitador ni cuota (las cabeceras grabadas harían esperar a destiempo)
+            response = self.cassette.reproducir(method, _ruta(path), params, json)
+            metricas.APOLLO_PETICIONES.inc(endpoint=endpoint, status=response.status_code)
+            return response
+        self.limiter.acquire()
+        self.cuota.consumir()
+        inicio = time.perf_counter()
+        try:
+            response = self.session.request(method, self._url(path), json=json, params=params, timeout=timeout)
+        except requests.RequestException:
+            metricas.APOLLO_PETICIONES.inc(endpoint=endpoint, status='error')
+            raise
+        finally:
+            metricas.APOLLO_DURACION.observe(time.perf_counter() - inicio, endpoint=endpoint)
+        if self.cassette is not None:
+            self.cassette.grabar(method, _ruta(path), params, json, response, time.perf_counter() - inicio)
+        metricas.APOLLO_PETICIONES.inc(endpoint=endpoint, status=response.status_code)
+        if response.status_code == 429:
+            metricas.APOLLO_429.inc(endpoint=endpoint)
+        self.cuota.actualizar(response.status_code, response.headers)
+        for ventana, restantes in self.cuota.estado()['restantes'].items():
+            metricas.APOLLO_CUOTA.set(restantes, ventana=ventana)
+        return response
+
+    def esperar_cuota(self, aviso=None) -> float:
+        """
+        Duerme exactamente hasta que vuelva a haber cuota (0 si ya la hay).
+        `aviso(segundos)` se llama antes de dormir, para informar al usuario.
+        """
+        espera = self.cuota.segundos_hasta_capacidad()
+        if espera > 0:
+            if aviso:
+                aviso(espera)
+            time.sleep(espera)
+        return espera
+
+    def post(self, path: str, payload: Optional[Dict] = None, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+        return self.request('POST', path, json=payload, timeout=timeout)
+
+    def get(self, path: str, params: Optional[Dict] = None, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+        return self.request('GET', path, params=params, timeout=timeout)
+
+    def _cacheado(self, endpoint: str, clave: str, payload: Dict, campo: str,
+                  timeout: float, refrescar: bool):
+        """POST a `endpoint` pasando por la caché; `campo` vacío = respuesta negativa"""
+        if self.cache is not None and not refrescar:
+            data = self.cache.get(endpoint, clave)
+            if data is not None:
+                return RespuestaCacheada(data)
+
+        response = self.post(endpoint, payload, timeout=timeout)
+        if self.cache is not None and response.status_code == 200:
+            data = response.json()
+            self.cache.put(endpoint, clave, data, encontrado=bool(data.get(campo)))
+        return response
+
+    def people_match(self, email: str, timeout: float = DEFAULT_TIMEOUT, refrescar: bool = False):
+        """people/match por email (cacheado)"""
+        return self._cacheado('people/match', normalizar_email(email), {"email": email},
+                              'person', timeout, refrescar)
+
+    def people_bulk_match(self, emails, timeout: float = DEFAULT_TIMEOUT,
+                          refrescar: bool = False) -> Dict[str, Optional[Dict]]:
+        """
+        people/bulk_match en lotes de BULK_MATCH_SIZE: una petición por lote en
+        vez de una por email. Devuelve {email normalizado: person o None}.
+        Cada resultado se guarda en la caché de people/match, así que los emails
+        ya cacheados no gastan cuota. Lanza ApolloError si un lote no da 200.
+        """
+        resultado = {}
+        pendientes = []
+        for email in emails:
+            clave = normalizar_email(email)
+            if not clave or clave in resultado or clave in pendientes:
+                continue
+            data = None if self.cache is None or refrescar else self.cache.get('people/match', clave)
+            if data is not None:
+                resultado[clave] = data.get('person') or None
+            else:
+                pendientes.append(clave)
+
+        for i in range(0, len(pendientes), BULK_MATCH_SIZE):
+            lote = pendientes[i:i + BULK_MATCH_SIZE]
+            response = self.post('people/bulk_match', {"details": [{"email": e} for e in lote]}, timeout=timeout)
+            if response.status_code != 200:
+                raise ApolloError(response)
+            matches = response.json().get('matches') or []
+            # Apollo devuelve las coincidencias en el mismo orden que "details" (None si no hay)
+            for clave, person in zip(lote, matches + [None] * (len(lote) - len(matches))):
+                resultado[clave] = person or None
+                if self.cache is not None:
+                    # Un fallo se guarda como {}, igual que lo que responde people/match sin coincidencia
+                    self.cache.put('people/match', clave, {"person": person} if person else {},
+                                   encontrado=bool(person))
+        return resultado
+
+    def emailer_messages_search(self, email: str, page: Optional[int] = None, per_page: Optional[int] = None,
+                                timeout: float = DEFAULT_TIMEOUT, refrescar: bool = False):
+        """emailer_messages/search por email (cacheado por email y página)"""
+        payload = {"email_address": email}
+        if page is not None:
+            payload["page"] = page
+        if per_page is not None:
+            payload["per_page"] = per_page
+        clave = f"{normalizar_email(email)}|{page or ''}|{per_page or ''}"
+        return self._cacheado('emailer_messages/search', clave, payload,
+                              'emailer_messages', timeout, refrescar)
+
+    def emailer_messages_paginas(self, email: str, per_page: int = PAGE_SIZE, max_workers: int = PAGE_WORKERS,
+                                 timeout: float = DEFAULT_TIMEOUT, refrescar: bool = False) -> Iterator[Dict]:
+        """
+        Genera TODOS los mensajes de un email, en orden de página.
+        Lee pagination.total_pages de la primera respuesta y pide el resto en
+        paralelo, con como mucho `max_workers` páginas en vuelo para que un
+        historial largo no se acumule entero en memoria.
+        Lanza ApolloError si alguna página no devuelve 200 (p.ej. 429).
+        """
+        def pagina(numero):
+            response = self.emailer_messages_search(email, page=numero, per_page=per_page,
+                                                    timeout=timeout, refrescar=refrescar)
+            if response.status_code != 200:
+                raise ApolloError(response)
+            return response.json()
+
+        data = pagina(1)
+        total_pages = (data.get('pagination') or {}).get('total_pages') or 1
+        yield from data.get('emailer_messages', [])
+        if total_pages <= 1:
+            return
+
+        restantes = iter(range(2, total_pages + 1))
+        with ThreadPoolExecutor(max_workers=min(max_workers, total_pages - 1)) as pool:
+            en_vuelo = deque(pool.submit(pagina, n) for n in islice(restantes, max_workers))
+            try:
+                while en_vuelo:
+                    data = en_vuelo.popleft().result()
+                    siguiente = next(restantes, None)
+                    if siguiente is not None:
+                        en_vuelo.append(pool.submit(pagina, siguiente))
+                    yield from data.get('emailer_messages', [])
+            finally:
+                # Si el consumidor corta antes (o hay error) no se piden más páginas
+                for futuro in en_vuelo:
+                    futuro.cancel()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ApolloClient:
+    """
+    Devuelve el cliente compartido del proceso (una sesión y un limitador).
+    Con cassette no se usa la caché en disco: todo el tráfico debe pasar por
+    el cassette para que la reproducción no dependa del estado de la caché.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if CASSETTE_MODO:
+                _client = ApolloClient(cassette=Cassette(CASSETTE_FILE, CASSETTE_MODO))
+            else:
+                _client = ApolloClient(cache=ApolloCache() if USE_CACHE else None)
+        return _client
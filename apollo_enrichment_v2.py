@@ -2,26 +2,26 @@
 """
 Apollo Data Enrichment Engine v2
 Utiliza múltiples endpoints de Apollo para máximo enriquecimiento
+Cada email consultado queda en un diario (sync_journal): si la pasada se
+corta, la siguiente reutiliza esos resultados sin volver a gastar cuota.
 """
 
-import csv
-import requests
+import argparse
 import json
 import time
 from datetime import datetime
 from typing import Dict, Optional
 
-APOLLO_API_KEY = "_KzNd14cLtj4Mpjj7RsJJw"
-HEADERS = {
-    'X-Api-Key': APOLLO_API_KEY,
-    'Content-Type': 'application/json'
-}
+import metricas
+from apollo_client import ApolloError, BULK_MATCH_SIZE, get_client
+from sync_journal import SyncJournal
+from tabla_store import TablaStore
 
-def enrich_contact_from_apollo(email: str) -> Dict:
-    """
-    Enriquece un contacto usando múltiples endpoints de Apollo
-    """
-    enriched_data = {
+# Configuración
+JOURNAL_FILE = 'apollo_enrichment_v2.journal.jsonl'  # Emails ya consultados en la pasada en curso
+
+def datos_vacios() -> Dict:
+    return {
         'name': None,
         'title': None,
         'linkedin_url': None,
@@ -34,38 +34,49 @@ def enrich_contact_from_apollo(email: str) -> Dict:
         'country': None,
         'has_apollo_data': False
     }
+
+def datos_de_persona(person: Optional[Dict]) -> Dict:
+    """Extrae los campos de enriquecimiento de un `person` de people/match o bulk_match"""
+    enriched_data = datos_vacios()
+    if not person:
+        return enriched_data
+    
+    enriched_data['has_apollo_data'] = True
+    enriched_data['name'] = person.get('name')
+    enriched_data['title'] = person.get('title')
+    enriched_data['linkedin_url'] = person.get('linkedin_url')
+    enriched_data['city'] = person.get('city')
+    enriched_data['state'] = person.get('state')
+    enriched_data['country'] = person.get('country')
+    
+    # Phone numbers
+    phone_numbers = person.get('phone_numbers', [])
+    if phone_numbers:
+        enriched_data['phone'] = phone_numbers[0].get('sanitized_number')
+    
+    # Organization data
+    org = person.get('organization', {})
+    if org:
+        enriched_data['organization_name'] = org.get('name')
+        enriched_data['organization_industry'] = org.get('industry')
+        enriched_data['organization_size'] = org.get('estimated_num_employees')
+    return enriched_data
+
+def enrich_contact_from_apollo(email: str) -> Optional[Dict]:
+    """
+    Enriquece un contacto usando people/match (una petición por email).
+    None si Apollo cortó por rate limit.
+    """
+    enriched_data = datos_vacios()
     
     try:
         # 1. People Match - Datos básicos del contacto
-        match_url = "https://api.apollo.io/api/v1/people/match"
-        match_payload = {"email": email}
-        
-        response = requests.post(match_url, headers=HEADERS, json=match_payload, timeout=10)
+        response = get_client().people_match(email, timeout=10)
         
         if response.status_code == 200:
-            person = response.json().get('person', {})
+            enriched_data = datos_de_persona(response.json().get('person', {}))
             
-            if person:
-                enriched_data['has_apollo_data'] = True
-                enriched_data['name'] = person.get('name')
-                enriched_data['title'] = person.get('title')
-                enriched_data['linkedin_url'] = person.get('linkedin_url')
-                enriched_data['city'] = person.get('city')
-                enriched_data['state'] = person.get('state')
-                enriched_data['country'] = person.get('country')
-                
-                # Phone numbers
-                phone_numbers = person.get('phone_numbers', [])
-                if phone_numbers:
-                    enriched_data['phone'] = phone_numbers[0].get('sanitized_number')
-                
-                # Organization data
-                org = person.get('organization', {})
-                if org:
-                    enriched_data['organization_name'] = org.get('name')
-                    enriched_data['organization_industry'] = org.get('industry')
-                    enriched_data['organization_size'] = org.get('estimated_num_employees')
-                
+            if enriched_data['has_apollo_data']:
                 print(f"✓ Enriquecido: {enriched_data['name'] or email}")
             else:
                 print(f"○ No encontrado en Apollo: {email}")
@@ -73,13 +84,73 @@ def enrich_contact_from_apollo(email: str) -> Dict:
         elif response.status_code == 429:
             print(f"⚠ Rate limit alcanzado")
             time.sleep(2)
+            return None
         
     except Exception as e:
         print(f"✗ Error enriqueciendo {email}: {str(e)}")
     
     return enriched_data
 
-def enrich_tablabase(limit: int = 100):
+def enrich_batch_from_apollo(emails) -> Optional[Dict[str, Dict]]:
+    """
+    Enriquece un lote de emails con una sola petición a people/bulk_match.
+    Devuelve {email: datos}; None si Apollo cortó por rate limit.
+    """
+    try:
+        personas = get_client().people_bulk_match(emails, timeout=10)
+    except ApolloError as e:
+        if e.status_code == 429:
+            print(f"⚠ Rate limit alcanzado")
+            time.sleep(2)
+            return None
+        print(f"✗ Error {e.status_code} en bulk_match: {e.response.text[:100]}")
+        personas = {}
+    except Exception as e:
+        print(f"✗ Error enriqueciendo lote: {str(e)}")
+        personas = {}
+    
+    resultado = {}
+    for email in emails:
+        enriched_data = datos_de_persona(personas.get(email.strip().lower()))
+        if enriched_data['has_apollo_data']:
+            print(f"✓ Enriquecido: {enriched_data['name'] or email}")
+        else:
+            print(f"○ No encontrado en Apollo: {email}")
+        resultado[email] = enriched_data
+    return resultado
+
+def aplicar_datos_apollo(contacto: Dict, apollo_data: Dict):
+    """Vuelca los datos de Apollo en las columnas apollo_* (y rellena las vacías)"""
+    if apollo_data['name']:
+        contacto['apollo_name'] = apollo_data['name']
+        # Si no tiene nombre en Contacto, usar el de Apollo
+        if not contacto.get('Contacto') or contacto.get('Contacto').strip() == '':
+            contacto['Contacto'] = apollo_data['name']
+    
+    if apollo_data['title']:
+        contacto['apollo_title'] = apollo_data['title']
+        # Actualizar cargo si está vacío o es genérico
+        if not contacto.get('Cargo') or contacto.get('Cargo') in ['', 'Dueña', 'Dueño']:
+            contacto['Cargo'] = apollo_data['title']
+    
+    contacto['apollo_linkedin'] = apollo_data['linkedin_url'] or ''
+    contacto['apollo_org'] = apollo_data['organization_name'] or ''
+    contacto['apollo_industry'] = apollo_data['organization_industry'] or ''
+    contacto['apollo_org_size'] = str(apollo_data['organization_size'] or '')
+    contacto['apollo_phone'] = apollo_data['phone'] or ''
+    contacto['apollo_city'] = apollo_data['city'] or ''
+    contacto['apollo_state'] = apollo_data['state'] or ''
+    contacto['apollo_country'] = apollo_data['country'] or ''
+    
+    # Actualizar LinkedIn si no existe
+    if apollo_data['linkedin_url'] and not contacto.get('Linkedin'):
+        contacto['Linkedin'] = apollo_data['linkedin_url']
+    
+    # Actualizar teléfono si no existe
+    if apollo_data['phone'] and not contacto.get('CELULAR1'):
+        contacto['CELULAR1'] = apollo_data['phone']
+
+def enrich_tablabase(limit: int = 100, bulk: bool = True):
     """
     Enriquece TablaBase.csv con datos de Apollo
     """
@@ -87,20 +158,15 @@ def enrich_tablabase(limit: int = 100):
     print("APOLLO ENRICHMENT ENGINE V2")
     print("="*80)
     
-    # Leer TablaBase
-    with open('TablaBase.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        contactos = list(reader)
-        fieldnames = list(reader.fieldnames)
-    
     # Agregar nuevas columnas si no existen
     new_fields = ['apollo_name', 'apollo_title', 'apollo_linkedin', 'apollo_org', 
                   'apollo_industry', 'apollo_org_size', 'apollo_phone', 
                   'apollo_city', 'apollo_state', 'apollo_country']
     
-    for field in new_fields:
-        if field not in fieldnames:
-            fieldnames.append(field)
+    # Leer TablaBase
+    store = TablaStore()
+    store.agregar_columnas(new_fields)
+    contactos = store.cargar()
     
     # Contactos a enriquecer (que tienen email pero no nombre o datos incompletos)
     to_enrich = []
@@ -129,64 +195,69 @@ def enrich_tablabase(limit: int = 100):
     processed = 0
     enriched_count = 0
     
-    for i, contacto in enumerate(to_enrich[:limit], 1):
-        email = contacto.get('EMAIL_LIMPIO', '').strip()
-        print(f"[{i}/{min(limit, len(to_enrich))}] Procesando: {email}")
+    seleccion = to_enrich[:limit]
+    lote_size = BULK_MATCH_SIZE if bulk else 1
+    llamadas = 0
+    journal = SyncJournal(JOURNAL_FILE)
+    if len(journal):
+        print(f"Reanudando pasada anterior: {len(journal)} emails ya consultados ({JOURNAL_FILE})")
+    detenido = False
+    
+    for inicio in range(0, len(seleccion), lote_size):
+        lote = seleccion[inicio:inicio + lote_size]
+        emails = [c.get('EMAIL_LIMPIO', '').strip() for c in lote]
+        for i, email in enumerate(emails, inicio + 1):
+            print(f"[{i}/{len(seleccion)}] Procesando: {email}")
         
-        # Enriquecer desde Apollo
-        apollo_data = enrich_contact_from_apollo(email)
+        # Los emails del diario no vuelven a Apollo; el resto, bulk: 1 petición por lote de hasta 10
+        datos_lote = {email: journal.obtener(email)['datos'] for email in emails if email in journal}
+        pendientes = [email for email in emails if email not in datos_lote]
+        if pendientes:
+            if bulk:
+                consultados = enrich_batch_from_apollo(pendientes)
+            else:
+                datos = enrich_contact_from_apollo(pendientes[0])
+                consultados = None if datos is None else {pendientes[0]: datos}
+            if consultados is None:
+                detenido = True
+                break
+            llamadas += 1
+            for email, datos in consultados.items():
+                journal.registrar(email, ok=datos['has_apollo_data'], datos=datos)
+            datos_lote.update(consultados)
         
-        if apollo_data['has_apollo_data']:
-            # Actualizar con datos de Apollo
-            if apollo_data['name']:
-                contacto['apollo_name'] = apollo_data['name']
-                # Si no tiene nombre en Contacto, usar el de Apollo
-                if not contacto.get('Contacto') or contacto.get('Contacto').strip() == '':
-                    contacto['Contacto'] = apollo_data['name']
-            
-            if apollo_data['title']:
-                contacto['apollo_title'] = apollo_data['title']
-                # Actualizar cargo si está vacío o es genérico
-                if not contacto.get('Cargo') or contacto.get('Cargo') in ['', 'Dueña', 'Dueño']:
-                    contacto['Cargo'] = apollo_data['title']
-            
-            contacto['apollo_linkedin'] = apollo_data['linkedin_url'] or ''
-            contacto['apollo_org'] = apollo_data['organization_name'] or ''
-            contacto['apollo_industry'] = apollo_data['organization_industry'] or ''
-            contacto['apollo_org_size'] = str(apollo_data['organization_size'] or '')
-            contacto['apollo_phone'] = apollo_data['phone'] or ''
-            contacto['apollo_city'] = apollo_data['city'] or ''
-            contacto['apollo_state'] = apollo_data['state'] or ''
-            contacto['apollo_country'] = apollo_data['country'] or ''
+        for contacto, email in zip(lote, emails):
+            apollo_data = datos_lote[email]
+            if apollo_data['has_apollo_data']:
+                # Actualizar con datos de Apollo
+                aplicar_datos_apollo(contacto, apollo_data)
+                store.upsert(contacto)
+                enriched_count += 1
             
-            # Actualizar LinkedIn si no existe
-            if apollo_data['linkedin_url'] and not contacto.get('Linkedin'):
-                contacto['Linkedin'] = apollo_data['linkedin_url']
-            
-            # Actualizar teléfono si no existe
-            if apollo_data['phone'] and not contacto.get('CELULAR1'):
-                contacto['CELULAR1'] = apollo_data['phone']
-            
-            enriched_count += 1
-        
-        processed += 1
-        
-        # Rate limiting
-        time.sleep(0.5)
+            processed += 1
     
     # Guardar
-    with open('TablaBase.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(contactos)
+    store.exportar_csv()
+    if detenido:
+        journal.cerrar()
+        print(f"💾 Progreso en {JOURNAL_FILE}: la próxima ejecución continúa desde aquí")
+    else:
+        journal.completar()
     
     print()
     print("="*80)
     print(f"✓ Proceso completado")
     print(f"   Procesados: {processed}")
     print(f"   Enriquecidos: {enriched_count}")
+    print(f"   Lotes consultados: {llamadas} ({'bulk_match' if bulk else 'people/match'})")
     print(f"   Tasa de éxito: {(enriched_count/processed*100) if processed > 0 else 0:.1f}%")
     print("="*80)
 
 if __name__ == "__main__":
-    enrich_tablabase(limit=50)  # Procesar 50 contactos por ejecución
+    parser = argparse.ArgumentParser(description="Apollo Data Enrichment Engine v2")
+    parser.add_argument('--limit', type=int, default=50, help="Contactos por ejecución")
+    parser.add_argument('--individual', action='store_true',
+                        help="Una petición people/match por email en vez de bulk_match por lotes")
+    args = parser.parse_args()
+    metricas.iniciar_volcado('apollo_enrichment_v2')
+    enrich_tablabase(limit=args.limit, bulk=not args.individual)
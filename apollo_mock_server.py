@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Apollo Mock Server - Imitación local de la API de Apollo para pruebas sin cuota
+Sirve los endpoints que usan los scripts de sync (people/match,
+people/bulk_match, emailer_messages/search, emailer_campaigns/search,
+emailer_campaigns/{id}, contacts/{id}/emailer_touches) con datos falsos
+pero deterministas: la misma semilla y el mismo email dan siempre la
+misma persona y el mismo historial. Simula latencia, paginación y los
+límites por minuto / hora / día con las cabeceras x-*-requests-left y
+429 + Retry-After, igual que Apollo.
+
+Uso:
+    python apollo_mock_server.py --puerto 8010 --limite-minuto 50
+    APOLLO_BASE_URL=http://127.0.0.1:8010/api/v1 python apollo_sync_v3.py --limit 200
+GET /mock/estado devuelve los contadores; POST /mock/reset los reinicia.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Configuración (las opciones de la línea de comandos tienen prioridad)
+PREFIJO = "/api/v1"
+SEED = int(os.getenv("APOLLO_MOCK_SEED", 0))
+LATENCIA_MS = float(os.getenv("APOLLO_MOCK_LATENCIA_MS", 80))
+JITTER_MS = float(os.getenv("APOLLO_MOCK_JITTER_MS", 40))
+LIMITE_MINUTO = int(os.getenv("APOLLO_MOCK_LIMITE_MINUTO", 50))
+LIMITE_HORA = int(os.getenv("APOLLO_MOCK_LIMITE_HORA", 400))
+LIMITE_DIA = int(os.getenv("APOLLO_MOCK_LIMITE_DIA", 2000))
+PROB_429 = float(os.getenv("APOLLO_MOCK_PROB_429", 0))  # 429 espontáneos, además de los de cuota
+PROB_MATCH = 0.85  # Emails que Apollo reconoce
+NUM_CAMPANAS = 12
+MENSAJES_MAX = 60  # Historial máximo por contacto (fuerza varias páginas con per_page bajos)
+PER_PAGE_DEFAULT = 25
+
+# Ventana -> (cabecera límite, cabecera restantes, segundos), las mismas que lee apollo_client
+VENTANAS = {
+    'minuto': ('x-rate-limit-minute', 'x-minute-requests-left', 60),
+    'hora': ('x-rate-limit-hourly', 'x-hourly-requests-left', 3600),
+    'dia': ('x-rate-limit-24-hour', 'x-24-hour-requests-left', 86400),
+}
+
+NOMBRES = ['Ana', 'Carlos', 'Diana', 'Felipe', 'Juliana', 'Andrés', 'Laura', 'Santiago', 'Valentina', 'Camilo']
+APELLIDOS = ['García', 'Rodríguez', 'Martínez', 'López', 'Gómez', 'Ramírez', 'Torres', 'Vargas', 'Rojas', 'Castro']
+CARGOS = ['CFO', 'Financial Manager', 'Gerente General', 'Director Financiero', 'Contador', 'CEO', 'Tesorero']
+INDUSTRIAS = ['food production', 'pharmaceuticals', 'wholesale', 'retail', 'construction', 'logistics']
+CIUDADES = [('Bogota', 'Bogota', 'Colombia'), ('Medellin', 'Antioquia', 'Colombia'),
+            ('Cali', 'Valle del Cauca', 'Colombia'), ('Barranquilla', 'Atlantico', 'Colombia'),
+            ('Lima', 'Lima', 'Peru')]
+ESTADOS_MENSAJE = ['completed', 'completed', 'completed', 'delivered', 'opened', 'clicked', 'bounced', 'replied']
+TIPOS_STEP = ['auto_email', 'auto_email', 'manual_email', 'call', 'linkedin_step_connect']
+ORIGEN = datetime(2026, 1, 5, 13, 0, tzinfo=timezone.utc)  # Fecha base del historial falso
+
+_ID_EN_RUTA = re.compile(r'/[0-9a-f]{16,}(?=/|$)')
+
+
+def _id(*partes) -> str:
+    """Id hexadecimal de 24 caracteres, como los de Apollo, estable para las mismas partes"""
+    return hashlib.blake2b(':'.join(map(str, partes)).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _fecha(dt: Optional[datetime]) -> Optional[str]:
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z') if dt else None
+
+
+class MockApollo:
+    """Datos falsos deterministas y contadores de cuota (ventanas fijas de reloj, como Apollo)"""
+
+    def __init__(self, seed: int = SEED, latencia_ms: float = LATENCIA_MS, jitter_ms: float = JITTER_MS,
+                 limites: Optional[Dict[str, int]] = None, prob_429: float = PROB_429):
+        self.seed = seed
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.limites = limites if limites is not None else \
+            {'minuto': LIMITE_MINUTO, 'hora': LIMITE_HORA, 'dia': LIMITE_DIA}
+        self.prob_429 = prob_429
+        self.lock = threading.Lock()
+        self.campanas = self._generar_campanas()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.rnd = random.Random(self.seed)  # Latencias y 429 espontáneos reproducibles
+            self.usadas = {}  # (ventana, índice de ventana) -> peticiones aceptadas
+            self.peticiones = Counter()  # (endpoint, status) -> n
+            self.emails_por_contacto = {}  # contact_id -> email (para emailer_touches)
+
+    # ---------- Datos ----------
+
+    def _generar_campanas(self) -> List[Dict]:
+        rnd = random.Random(f"{self.seed}:campanas")
+        campanas = []
+        for i in range(NUM_CAMPANAS):
+            cid = _id(self.seed, 'campana', i)
+            pasos = [{
+                'id': _id(self.seed, 'step', i, p),
+                'emailer_campaign_id': cid,
+                'position': p,
+                'type': rnd.choice(TIPOS_STEP) if p > 1 else 'auto_email',
+                'wait_time': rnd.choice([1, 2, 3, 5]),
+                'wait_mode': 'day',
+            } for p in range(1, rnd.randint(3, 7))]
+            campanas.append({
+                'id': cid,
+                'name': f"Secuencia {rnd.choice(CARGOS)} {2025 + i % 2} - {i + 1}",
+                'active': rnd.random() < 0.7,
+                'num_steps': len(pasos),
+                'emailer_steps': pasos,
+            })
+        return campanas
+
+    def _rnd(self, email: str) -> random.Random:
+        return random.Random(f"{self.seed}:{email}")
+
+    def persona(self, email: str) -> Optional[Dict]:
+        """people/match: None para ~15% de los emails"""
+        email = email.strip().lower()
+        rnd = self._rnd(email)
+        if not email or rnd.random() >= PROB_MATCH:
+            return None
+        nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}"
+        ciudad, departamento, pais = rnd.choice(CIUDADES)
+        dominio = email.partition('@')[2] or 'example.com'
+        contact_id = _id(self.seed, 'contacto', email)
+        with self.lock:
+            self.emails_por_contacto[contact_id] = email
+        activas = []
+        mensajes = self.mensajes(email)
+        if mensajes and mensajes[-1]['status'] == 'scheduled':
+            ultimo = mensajes[-1]
+            activas.append({
+                'emailer_campaign_id': ultimo['emailer_campaign']['id'],
+                'name': ultimo['emailer_campaign']['name'],
+                'current_step_number': ultimo['step_number'],
+            })
+        return {
+            'id': _id(self.seed, 'persona', email),
+            'contact_id': contact_id,
+            'name': nombre,
+            'email': email,
+            'title': rnd.choice(CARGOS),
+            'linkedin_url': f"http://www.linkedin.com/in/{nombre.lower().replace(' ', '-')}-{rnd.randint(1000, 9999)}",
+            'city': ciudad,
+            'state': departamento,
+            'country': pais,
+            'phone_numbers': [{'sanitized_number': f"+573{rnd.randint(100000000, 199999999)}"}]
+            if rnd.random() < 0.3 else [],
+            'organization': {
+                'name': dominio.split('.')[0].capitalize(),
+                'industry': rnd.choice(INDUSTRIAS),
+                'estimated_num_employees': rnd.choice([12, 45, 210, 770, 2300]),
+            },
+            'active_sequences': activas,
+        }
+
+    def mensajes(self, email: str) -> List[Dict]:
+        """Historial completo de un email, del más antiguo al más reciente"""
+        email = email.strip().lower()
+        rnd = random.Random(f"{self.seed}:{email}:mensajes")
+        if not email or rnd.random() < 0.3:
+            return []
+        campana = rnd.choice(self.campanas)
+        pasos = campana['emailer_steps']
+        inicio = ORIGEN + timedelta(days=rnd.randint(0, 40), minutes=rnd.randint(0, 600))
+        mensajes = []
+        for n in range(rnd.randint(1, MENSAJES_MAX)):
+            paso = pasos[n % len(pasos)]
+            creado = inicio + timedelta(days=2 * n)
+            estado = rnd.choice(ESTADOS_MENSAJE)
+            enviado = None if estado == 'scheduled' else creado + timedelta(hours=1)
+            mensajes.append({
+                'id': _id(self.seed, 'mensaje', email, n),
+                'type': 'outreach_automatic_email' if paso['type'] == 'auto_email' else paso['type'],
+                'status': estado,
+                'created_at': _fecha(creado),
+                'scheduled_at': _fecha(creado + timedelta(minutes=30)),
+                'sent_at': _fecha(enviado),
+                'opened_at': _fecha(enviado + timedelta(hours=3)) if estado in ('opened', 'clicked', 'replied') else None,
+                'clicked_at': _fecha(enviado + timedelta(hours=4)) if estado == 'clicked' else None,
+                'replied_at': _fecha(enviado + timedelta(days=1)) if estado == 'replied' else None,
+                'step_number': paso['position'],
+                'emailer_campaign': {'id': campana['id'], 'name': campana['name']},
+                'emailer_step': {'id': paso['id']},
+                'to_address': email,
+                'from_address': 'santiago@platam.co',
+                'user': {'name': 'Santiago Munoz'},
+                'template': {'name': f"{campana['name']} / paso {paso['position']}"},
+                'subject': f"Financiación para {email.partition('@')[2] or 'su empresa'}",
+                'body': '',
+            })
+        # El último es el más reciente; en los que siguen en secuencia está programado
+        if rnd.random() < 0.4:
+            mensajes[-1]['status'] = 'scheduled'
+            mensajes[-1]['sent_at'] = mensajes[-1]['opened_at'] = None
+            mensajes[-1]['clicked_at'] = mensajes[-1]['replied_at'] = None
+        return mensajes
+
+    def campana(self, campaign_id: str) -> Optional[Dict]:
+        return next((c for c in self.campanas if c['id'] == campaign_id), None)
+
+    # ---------- Cuota ----------
+
+    def admitir(self, ahora: float):
+        """(status, cabeceras): 429 si alguna ventana se agotó o toca un 429 espontáneo"""
+        with self.lock:
+            agotada = None
+            for ventana, limite in self.limites.items():
+                segundos = VENTANAS[ventana][2]
+                if limite and self.usadas.get((ventana, int(ahora // segundos)), 0) >= limite:
+                    espera = segundos - ahora % segundos
+                    agotada = max(agotada or 0, espera)
+            espontaneo = agotada is None and self.prob_429 and self.rnd.random() < self.prob_429
+            if agotada is None and not espontaneo:
+                for ventana in self.limites:
+                    clave = (ventana, int(ahora // VENTANAS[ventana][2]))
+                    self.usadas[clave] = self.usadas.get(clave, 0) + 1
+            cabeceras = {}
+            for ventana, limite in self.limites.items():
+                if not limite:
+                    continue
+                cab_limite, cab_restantes, segundos = VENTANAS[ventana]
+                usadas = self.usadas.get((ventana, int(ahora // segundos)), 0)
+                cabeceras[cab_limite] = str(limite)
+                cabeceras[cab_restantes] = str(max(0, limite - usadas))
+            if agotada is not None:
+                cabeceras['retry-after'] = str(max(1, int(agotada + 0.999)))
+                return 429, cabeceras
+            if espontaneo:
+                cabeceras['retry-after'] = '1'
+                return 429, cabeceras
+            return 200, cabeceras
+
+    def latencia(self) -> float:
+        with self.lock:
+            jitter = self.rnd.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latencia_ms + jitter) / 1000
+
+    def anotar(self, endpoint: str, status: int):
+        with self.lock:
+            self.peticiones[(endpoint, status)] += 1
+
+    def estado(self) -> Dict:
+        with self.lock:
+            ahora = time.time()
+            return {
+                'seed': self.seed,
+                'limites': dict(self.limites),
+                'usadas': {v: self.usadas.get((v, int(ahora // VENTANAS[v][2])), 0) for v in self.limites},
+                'peticiones': [{'endpoint': e, 'status': s, 'n': n} for (e, s), n in sorted(self.peticiones.items())],
+            }
+
+
+def _paginar(items: List, datos: Dict, clave: str) -> Dict:
+    try:
+        page = max(1, int(datos.get('page') or 1))
+        per_page = max(1, min(100, int(datos.get('per_page') or PER_PAGE_DEFAULT)))
+    except (TypeError, ValueError):
+        page, per_page = 1, PER_PAGE_DEFAULT
+    total_pages = max(1, -(-len(items) // per_page))
+    return {
+        clave: items[(page - 1) * per_page:page * per_page],
+        'pagination': {'page': page, 'per_page': per_page, 'total_entries': len(items),
+                       'total_pages': total_pages},
+    }
+
+
+async def _parametros(request: Request) -> Dict:
+    """Apollo acepta los parámetros en el cuerpo JSON o en la query string"""
+    datos = dict(request.query_params)
+    if request.method == 'POST':
+        try:
+            cuerpo = await request.json()
+        except ValueError:
+            cuerpo = None
+        if isinstance(cuerpo, dict):
+            datos.update(cuerpo)
+    return datos
+
+
+def crear_app(mock: MockApollo) -> FastAPI:
+    app = FastAPI(title="Apollo Mock", version="1.0.0")
+
+    @app.middleware("http")
+    async def simular_apollo(request: Request, call_next):
+        """Latencia, API key y cuota para todo lo que cuelga de /api/v1"""
+        if not request.url.path.startswith(PREFIJO):
+            return await call_next(request)
+        endpoint = _ID_EN_RUTA.sub('/:id', request.url.path[len(PREFIJO):]).strip('/')
+        await asyncio.sleep(mock.latencia())
+        if not request.headers.get('x-api-key'):
+            mock.anotar(endpoint, 401)
+            return JSONResponse({'error': 'Invalid access credentials.'}, status_code=401)
+        status, cabeceras = mock.admitir(time.time())
+        if status == 429:
+            mock.anotar(endpoint, 429)
+            return JSONResponse({'error': 'The maximum number of api calls allowed for api/v1 is exceeded.'},
+                                status_code=429, headers=cabeceras)
+        response = await call_next(request)
+        response.headers.update(cabeceras)
+        mock.anotar(endpoint, response.status_code)
+        return response
+
+    @app.api_route(f"{PREFIJO}/people/match", methods=["GET", "POST"])
+    async def people_match(request: Request):
+        datos = await _parametros(request)
+        return {'person': mock.persona(datos.get('email') or '')}
+
+    @app.post(f"{PREFIJO}/people/bulk_match")
+    async def people_bulk_match(request: Request):
+        detalles = (await _parametros(request)).get('details') or []
+        if len(detalles) > 10:
+            return JSONResponse({'error': 'Maximum 10 details per request'}, status_code=422)
+        matches = [mock.persona(d.get('email') or '') for d in detalles]
+        return {'matches': matches, 'unique_enriched_records': sum(1 for m in matches if m)}
+
+    @app.api_route(f"{PREFIJO}/emailer_messages/search", methods=["GET", "POST"])
+    async def emailer_messages_search(request: Request):
+        datos = await _parametros(request)
+        email = datos.get('email_address') or ''
+        contact_id = datos.get('contact_ids[]') or datos.get('contact_ids') or ''
+        if isinstance(contact_id, list):
+            contact_id = contact_id[0] if contact_id else ''
+        if not email and contact_id:
+            email = mock.emails_por_contacto.get(contact_id, '')
+        # Apollo devuelve lo más reciente primero
+        return _paginar(mock.mensajes(email)[::-1], datos, 'emailer_messages')
+
+    @app.api_route(f"{PREFIJO}/emailer_campaigns/search", methods=["GET", "POST"])
+    async def emailer_campaigns_search(request: Request):
+        campanas = [{k: v for k, v in c.items() if k != 'emailer_steps'} for c in mock.campanas]
+        return _paginar(campanas, await _parametros(request), 'emailer_campaigns')
+
+    @app.get(f"{PREFIJO}/emailer_campaigns/{{campaign_id}}")
+    async def emailer_campaign(campaign_id: str):
+        campana = mock.campana(campaign_id)
+        if campana is None:
+            return JSONResponse({'error': 'Not found'}, status_code=404)
+        return {'emailer_campaign': {k: v for k, v in campana.items() if k != 'emailer_steps'},
+                'emailer_steps': campana['emailer_steps']}
+
+    @app.get(f"{PREFIJO}/contacts/{{contact_id}}/emailer_touches")
+    async def emailer_touches(contact_id: str):
+        email = mock.emails_por_contacto.get(contact_id)
+        if email is None:
+            return JSONResponse({'error': 'Not found'}, status_code=404)
+        return {'emailer_touches': mock.mensajes(email)[::-1]}
+
+    @app.get("/mock/estado")
+    async def estado():
+        return mock.estado()
+
+    @app.post("/mock/reset")
+    async def reset():
+        mock.reset()
+        return {'ok': True}
+
+    return app
+
+
+app = crear_app(MockApollo())  # Para `uvicorn apollo_mock_server:app`
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Imitación local de la API de Apollo")
+    parser.add_argument('--puerto', type=int, default=int(os.getenv("PORT", 8010)))
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--latencia-ms', type=float, default=LATENCIA_MS)
+    parser.add_argument('--jitter-ms', type=float, default=JITTER_MS)
+    parser.add_argument('--limite-minuto', type=int, default=LIMITE_MINUTO, help="0 = sin límite")
+    parser.add_argument('--limite-hora', type=int, default=LIMITE_HORA, help="0 = sin límite")
+    parser.add_argument('--limite-dia', type=int, default=LIMITE_DIA, help="0 = sin límite")
+    parser.add_argument('--prob-429', type=float, default=PROB_429, help="Probabilidad de un 429 espontáneo")
+    args = parser.parse_args()
+
+    mock = MockApollo(args.seed, args.latencia_ms, args.jitter_ms,
+                      {'minuto': args.limite_minuto, 'hora': args.limite_hora, 'dia': args.limite_dia},
+                      args.prob_429)
+    print(f"🧪 Apollo mock en http://127.0.0.1:{args.puerto}{PREFIJO} (seed {args.seed})")
+    print(f"   APOLLO_BASE_URL=http://127.0.0.1:{args.puerto}{PREFIJO}")
+    uvicorn.run(crear_app(mock), host="127.0.0.1", port=args.puerto, log_level="warning")
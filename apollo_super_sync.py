@@ -1,103 +1,129 @@
 #!/usr/bin/env python3
 """
 Apollo Super Sync v1 - Enriquecimiento multicanal
-Utiliza people/match y emailer_campaigns para un mapeo completo.
+Utiliza people/bulk_match (lotes de 10) y el catálogo de campañas (catalogo_campanas)
+para nombrar secuencia y step sin llamadas extra por contacto.
 """
 
-import csv
-import requests
-import json
-import time
+import argparse
 from datetime import datetime
 
-# Configuración
-APOLLO_API_KEY = "_KzNd14cLtj4Mpjj7RsJJw"
-PAUSE = 0.5
+import metricas
+from apollo_client import ApolloError, BULK_MATCH_SIZE, get_client
+from catalogo_campanas import get_catalogo
+from planificador_sync import planificar
+from sync_jobs import CANCELADO, COMPLETADO, ERROR, SyncJobs
+from tabla_store import TablaStore
 
-def load_campaigns():
-    try:
-        with open('apollo_campaigns_mapping.json', 'r') as f:
-            return json.load(f)
-    except:
-        return {}
+def aplicar_persona(contacto, data, catalogo):
+    """Vuelca un `person` de Apollo sobre el contacto (solo rellena lo genérico o vacío)"""
+    # Update basic fields if empty
+    if not contacto.get('Cargo') or contacto.get('Cargo') == 'Dueña': # Update generic ones
+        contacto['Cargo'] = data.get('title', contacto.get('Cargo'))
+    
+    if not contacto.get('Linkedin'):
+        contacto['Linkedin'] = data.get('linkedin_url', '')
+    
+    contacto['apollo_last_sync_at'] = datetime.now().isoformat()
+    
+    # Check active sequences
+    active_seqs = data.get('active_sequences', [])
+    if active_seqs:
+        seq = active_seqs[0]
+        seq_id = seq.get('emailer_campaign_id')
+        contacto['apollo_sequence_id'] = seq_id
+        contacto['campaña'] = catalogo.nombre(seq_id, seq.get('name', ''))
+        contacto['step_numero'] = seq.get('current_step_number', '')
+        paso = catalogo.paso_por_numero(seq_id, contacto['step_numero'])
+        if paso:
+            contacto['step_nombre'] = paso['type']
+        print(f"   → Active Sequence: {contacto['campaña']}")
+
+def super_sync(limit=50, job_id=None):
+    jobs = SyncJobs() if job_id else None
+    if jobs:
+        limit = jobs.restantes(job_id)  # Al reanudar un job solo falta el resto
 
-def super_sync(limit=50):
     print("="*80)
     print(f"APOLLO SUPER SYNC - Procesando {limit} contactos")
     print("="*80)
 
-    campaign_map = load_campaigns()
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
+    catalogo = get_catalogo()
+    client = get_client()
 
     # Leer TablaBase.csv
     try:
-        with open('TablaBase.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            contactos = list(reader)
-            fieldnames = reader.fieldnames
+        store = TablaStore()
+        contactos = store.cargar()
     except Exception as e:
         print(f"Error: {e}")
+        if jobs:
+            jobs.terminar(job_id, ERROR, str(e))
         return
 
-    # Preparar para guardar
-    contactos_a_procesar = [c for c in contactos if c.get('EMAIL_LIMPIO', '').strip() and not c.get('apollo_last_sync_at', '').strip()][:limit]
+    # Los `limit` contactos más desactualizados (nunca sincronizados, en secuencia, interesados...)
+    pendientes = planificar(contactos)
+    contactos_a_procesar = pendientes[:limit]
     
-    print(f"Pendientes: {len([c for c in contactos if not c.get('apollo_last_sync_at', '').strip()])}")
+    print(f"Pendientes: {len(pendientes)}")
+    if jobs:
+        jobs.fijar_total(job_id, len(contactos_a_procesar))
+    estado_final, error_final = COMPLETADO, None
     
-    for i, contacto in enumerate(contactos_a_procesar, 1):
-        email = contacto.get('EMAIL_LIMPIO', '').strip()
-        print(f"[{i}/{len(contactos_a_procesar)}] Enriching {email}...")
+    total = len(contactos_a_procesar)
+    for inicio in range(0, total, BULK_MATCH_SIZE):
+        lote = contactos_a_procesar[inicio:inicio + BULK_MATCH_SIZE]
+        emails = [c.get('EMAIL_LIMPIO', '').strip() for c in lote]
         
+        # 1. Match Person: una petición bulk_match por lote
+        personas, fallo = {}, None
         try:
-            # 1. Match Person
-            resp = requests.post("https://api.apollo.io/api/v1/people/match", headers=headers, json={"email": email})
-            if resp.status_code == 200:
-                data = resp.json().get('person', {})
-                
-                # Update basic fields if empty
-                if not contacto.get('Cargo') or contacto.get('Cargo') == 'Dueña': # Update generic ones
-                    contacto['Cargo'] = data.get('title', contacto.get('Cargo'))
-                
-                if not contacto.get('Linkedin'):
-                    contacto['Linkedin'] = data.get('linkedin_url', '')
-                
-                contacto['apollo_last_sync_at'] = datetime.now().isoformat()
-                
-                # Check active sequences
-                active_seqs = data.get('active_sequences', [])
-                if active_seqs:
-                    seq = active_seqs[0]
-                    seq_id = seq.get('emailer_campaign_id')
-                    contacto['apollo_sequence_id'] = seq_id
-                    contacto['campaña'] = campaign_map.get(seq_id, seq.get('name', ''))
-                    contacto['step_numero'] = seq.get('current_step_number', '')
-                    print(f"   → Active Sequence: {contacto['campaña']}")
-                
-                # 2. Try history if no active sequence found or to complement
-                # (We do this only if rate limit allows, here we keep it simple with match first)
-                
-            elif resp.status_code == 429:
+            personas = client.people_bulk_match(emails)
+        except ApolloError as e:
+            if e.status_code == 429:
                 print("   ⚠ Rate limit reached.")
+                estado_final, error_final = ERROR, "Rate limit de Apollo alcanzado"
                 break
-            else:
-                print(f"   ✗ Failed: {resp.status_code}")
-                contacto['apollo_last_sync_at'] = datetime.now().isoformat() # Mark as tried
-                
+            fallo = f"Failed: {e.status_code}"
         except Exception as e:
-            print(f"   ✗ Error: {e}")
-            
-        time.sleep(PAUSE)
+            fallo = f"Error: {e}"
+        
+        cancelar = False
+        for i, (contacto, email) in enumerate(zip(lote, emails), inicio + 1):
+            print(f"[{i}/{total}] Enriching {email}...")
+            ok = fallo is None
+            try:
+                if fallo is None:
+                    aplicar_persona(contacto, personas.get(email.lower()) or {}, catalogo)
+                    # 2. Try history if no active sequence found or to complement
+                    # (We do this only if rate limit allows, here we keep it simple with match first)
+                else:
+                    print(f"   ✗ {fallo}")
+                    contacto['apollo_last_sync_at'] = datetime.now().isoformat() # Mark as tried
+                store.upsert(contacto)
+            except Exception as e:
+                print(f"   ✗ Error: {e}")
+                ok = False
+
+            if jobs and jobs.avanzar(job_id, error=not ok):
+                print("   ⏹ Cancelación solicitada.")
+                estado_final = CANCELADO
+                cancelar = True
+                break
+        if cancelar:
+            break
 
     # Guardar cambios
-    with open('TablaBase.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(contactos)
+    store.exportar_csv()
+    if jobs:
+        jobs.terminar(job_id, estado_final, error_final)
 
     print("\n✓ Proceso completado. TablaBase.csv actualizada.")
 
 if __name__ == "__main__":
-    super_sync(20) # Batch de 20 para probar
+    parser = argparse.ArgumentParser(description="Apollo Super Sync")
+    parser.add_argument('--limit', type=int, default=20, help="Contactos a procesar (batch de 20 para probar)")
+    parser.add_argument('--job-id', help="Job de sync_jobs al que reportar progreso")
+    args = parser.parse_args()
+    metricas.iniciar_volcado('apollo_super_sync')
+    super_sync(args.limit, job_id=args.job_id)
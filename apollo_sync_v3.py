@@ -4,79 +4,213 @@ Apollo Sync v3 - Enriquecimiento completo de TablaBase.csv
 Usa el endpoint emailer_messages/search para obtener el historial de cada contacto.
 """
 
-import csv
-import requests
+import argparse
+import asyncio
 import json
+import math
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Optional
 
+import metricas
+from apollo_client import ApolloError, CALLS_PER_HOUR, PAGE_SIZE, get_client
+from catalogo_campanas import get_catalogo
+from planificador_sync import planificar
+from sync_journal import SyncJournal
+from tabla_store import TablaStore
+
 # Configuración
-APOLLO_API_KEY = "_KzNd14cLtj4Mpjj7RsJJw"
-APOLLO_API_ENDPOINT = "https://api.apollo.io/api/v1/emailer_messages/search"
 MAX_RETRIES = 3
-PAUSE_BETWEEN_REQUESTS = 0.5  # segundos para evitar saturar
-
-def buscar_mensajes_apollo(email: str) -> Optional[List[Dict]]:
-    """Busca mensajes de email para un contacto específico en Apollo"""
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        "email_address": email,
-        "page": 1,
-        "per_page": 50
-    }
+CONCURRENCY = 8  # Peticiones simultáneas en modo async (el ritmo lo marca el limitador del cliente)
+CHECKPOINT_EVERY = 20
+JOURNAL_FILE = 'apollo_sync_v3.journal.jsonl'  # Contactos ya consultados en la pasada en curso
+PAGINAS_FILE = 'apollo_sync_v3.paginas.json'  # Páginas por contacto de la última pasada (para el cupo)
 
+def buscar_ultimo_mensaje(email: str, paginas: Optional[List[int]] = None) -> Optional[Dict]:
+    """
+    Recorre TODO el historial de emailer_messages/search (todas las páginas, en
+    streaming) y devuelve el mensaje más reciente por created_at.
+    None si no hay mensajes o hubo error; "RATE_LIMIT" si Apollo devolvió 429.
+    Si se pasa `paginas`, se le añaden las páginas que ocupó el historial.
+    """
     for attempt in range(MAX_RETRIES):
         try:
-            response = requests.post(APOLLO_API_ENDPOINT, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                return response.json().get('emailer_messages', [])
-            elif response.status_code == 429:
+            mensajes = 0
+
+            def contados():
+                nonlocal mensajes
+                for mensaje in get_client().emailer_messages_paginas(email):
+                    mensajes += 1
+                    yield mensaje
+
+            # max() se queda con el primero entre empates, igual que el sort estable anterior
+            ultimo = max(contados(), key=lambda x: x.get('created_at', ''), default=None)
+            if paginas is not None:
+                paginas.append(max(1, math.ceil(mensajes / PAGE_SIZE)))
+            return ultimo
+        except ApolloError as e:
+            if e.status_code == 429:
                 print(f"   ⚠ Rate limit alcanzado para {email}. Esperando...")
                 return "RATE_LIMIT"
-            else:
-                print(f"   ✗ Error {response.status_code} para {email}: {response.text[:100]}")
-                return None
+            print(f"   ✗ Error {e.status_code} para {email}: {e.response.text[:100]}")
+            return None
         except Exception as e:
             print(f"   ✗ Intento {attempt+1} falló para {email}: {str(e)}")
+            metricas.APOLLO_REINTENTOS.inc(motivo='error')
             time.sleep(2)
     
     return None
 
-def sync_apollo():
+def cargar_tabla():
+    """Abre el store de TablaBase. Devuelve (store, contactos) o None si falla"""
+    try:
+        store = TablaStore()
+        contactos = store.cargar()
+    except Exception as e:
+        print(f"Error leyendo TablaBase.csv: {e}")
+        return None
+
+    print(f"Total de contactos cargados: {len(contactos)}")
+    return store, contactos
+
+def llamadas_restantes() -> int:
+    """Llamadas que quedan en la cuota horaria (la de las cabeceras si ya se conoce)"""
+    restantes = get_client().cuota.estado()['restantes'].get('hora')
+    return restantes if restantes is not None else CALLS_PER_HOUR
+
+def paginas_por_contacto(journal: Optional[SyncJournal] = None) -> float:
+    """
+    Llamadas que cuesta de media un contacto (una por página de su historial).
+    Sale de la pasada en curso si el diario ya tiene contactos medidos; si no,
+    de la última pasada completa (PAGINAS_FILE); 1 si no hay ninguna.
+    """
+    medidas = [r['paginas'] for r in (journal.hechos.values() if journal else ()) if 'paginas' in r]
+    if medidas:
+        return max(1.0, sum(medidas) / len(medidas))
+    try:
+        with open(PAGINAS_FILE, 'r', encoding='utf-8') as f:
+            return max(1.0, float(json.load(f)['paginas_por_contacto']))
+    except (OSError, ValueError, KeyError, TypeError):
+        return 1.0
+
+def guardar_paginas_por_contacto(journal: SyncJournal):
+    """Guarda la media de la pasada para dimensionar el cupo de la siguiente"""
+    medidas = [r['paginas'] for r in journal.hechos.values() if 'paginas' in r]
+    if not medidas:
+        return
+    with open(PAGINAS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'paginas_por_contacto': round(sum(medidas) / len(medidas), 3),
+                   'contactos': len(medidas), 'ts': datetime.now().isoformat()}, f)
+
+def cupo_por_defecto(journal: Optional[SyncJournal] = None) -> int:
+    """Contactos que caben en las llamadas que quedan, a las páginas medias por contacto"""
+    return int(llamadas_restantes() // paginas_por_contacto(journal))
+
+def sin_cuota() -> bool:
+    """True si las cabeceras ya dicen que no queda ninguna llamada en la hora"""
+    return get_client().cuota.estado()['restantes'].get('hora') == 0
+
+def contactos_pendientes(contactos: List[Dict], cupo: Optional[int] = None,
+                         journal: Optional[SyncJournal] = None) -> List[Dict]:
+    """Contactos a refrescar, del más desactualizado al menos, hasta `cupo`"""
+    return planificar(contactos, cupo_por_defecto(journal) if cupo is None else cupo)
+
+def aplicar_ultimo_mensaje(contacto: Dict, ultimo_msg: Optional[Dict]) -> bool:
+    """
+    Vuelca el último mensaje de Apollo sobre el contacto.
+    Devuelve True si había mensajes.
+    """
+    if not ultimo_msg:
+        # No se encontraron mensajes, marcamos como sincronizado pero vacío
+        contacto['apollo_last_sync_at'] = datetime.now().isoformat()
+        return False
+
+    # Actualizar campos en el objeto contacto
+    contacto['apollo_last_message_id'] = ultimo_msg.get('id', '')
+
+    # Nombres de secuencia y step desde el catálogo (sin llamadas por contacto)
+    catalogo = get_catalogo()
+    campaign = ultimo_msg.get('emailer_campaign', {})
+    contacto['apollo_sequence_id'] = campaign.get('id', '')
+    contacto['campaña'] = campaign.get('name') or catalogo.nombre(campaign.get('id', ''))
+
+    step = ultimo_msg.get('emailer_step', {})
+    contacto['apollo_step_id'] = step.get('id', '')
+    paso = catalogo.paso(step.get('id', ''))
+    if paso:
+        contacto['step_nombre'] = paso['type']
+    contacto['step_numero'] = ultimo_msg.get('step_number', '')
+    contacto['apollo_step'] = ultimo_msg.get('step_number', '')
+
+    contacto['apollo_status'] = ultimo_msg.get('status', '')
+    contacto['estado_apollo'] = ultimo_msg.get('status', '')
+
+    contacto['apollo_last_sent_at'] = ultimo_msg.get('sent_at', '')
+    contacto['fecha_envio'] = ultimo_msg.get('sent_at', '')
+
+    contacto['apollo_last_opened_at'] = ultimo_msg.get('opened_at', '')
+    contacto['apollo_last_clicked_at'] = ultimo_msg.get('clicked_at', '')
+    contacto['apollo_last_replied_at'] = ultimo_msg.get('replied_at', '')
+
+    contacto['apollo_last_sync_at'] = datetime.now().isoformat()
+    contacto['fecha de step'] = ultimo_msg.get('created_at', '')
+    return True
+
+def aplicar_y_anotar(journal: SyncJournal, contacto: Dict, ultimo_msg: Optional[Dict],
+                     paginas: Optional[List[int]] = None) -> bool:
+    """aplicar_ultimo_mensaje + registro en el diario de los campos que cambiaron (y las páginas gastadas)"""
+    antes = dict(contacto)
+    encontrado = aplicar_ultimo_mensaje(contacto, ultimo_msg)
+    campos = {k: v for k, v in contacto.items() if antes.get(k) != v}
+    extra = {'paginas': sum(paginas)} if paginas else {}
+    journal.registrar(contacto.get('EMAIL_LIMPIO', ''), ok=encontrado, campos=campos, **extra)
+    return encontrado
+
+def desde_diario(journal: SyncJournal, contacto: Dict) -> Optional[bool]:
+    """Si el email ya se consultó en esta pasada, reaplica sus campos sin llamar a Apollo"""
+    registro = journal.obtener(contacto.get('EMAIL_LIMPIO', ''))
+    if registro is None:
+        return None
+    contacto.update(registro['campos'])
+    return registro['ok']
+
+def imprimir_resumen(total: int, procesados_exito: int, errores: int):
+    print("\n" + "="*80)
+    print("PROCESO FINALIZADO")
+    print("="*80)
+    print(f"Total exitosos: {procesados_exito}")
+    print(f"Sin info: {errores}")
+    print(f"Restantes: {total - (procesados_exito + errores)}")
+    print("="*80)
+
+def sync_apollo(limit: Optional[int] = None):
     print("="*80)
     print("APOLLO SYNC V3 - INICIANDO ENRIQUECIMIENTO")
     print("="*80)
 
     # 1. Leer TablaBase.csv
-    try:
-        with open('TablaBase.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            contactos = list(reader)
-            fieldnames = reader.fieldnames
-    except Exception as e:
-        print(f"Error leyendo TablaBase.csv: {e}")
+    tabla = cargar_tabla()
+    if tabla is None:
         return
+    store, contactos = tabla
 
-    print(f"Total de contactos cargados: {len(contactos)}")
-
-    # 2. Identificar contactos a procesar
-    # Procesamos los que tienen email y NO tienen apollo_last_message_id
-    contactos_a_procesar = [c for c in contactos if c.get('EMAIL_LIMPIO', '').strip() and not c.get('apollo_last_message_id', '').strip()]
+    # 2. Identificar contactos a procesar (los más desactualizados que caben en la cuota)
+    journal = abrir_diario()
+    contactos_a_procesar = contactos_pendientes(contactos, limit, journal)
     
     print(f"Contactos pendientes de enriquecer: {len(contactos_a_procesar)}")
     
     if not contactos_a_procesar:
         print("No hay contactos pendientes de procesar.")
+        cerrar_diario(journal, detenido=len(journal) > 0)
         return
 
     procesados_exito = 0
     errores = 0
-    rate_limit_hits = 0
+    modificados = []
+    detenido = False
 
     # 3. Procesar cada contacto
     for i, contacto in enumerate(contactos_a_procesar, 1):
@@ -85,77 +219,162 @@ def sync_apollo():
         
         print(f"[{i}/{len(contactos_a_procesar)}] Procesando: {nombre} ({email})")
         
-        mensajes = buscar_mensajes_apollo(email)
-        
-        if mensajes == "RATE_LIMIT":
-            print("\n!!! RATE LIMIT ALCANZADO !!! Deteniendo el proceso para evitar bloqueo prolongado.")
-            break
-            
-        if mensajes:
-            # Ordenar por fecha de creación desc (el más reciente primero)
-            # Aunque la API suele devolverlos ordenados, nos aseguramos
-            mensajes.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            
-            ultimo_msg = mensajes[0]
-            
-            # Actualizar campos en el objeto contacto
-            contacto['apollo_last_message_id'] = ultimo_msg.get('id', '')
+        encontrado = desde_diario(journal, contacto)
+        if encontrado is None:
+            if sin_cuota():
+                print("\n!!! CUOTA HORARIA AGOTADA !!! El resto queda para la próxima ejecución.")
+                detenido = True
+                break
+            paginas = []
+            ultimo_msg = buscar_ultimo_mensaje(email, paginas)
             
-            campaign = ultimo_msg.get('emailer_campaign', {})
-            contacto['apollo_sequence_id'] = campaign.get('id', '')
-            contacto['campaña'] = campaign.get('name', '')
+            if ultimo_msg == "RATE_LIMIT":
+                print("\n!!! RATE LIMIT ALCANZADO !!! Deteniendo el proceso para evitar bloqueo prolongado.")
+                detenido = True
+                break
+            encontrado = aplicar_y_anotar(journal, contacto, ultimo_msg, paginas)
             
-            step = ultimo_msg.get('emailer_step', {})
-            contacto['apollo_step_id'] = step.get('id', '')
-            contacto['step_numero'] = ultimo_msg.get('step_number', '')
-            contacto['apollo_step'] = ultimo_msg.get('step_number', '')
-            
-            contacto['apollo_status'] = ultimo_msg.get('status', '')
-            contacto['estado_apollo'] = ultimo_msg.get('status', '')
-            
-            contacto['apollo_last_sent_at'] = ultimo_msg.get('sent_at', '')
-            contacto['fecha_envio'] = ultimo_msg.get('sent_at', '')
-            
-            contacto['apollo_last_opened_at'] = ultimo_msg.get('opened_at', '')
-            contacto['apollo_last_clicked_at'] = ultimo_msg.get('clicked_at', '')
-            contacto['apollo_last_replied_at'] = ultimo_msg.get('replied_at', '')
-            
-            contacto['apollo_last_sync_at'] = datetime.now().isoformat()
-            contacto['fecha de step'] = ultimo_msg.get('created_at', '')
-
+        if encontrado:
             print(f"   ✓ Encontrado! Campaña: {contacto['campaña']} | Estado: {contacto['estado_apollo']}")
             procesados_exito += 1
         else:
-            # No se encontraron mensajes, marcamos como sincronizado pero vacío
-            contacto['apollo_last_sync_at'] = datetime.now().isoformat()
             print("   - No se encontraron mensajes en Apollo.")
             errores += 1
-
-        # Pequeña pausa
-        time.sleep(PAUSE_BETWEEN_REQUESTS)
+        modificados.append(contacto)
 
         # Guardar progreso cada 20 contactos para no perder todo si falla
-        if i % 20 == 0:
-            guardar_tabla(contactos, fieldnames)
+        if i % CHECKPOINT_EVERY == 0:
+            guardar_tabla(store, modificados)
             print(f"\n--- PROGRESO GUARDADO ({i} procesados) ---\n")
 
     # 4. Guardar resultados finales
-    guardar_tabla(contactos, fieldnames)
-    
-    print("\n" + "="*80)
-    print("PROCESO FINALIZADO")
+    guardar_tabla(store, modificados)
+    store.exportar_csv()
+    cerrar_diario(journal, detenido)
+    imprimir_resumen(len(contactos_a_procesar), procesados_exito, errores)
+
+async def _sync_apollo_async(store: TablaStore, contactos_a_procesar: List[Dict], concurrency: int,
+                             journal: SyncJournal):
+    """
+    Mantiene `concurrency` peticiones en vuelo: cada worker toma el siguiente
+    contacto de la cola y espera la respuesta en un hilo del executor.
+    """
+    loop = asyncio.get_running_loop()
+    cola = asyncio.Queue()
+    for contacto in contactos_a_procesar:
+        cola.put_nowait(contacto)
+
+    total = len(contactos_a_procesar)
+    resultado = {'exito': 0, 'errores': 0, 'procesados': 0}
+    modificados = []
+    detener = asyncio.Event()
+
+    async def worker(executor):
+        while not detener.is_set():
+            try:
+                contacto = cola.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            email = contacto.get('EMAIL_LIMPIO', '').strip()
+            encontrado = desde_diario(journal, contacto)
+            if encontrado is None:
+                if sin_cuota():
+                    if not detener.is_set():
+                        print("\n!!! CUOTA HORARIA AGOTADA !!! El resto queda para la próxima ejecución.")
+                    detener.set()
+                    return
+                paginas = []
+                ultimo_msg = await loop.run_in_executor(executor, buscar_ultimo_mensaje, email, paginas)
+
+                if ultimo_msg == "RATE_LIMIT":
+                    if not detener.is_set():
+                        print("\n!!! RATE LIMIT ALCANZADO !!! Deteniendo el proceso para evitar bloqueo prolongado.")
+                    detener.set()
+                    return
+                encontrado = aplicar_y_anotar(journal, contacto, ultimo_msg, paginas)
+
+            resultado['procesados'] += 1
+            i = resultado['procesados']
+            if encontrado:
+                print(f"[{i}/{total}] ✓ {email} | Campaña: {contacto['campaña']} | Estado: {contacto['estado_apollo']}")
+                resultado['exito'] += 1
+            else:
+                print(f"[{i}/{total}] - {email}: sin mensajes en Apollo.")
+                resultado['errores'] += 1
+            modificados.append(contacto)
+
+            if i % CHECKPOINT_EVERY == 0:
+                guardar_tabla(store, modificados)
+                print(f"\n--- PROGRESO GUARDADO ({i} procesados) ---\n")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        await asyncio.gather(*(worker(executor) for _ in range(concurrency)))
+
+    guardar_tabla(store, modificados)
+    resultado['detenido'] = detener.is_set()
+    return resultado
+
+def sync_apollo_async(concurrency: int = CONCURRENCY, limit: Optional[int] = None):
+    """Misma sincronización que sync_apollo pero con varias peticiones en vuelo"""
     print("="*80)
-    print(f"Total exitosos: {procesados_exito}")
-    print(f"Sin info: {errores}")
-    print(f"Restantes: {len(contactos_a_procesar) - (procesados_exito + errores)}")
+    print(f"APOLLO SYNC V3 (ASYNC x{concurrency}) - INICIANDO ENRIQUECIMIENTO")
     print("="*80)
 
-def guardar_tabla(contactos, fieldnames):
-    """Guarda la lista de contactos de vuelta a TablaBase.csv"""
-    with open('TablaBase.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(contactos)
+    tabla = cargar_tabla()
+    if tabla is None:
+        return
+    store, contactos = tabla
+
+    journal = abrir_diario()
+    contactos_a_procesar = contactos_pendientes(contactos, limit, journal)
+    print(f"Contactos pendientes de enriquecer: {len(contactos_a_procesar)}")
+
+    if not contactos_a_procesar:
+        print("No hay contactos pendientes de procesar.")
+        cerrar_diario(journal, detenido=len(journal) > 0)
+        return
+
+    inicio = time.monotonic()
+    resultado = asyncio.run(_sync_apollo_async(store, contactos_a_procesar, concurrency, journal))
+
+    store.exportar_csv()
+    cerrar_diario(journal, resultado['detenido'])
+    imprimir_resumen(len(contactos_a_procesar), resultado['exito'], resultado['errores'])
+    print(f"Tiempo total: {time.monotonic() - inicio:.1f}s")
+
+def abrir_diario() -> SyncJournal:
+    journal = SyncJournal(JOURNAL_FILE)
+    if len(journal):
+        print(f"Reanudando pasada anterior: {len(journal)} emails ya consultados ({JOURNAL_FILE})")
+    return journal
+
+def cerrar_diario(journal: SyncJournal, detenido: bool):
+    """Si la pasada se cortó, el diario queda para reanudar; si terminó, se vacía"""
+    guardar_paginas_por_contacto(journal)
+    if detenido:
+        journal.cerrar()
+        print(f"💾 Progreso en {JOURNAL_FILE}: la próxima ejecución continúa desde aquí")
+    else:
+        journal.completar()
+
+def guardar_tabla(store: TablaStore, modificados: List[Dict]):
+    """Upsert de los contactos modificados desde el último checkpoint (una transacción)"""
+    store.upsert_many(modificados)
+    modificados.clear()
 
 if __name__ == "__main__":
-    sync_apollo()
+    parser = argparse.ArgumentParser(description="Sincroniza TablaBase.csv con emailer_messages/search")
+    parser.add_argument('--async', dest='usar_async', action='store_true',
+                        help="Mantener varias peticiones en vuelo")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help=f"Peticiones simultáneas en modo async (default {CONCURRENCY})")
+    parser.add_argument('--limit', type=int,
+                        help="Contactos a refrescar (default: los que caben en la cuota horaria, "
+                             "a las páginas medias por contacto)")
+    args = parser.parse_args()
+
+    metricas.iniciar_volcado('apollo_sync_v3')
+    if args.usar_async:
+        sync_apollo_async(args.concurrency, args.limit)
+    else:
+        sync_apollo(args.limit)
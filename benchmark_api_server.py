@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de api_server
+Mide la latencia de /api/dashboard/data en reposo y mientras corre un job
+de sincronización con Apollo (POST /api/sync/apollo). Si el sync bloqueara
+el event loop, el p99 durante el sync se dispararía.
+Uso: arrancar `python api_server.py` y luego `python benchmark_api_server.py`
+"""
+
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_URL = "http://127.0.0.1:8000"
+SONDEO_SYNC = 0.5  # Segundos entre consultas a /api/sync/status
+
+
+def _get(url: str, timeout: float = 60) -> bytes:
+    req = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip'})
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return r.read()
+
+
+def _post(url: str) -> dict:
+    req = urllib.request.Request(url, data=b'', method='POST')
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read())
+
+
+def _sincronizando(base: str, job_id: str) -> bool:
+    job = json.loads(_get(f"{base}/api/sync/status/{job_id}"))
+    return job['estado'] in ('pendiente', 'ejecutando')
+
+
+def medir_peticion(url: str) -> float:
+    inicio = time.perf_counter()
+    _get(url)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def carga(url: str, peticiones: int, concurrencia: int, mientras=None):
+    """Lanza `peticiones` GET con `concurrencia` hilos; `mientras()` False corta antes"""
+    latencias = []
+    errores = []
+
+    def worker(_):
+        if mientras is not None and not mientras():
+            return
+        try:
+            latencias.append(medir_peticion(url))
+        except Exception as e:
+            errores.append(str(e))
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(worker, range(peticiones)))
+    if errores:
+        print(f"⚠️  {len(errores)} peticiones fallidas (p.ej. {errores[0]})")
+    return latencias
+
+
+def percentil(valores, p: float) -> float:
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def imprimir(nombre: str, latencias):
+    if not latencias:
+        print(f"{nombre:<14} sin peticiones")
+        return
+    print(f"{nombre:<14} {len(latencias):>6} {statistics.mean(latencias):>9.1f} "
+          f"{percentil(latencias, 50):>9.1f} {percentil(latencias, 99):>9.1f} {max(latencias):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de /api/dashboard/data con y sin sync")
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--peticiones', type=int, default=500)
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--limit', type=int, default=20, help="Contactos del sync lanzado")
+    args = parser.parse_args()
+
+    base = args.url.rstrip('/')
+    dashboard = f"{base}/api/dashboard/data"
+    _get(dashboard)  # Calentar la caché del payload
+
+    print("="*80)
+    print("PRUEBA DE CARGA API SERVER")
+    print("="*80)
+    print(f"{'Fase':<14} {'Reqs':>6} {'Media ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'Max ms':>9}")
+
+    imprimir("Reposo", carga(dashboard, args.peticiones, args.concurrencia))
+
+    respuesta = _post(f"{base}/api/sync/apollo?limit={args.limit}")
+    if 'job_id' not in respuesta:
+        print(f"⚠️  No se pudo iniciar el sync: {respuesta}")
+        return
+    job_id = respuesta['job_id']
+
+    # Medir solo mientras el sync sigue activo
+    estado = {'activo': True, 'ultimo': 0.0}
+
+    def sync_activo():
+        ahora = time.monotonic()
+        if ahora - estado['ultimo'] > SONDEO_SYNC:
+            estado['ultimo'] = ahora
+            estado['activo'] = _sincronizando(base, job_id)
+        return estado['activo']
+
+    inicio = time.perf_counter()
+    durante = carga(dashboard, args.peticiones, args.concurrencia, mientras=sync_activo)
+    imprimir("Durante sync", durante)
+
+    while _sincronizando(base, job_id):
+        time.sleep(SONDEO_SYNC)
+    print(f"\nSync terminado en ~{time.perf_counter() - inicio:.1f}s")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark de regeneración de crm_engine a distintas escalas
+Replica TablaBase.csv y steps_apollo_resultado.csv N veces (con emails
+distintos por copia) y mide generate_full_data. Para comparar, estima lo
+que costaría el chequeo 'scheduled' con el escaneo lineal anterior
+(any(...) sobre todo el historial por cada contacto). Con --incremental mide
+además una regeneración incremental tras cambiar 20 contactos.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+from crm_engine import generate_full_data
+
+MUESTRA_LEGACY = 50  # Contactos 'scheduled' usados para extrapolar el escaneo lineal
+CAMBIOS_INCREMENTAL = 20  # Contactos modificados, como tras un sync típico
+
+
+def _email_copia(email: str, k: int) -> str:
+    if k == 0 or '@' not in email:
+        return email
+    local, dominio = email.split('@', 1)
+    return f"{local}+{k}@{dominio}"
+
+
+def escalar_csv(origen: str, destino: str, factor: int, columnas_email):
+    """Escribe `factor` copias de `origen` cambiando los emails de cada copia"""
+    with open(origen, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+        fieldnames = reader.fieldnames
+
+    with open(destino, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for k in range(factor):
+            for row in rows:
+                copia = dict(row)
+                for col in columnas_email:
+                    copia[col] = _email_copia(row.get(col, ''), k)
+                writer.writerow(copia)
+    return len(rows) * factor
+
+
+def estimar_escaneo_legacy(tabla: str, steps: str) -> float:
+    """Extrapola el coste del any(...) original a partir de una muestra"""
+    with open(tabla, 'r', encoding='utf-8') as f:
+        programados = [c.get('EMAIL_LIMPIO', '').strip().lower() for c in csv.DictReader(f)
+                       if c.get('apollo_status', '').lower() == 'scheduled']
+    with open(steps, 'r', encoding='utf-8') as f:
+        historial = list(csv.DictReader(f))
+    if not programados:
+        return 0.0
+
+    muestra = random.Random(0).sample(programados, min(MUESTRA_LEGACY, len(programados)))
+    inicio = time.perf_counter()
+    for email in muestra:
+        any(h.get('To Email', '').lower() == email for h in historial)
+    por_contacto = (time.perf_counter() - inicio) / len(muestra)
+    return por_contacto * len(programados)
+
+
+def modificar_contactos(tabla: str, n: int):
+    """Simula un sync: cambia ESTADO y apollo_last_sync_at de n contactos"""
+    with open(tabla, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+        fieldnames = reader.fieldnames
+    for row in random.Random(1).sample(rows, min(n, len(rows))):
+        row['ESTADO'] = 'INTERESADO'
+        row['apollo_last_sync_at'] = '2026-01-20T10:00:00'
+    with open(tabla, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def medir(tabla: str, steps: str, salida: str, **kwargs) -> float:
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_full_data(tabla, steps, salida, **kwargs)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de crm_engine.generate_full_data")
+    parser.add_argument('--factores', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--sin-legacy', action='store_true', help="No estimar el escaneo lineal anterior")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"Medir también la regeneración incremental tras {CAMBIOS_INCREMENTAL} cambios")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("BENCHMARK CRM ENGINE")
+    print("="*80)
+    cabecera = f"{'Escala':>8} {'Contactos':>10} {'Eventos':>10} {'Regeneración':>14} {'Escaneo legacy (est.)':>22}"
+    if args.incremental:
+        cabecera += f" {'Incremental':>12}"
+    print(cabecera)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in args.factores:
+            tabla = os.path.join(tmp, f'TablaBase_x{factor}.csv')
+            steps = os.path.join(tmp, f'steps_x{factor}.csv')
+            salida = os.path.join(tmp, f'salida_x{factor}.json')
+            n_contactos = escalar_csv('TablaBase.csv', tabla, factor, ['EMAIL_LIMPIO'])
+            n_eventos = escalar_csv('steps_apollo_resultado.csv', steps, factor, ['To Email'])
+
+            regeneracion = medir(tabla, steps, salida)
+
+            legacy = '-' if args.sin_legacy else f"{estimar_escaneo_legacy(tabla, steps):.1f}s"
+            linea = f"{factor:>7}x {n_contactos:>10} {n_eventos:>10} {regeneracion:>13.2f}s {legacy:>22}"
+
+            if args.incremental:
+                estado = os.path.join(tmp, f'estado_x{factor}.json')
+                medir(tabla, steps, salida, incremental=True, state_path=estado)
+                modificar_contactos(tabla, CAMBIOS_INCREMENTAL)
+                linea += f" {medir(tabla, steps, salida, incremental=True, state_path=estado):>11.2f}s"
+            print(linea)
+
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
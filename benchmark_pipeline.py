@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escalado del pipeline del CRM
+Genera datos sintéticos (generar_datos_sinteticos) a cada escala y ejecuta
+crm_engine y generar_kpis (con los backends loop y pandas),
+analizar_duplicados y merge_steps_to_base, cada uno
+en su propio proceso dentro de un directorio temporal, midiendo tiempo y pico
+de RSS (ru_maxrss del proceso hijo). Compara con un baseline guardado
+(benchmark_pipeline_baseline.json) y marca las regresiones.
+Uso: python benchmark_pipeline.py --escalas 1000 10000 100000 [--guardar-baseline]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from generar_datos_sinteticos import generar, perfilar
+
+BASELINE_FILE = 'benchmark_pipeline_baseline.json'
+TOLERANCIA = 0.10  # Empeorar más de un 10% en tiempo o RSS cuenta como regresión
+RUIDO_SEGUNDOS = 0.05  # Por debajo de esta diferencia absoluta el tiempo es ruido, no regresión
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Script y argumentos; merge_steps_to_base va el último: reescribe TablaBase.csv
+SCRIPTS = {
+    'crm_engine': ['crm_engine.py'],
+    'crm_engine_pandas': ['crm_engine.py', '--backend', 'pandas'],
+    'generar_kpis': ['generar_kpis.py'],
+    'generar_kpis_pandas': ['generar_kpis.py', '--backend', 'pandas'],
+    'analizar_duplicados': ['analizar_duplicados.py'],
+    'merge_steps_to_base': ['merge_steps_to_base.py'],
+}
+
+
+def ejecutar(script: str, cwd: str) -> dict:
+    """Ejecuta un script en un proceso nuevo; tiempo de pared y pico de RSS de ese proceso"""
+    env = dict(os.environ, METRICAS_DIR=os.path.join(cwd, 'metricas'))
+    inicio = time.perf_counter()
+    archivo, *argumentos = SCRIPTS[script]
+    proceso = subprocess.Popen([sys.executable, os.path.join(DIRECTORIO, archivo), *argumentos], cwd=cwd,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = proceso.stderr.read()
+    _, estado, uso = os.wait4(proceso.pid, 0)
+    segundos = time.perf_counter() - inicio
+    proceso.returncode = os.waitstatus_to_exitcode(estado)
+    proceso.stderr.close()
+    if proceso.returncode != 0:
+        ultima = stderr.decode('utf-8', 'replace').strip().splitlines()[-1:] or ['']
+        return {'error': f"exit {proceso.returncode}: {ultima[0]}"}
+    rss_kb = uso.ru_maxrss if sys.platform != 'darwin' else uso.ru_maxrss / 1024  # macOS lo da en bytes
+    return {'segundos': round(segundos, 3), 'rss_mb': round(rss_kb / 1024, 1)}
+
+
+def medir_escala(contactos: int, scripts, perfil: dict, repeticiones: int, seed: int) -> dict:
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        datos = os.path.join(tmp, 'datos')
+        n_contactos, n_eventos = generar(datos, contactos, seed=seed, perfil=perfil)
+        for script in scripts:
+            mejor = None
+            for _ in range(repeticiones):
+                # Copia limpia por ejecución (merge reescribe la tabla, crm_engine deja su estado)
+                cwd = tempfile.mkdtemp(dir=tmp)
+                for nombre in os.listdir(datos):
+                    os.link(os.path.join(datos, nombre), os.path.join(cwd, nombre))
+                medida = ejecutar(script, cwd)
+                if 'error' in medida:
+                    mejor = medida
+                    break
+                if mejor is None:
+                    mejor = medida
+                else:
+                    mejor = {'segundos': min(mejor['segundos'], medida['segundos']),
+                             'rss_mb': max(mejor['rss_mb'], medida['rss_mb'])}
+            resultados[script] = dict(mejor, contactos=n_contactos, eventos=n_eventos)
+    return resultados
+
+
+def _variacion(actual, previo):
+    if not previo:
+        return None
+    return (actual - previo) / previo
+
+
+def comparar(resultados: dict, baseline: dict, tolerancia: float) -> list:
+    """Imprime la tabla actual vs baseline; devuelve las regresiones [(script, escala, métrica, variación)]"""
+    regresiones = []
+    print(f"{'Script':<22} {'Escala':>9} {'Eventos':>10} {'Segundos':>9} {'Δ tiempo':>9} "
+          f"{'RSS MB':>8} {'Δ RSS':>8}")
+    for script, por_escala in resultados.items():
+        for escala, actual in por_escala.items():
+            if 'error' in actual:
+                print(f"{script:<22} {escala:>9} {'':>10} ❌ {actual['error']}")
+                continue
+            previo = baseline.get(script, {}).get(escala, {})
+            marcas = []
+            for metrica in ('segundos', 'rss_mb'):
+                variacion = _variacion(actual[metrica], previo.get(metrica))
+                if variacion is None:
+                    marcas.append('-')
+                    continue
+                regresion = variacion > tolerancia and (
+                    metrica != 'segundos' or actual[metrica] - previo[metrica] > RUIDO_SEGUNDOS)
+                marcas.append(f"{variacion:+.0%}" + (' ⚠️' if regresion else ''))
+                if regresion:
+                    regresiones.append((script, escala, metrica, variacion))
+            print(f"{script:<22} {escala:>9} {actual['eventos']:>10} {actual['segundos']:>9.2f} {marcas[0]:>9} "
+                  f"{actual['rss_mb']:>8.1f} {marcas[1]:>8}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escalado del pipeline del CRM")
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Contactos por escala (los eventos siguen la proporción real)")
+    parser.add_argument('--scripts', nargs='+', choices=list(SCRIPTS), default=list(SCRIPTS))
+    parser.add_argument('--repeticiones', type=int, default=1, help="Se queda con el mejor tiempo")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--guardar-baseline', action='store_true',
+                        help="Guardar estos resultados como nuevo baseline")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    parser.add_argument('--salida', help="Escribir también los resultados en este JSON")
+    args = parser.parse_args()
+
+    # Perfil de los CSV reales del repo, aunque se ejecute desde otro directorio
+    perfil = perfilar(os.path.join(DIRECTORIO, 'TablaBase.csv'),
+                      os.path.join(DIRECTORIO, 'steps_apollo_resultado.csv'))
+    scripts = [s for s in SCRIPTS if s in args.scripts]
+
+    print("="*80)
+    print("BENCHMARK PIPELINE CRM")
+    print("="*80)
+    resultados = {s: {} for s in scripts}
+    for escala in args.escalas:
+        print(f"⏳ {escala} contactos...")
+        for script, medida in medir_escala(escala, scripts, perfil, args.repeticiones, args.seed).items():
+            resultados[script][str(escala)] = medida
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            previo = json.load(f)
+        baseline = previo.get('resultados', {})
+        print(f"Comparando con {args.baseline} ({previo.get('generado_en', '?')}, {previo.get('maquina', '?')})")
+    print("="*80)
+    regresiones = comparar(resultados, baseline, args.tolerancia)
+    print("="*80)
+    if baseline:
+        print(f"⚠️  {len(regresiones)} regresiones (> {args.tolerancia:.0%})" if regresiones
+              else "✓ Sin regresiones frente al baseline")
+
+    informe = {
+        'generado_en': datetime.now().isoformat(timespec='seconds'),
+        'maquina': f"{platform.node()} {platform.machine()} Python {platform.python_version()}",
+        'seed': args.seed,
+        'resultados': resultados,
+    }
+    for destino in filter(None, [args.salida, args.baseline if args.guardar_baseline else None]):
+        with open(destino, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"✓ Resultados guardados en: {destino}")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
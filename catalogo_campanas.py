@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Catálogo de Campañas - Secuencias de Apollo con sus steps, en disco
+Recorre TODAS las páginas de emailer_campaigns/search y guarda, por campaña,
+su nombre y la definición de sus steps en apollo_campaigns_catalog.json.
+Los scripts de sync resuelven id→nombre e id→step con lookups O(1) en
+memoria; el catálogo se refresca solo cuando caduca (TTL) o cuando aparece
+un id de campaña desconocido, nunca con una llamada por contacto.
+La lectura del archivo está en catalogo_local, que es lo que usa crm_engine.
+Uso: python catalogo_campanas.py [--forzar]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable
+
+from apollo_client import ApolloError, get_client
+from catalogo_local import CATALOGO_FILE, MAPPING_FILE, CatalogoLocal, _version
+
+# Configuración
+TTL_HORAS = float(os.getenv("APOLLO_CATALOGO_TTL_HORAS", 6))
+REFRESCO_MINIMO = 300  # Segundos entre refrescos por id desconocido (un id borrado no agota la cuota)
+PER_PAGE = 100
+
+
+def _paso(step: Dict) -> Dict:
+    return {
+        'id': step.get('id', ''),
+        'emailer_campaign_id': step.get('emailer_campaign_id', ''),
+        'position': step.get('position'),
+        'type': step.get('type', ''),
+        'wait_time': step.get('wait_time'),
+        'wait_mode': step.get('wait_mode', ''),
+    }
+
+
+class CatalogoCampanas(CatalogoLocal):
+    """
+    CatalogoLocal que se refresca desde Apollo. `online=False` nunca llama a
+    Apollo (para cualquier proceso que solo deba leer).
+    """
+
+    def __init__(self, path: str = CATALOGO_FILE, ttl_horas: float = TTL_HORAS, online: bool = True):
+        self.ttl = ttl_horas * 3600
+        self.online = online
+        self.lock = threading.Lock()
+        self._refresco_lock = threading.Lock()  # Un solo refresco a la vez entre hilos
+        self._ultimo_refresco_por_fallo = 0.0
+        super().__init__(path)
+
+    # ---------- Disco ----------
+
+    def guardar(self):
+        data = {'actualizado_en': self.actualizado_en, 'version': self.version, 'campanas': self.campanas}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        with open(MAPPING_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.nombres(), f, indent=2, ensure_ascii=False)
+
+    # ---------- Apollo ----------
+
+    def _buscar_campanas(self, client) -> Iterable[Dict]:
+        """Genera todas las campañas, página a página"""
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            response = client.post("emailer_campaigns/search", {"page": page, "per_page": PER_PAGE})
+            if response.status_code != 200:
+                raise ApolloError(response)
+            data = response.json()
+            yield from data.get('emailer_campaigns', [])
+            total_pages = (data.get('pagination') or {}).get('total_pages') or 1
+            page += 1
+
+    def _steps(self, client, campaign_id: str):
+        response = client.get(f"emailer_campaigns/{campaign_id}")
+        if response.status_code != 200:
+            raise ApolloError(response)
+        return [_paso(s) for s in response.json().get('emailer_steps', [])]
+
+    def refrescar(self) -> int:
+        """
+        Relee el catálogo completo de Apollo. Los steps solo se piden de las
+        campañas nuevas o cuyo num_steps cambió. Devuelve cuántas se pidieron.
+        Lanza ApolloError si Apollo no responde 200.
+        """
+        client = get_client()
+        llamadas = 0
+        campanas = {}
+        with self.lock:
+            previas = dict(self.campanas)
+        for c in self._buscar_campanas(client):
+            anterior = previas.get(c['id'], {})
+            steps = anterior.get('steps', [])
+            if 'num_steps' not in anterior or anterior['num_steps'] != c.get('num_steps'):
+                steps = self._steps(client, c['id'])
+                llamadas += 1
+            campanas[c['id']] = {
+                'id': c['id'],
+                'name': c.get('name', ''),
+                'active': c.get('active'),
+                'num_steps': c.get('num_steps'),
+                'steps': steps,
+            }
+        with self.lock:
+            self.campanas = campanas
+            self.actualizado_en = time.time()
+            self.version = _version(campanas)
+            self._indexar()
+            self.guardar()
+        return llamadas
+
+    def vigente(self) -> bool:
+        return time.time() - self.actualizado_en < self.ttl
+
+    def asegurar(self):
+        """Refresca si el TTL caducó; si Apollo falla se sigue con el catálogo viejo"""
+        if not self.online:
+            return
+        with self._refresco_lock:
+            if not self.vigente():
+                self._intentar_refresco()
+
+    def _intentar_refresco(self) -> bool:
+        try:
+            self.refrescar()
+        except (ApolloError, OSError, ValueError) as e:
+            print(f"⚠️  No se pudo refrescar el catálogo de campañas: {e}")
+            return False
+        return True
+
+    def _refrescar_por_fallo(self) -> bool:
+        """Refresco por id desconocido, como mucho uno cada REFRESCO_MINIMO segundos"""
+        if not self.online:
+            return False
+        with self._refresco_lock:
+            if time.time() - self._ultimo_refresco_por_fallo < REFRESCO_MINIMO:
+                return False
+            self._ultimo_refresco_por_fallo = time.time()
+            return self._intentar_refresco()
+
+
+_catalogo = None
+_catalogo_lock = threading.Lock()
+
+
+def get_catalogo() -> CatalogoCampanas:
+    """Catálogo compartido del proceso, refrescado si el TTL caducó"""
+    global _catalogo
+    with _catalogo_lock:
+        if _catalogo is None:
+            _catalogo = CatalogoCampanas()
+    _catalogo.asegurar()
+    return _catalogo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresca el catálogo de campañas de Apollo")
+    parser.add_argument('--forzar', action='store_true', help="Refrescar aunque el TTL no haya caducado")
+    args = parser.parse_args()
+
+    catalogo = CatalogoCampanas()
+    if args.forzar or not catalogo.vigente():
+        try:
+            llamadas = catalogo.refrescar()
+        except ApolloError as e:
+            print(f"Failed to fetch campaigns: {e.status_code}")
+            return
+        print(f"✓ Catálogo refrescado ({llamadas} consultas de steps)")
+    pasos = sum(len(c.get('steps', [])) for c in catalogo.campanas.values())
+    print(f"Cached {len(catalogo.campanas)} campaigns, {pasos} steps (versión {catalogo.version}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Catálogo Local - Lectura del catálogo de campañas sin tocar Apollo
+Lee apollo_campaigns_catalog.json (o, si aún no existe, el mapping antiguo
+{id: nombre}) y resuelve id→nombre e id→step en memoria. Solo usa la
+librería estándar: crm_engine y el servidor lo importan sin cargar
+apollo_client ni requests. El refresco desde Apollo vive en
+catalogo_campanas.CatalogoCampanas, que extiende esta clase.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+# Configuración
+CATALOGO_FILE = os.getenv("APOLLO_CATALOGO_FILE", "apollo_campaigns_catalog.json")
+MAPPING_FILE = 'apollo_campaigns_mapping.json'  # Formato antiguo {id: nombre}, se sigue escribiendo
+
+
+def _version(campanas: Dict[str, Dict]) -> str:
+    """Huella del contenido (no cambia si un refresco trae lo mismo)"""
+    texto = json.dumps(campanas, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class CatalogoLocal:
+    """{id: campaña} más índices por step, tal como está en disco"""
+
+    def __init__(self, path: str = CATALOGO_FILE):
+        self.path = path
+        self.campanas = {}
+        self.actualizado_en = 0.0
+        self.version = ''
+        self._indexar()
+        self.cargar()
+
+    # ---------- Disco ----------
+
+    def cargar(self):
+        """Lee el catálogo; si no existe, al menos los nombres del mapping antiguo"""
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.campanas = data.get('campanas', {})
+            self.actualizado_en = data.get('actualizado_en', 0.0)
+        elif os.path.exists(MAPPING_FILE):
+            with open(MAPPING_FILE, 'r', encoding='utf-8') as f:
+                self.campanas = {cid: {'id': cid, 'name': nombre, 'steps': []}
+                                 for cid, nombre in json.load(f).items()}
+            self.actualizado_en = 0.0  # Sin steps: caducado desde el principio
+        self.version = _version(self.campanas)
+        self._indexar()
+
+    def _indexar(self):
+        self._nombres = {cid: c.get('name', '') for cid, c in self.campanas.items()}
+        self._pasos = {}
+        self._pasos_por_numero = {}
+        for cid, c in self.campanas.items():
+            for paso in c.get('steps', []):
+                self._pasos[paso['id']] = paso
+                self._pasos_por_numero[(cid, str(paso.get('position')))] = paso
+
+    def _refrescar_por_fallo(self) -> bool:
+        """Sin Apollo no hay refresco: un id desconocido se queda sin resolver"""
+        return False
+
+    # ---------- Lookups O(1) ----------
+
+    def nombres(self) -> Dict[str, str]:
+        return dict(self._nombres)
+
+    def nombre(self, campaign_id: str, default: str = '') -> str:
+        if not campaign_id:
+            return default
+        nombre = self._nombres.get(campaign_id)
+        if nombre is None and self._refrescar_por_fallo():
+            nombre = self._nombres.get(campaign_id)
+        return nombre if nombre is not None else default
+
+    def paso(self, step_id: str) -> Optional[Dict]:
+        if not step_id:
+            return None
+        paso = self._pasos.get(step_id)
+        if paso is None and self._refrescar_por_fallo():
+            paso = self._pasos.get(step_id)
+        return paso
+
+    def paso_por_numero(self, campaign_id: str, numero) -> Optional[Dict]:
+        if not campaign_id or numero in (None, ''):
+            return None
+        clave = (campaign_id, str(numero))
+        paso = self._pasos_por_numero.get(clave)
+        if paso is None and campaign_id not in self._nombres and self._refrescar_por_fallo():
+            paso = self._pasos_por_numero.get(clave)
+        return paso
@@ -3,16 +3,44 @@
 CRM Backend - API para actualización y servicio del dashboard
 """
 
-from flask import Flask, jsonify, send_file
+from flask import Flask, Response, g, jsonify, request, send_file
 from flask_cors import CORS
 import subprocess
-import json
 import os
+import threading
+import time
 from datetime import datetime
 
+import crm_engine
+import metricas
+from dashboard_cache import DashboardCache
+
 app = Flask(__name__)
 CORS(app)
 
+DATA_FILE = 'crm_dashboard_data_full.json'
+dashboard_cache = DashboardCache(DATA_FILE)
+engine_lock = threading.Lock()  # Un solo cálculo del engine a la vez
+
+@app.before_request
+def iniciar_medicion():
+    g.inicio = time.perf_counter()
+
+@app.after_request
+def medir_peticion(response):
+    """Latencia y tamaño de respuesta por ruta (la regla, no la URL concreta)"""
+    ruta = request.url_rule.rule if request.url_rule is not None else 'otra'
+    metricas.HTTP_DURACION.observe(time.perf_counter() - g.inicio, metodo=request.method,
+                                   ruta=ruta, status=response.status_code)
+    if response.content_length is not None:
+        metricas.HTTP_BYTES.observe(response.content_length, ruta=ruta)
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    """Métricas en formato Prometheus (este servidor + volcados de los scripts de sync)"""
+    return Response(metricas.exponer_todo(), content_type=metricas.CONTENT_TYPE)
+
 @app.route('/')
 def index():
     """Servir el dashboard"""
@@ -20,36 +48,27 @@ def index():
 
 @app.route('/api/data')
 def get_data():
-    """Obtener datos del dashboard"""
+    """Obtener datos del dashboard (bytes precomprimidos según Accept-Encoding)"""
     try:
-        with open('crm_dashboard_data_full.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return jsonify(data)
+        payload = dashboard_cache.obtener()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    headers = {'ETag': payload.etag, 'Vary': 'Accept-Encoding'}
+    if payload.coincide(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=headers)
+    encoding, contenido = payload.codificar(request.headers.get('Accept-Encoding'))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(contenido, mimetype='application/json', headers=headers)
+
 @app.route('/api/refresh', methods=['POST'])
 def refresh_data():
     """Actualizar datos del CRM"""
     try:
-        # 1. Regenerar KPIs
-        result = subprocess.run(
-            ['python3', 'crm_engine.py'],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        if result.returncode != 0:
-            return jsonify({
-                'success': False,
-                'error': 'Error al regenerar KPIs',
-                'details': result.stderr
-            }), 500
-
-        # 2. Leer datos actualizados
-        with open('crm_dashboard_data_full.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # 1. Regenerar KPIs en este proceso (cada petición de Flask ya corre en su hilo)
+        with engine_lock:
+            data = crm_engine.generate_full_data(output_path=DATA_FILE, compacto=True, cache=dashboard_cache)
 
         return jsonify({
             'success': True,
@@ -58,11 +77,6 @@ def refresh_data():
             'data': data
         })
 
-    except subprocess.TimeoutExpired:
-        return jsonify({
-            'success': False,
-            'error': 'Timeout al actualizar datos'
-        }), 500
     except Exception as e:
         return jsonify({
             'success': False,
@@ -2,201 +2,999 @@
 """
 CRM Engine v2 - Intelligent KPI Processor
 Mapea los KPIs específicos solicitados por el usuario.
+Una sola pasada en streaming por cada entrada (historial y TablaBase) que
+alimenta a la vez todos los agregadores.
+
+Modo incremental (--incremental): guarda el estado agregado, los feeds y una
+huella por contacto/evento en crm_engine_state.json. En la siguiente ejecución
+un archivo sin cambios (mtime y tamaño) ni se relee, y del que cambió solo se
+recalcula el aporte de las filas nuevas, cambiadas o eliminadas.
+
+Modo compacto (--compact): JSON sin indentación (orjson si está instalado)
+escrito en streaming junto a sus hermanos .gz/.br, que los servidores sirven
+tal cual.
+
+El historial se lee del snapshot por columnas (eventos_columnar) si existe y
+está al día con el CSV: solo las columnas de COLUMNAS_EVENTO, deduplicando
+sobre los códigos antes de crear ningún dict.
+
+Backend vectorizado (--backend pandas): mismos KPIs con operaciones por
+columna y groupbys de pandas; siempre recalcula todo (sin --incremental).
+
+Modo perfil (--profile): mide tiempo, filas y pico de memoria (tracemalloc)
+de cada etapa y lo añade al JSON de salida en la sección `_profile`.
 """
 
+import argparse
 import csv
+import hashlib
+import heapq
 import json
-from collections import defaultdict, Counter
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+from itertools import count
+
+import metricas
+from catalogo_local import CatalogoLocal
+import eventos_columnar
+from dashboard_cache import EscritorPayload, borrar_hermanos, serializar
+
+# Estados de llamada que NO cuentan como contestada
+ESTADOS_SIN_CONTESTAR = ['NO CONTESTA', 'APAGADO', 'REPICADOR', 'BUZON']
+STATUS_EMAIL_ENVIADO = ['sent', 'completed', 'opened', 'clicked', 'replied', 'scheduled']
+TOP_OBSERVACIONES = 30
+TOP_ACTIVIDAD = 30
+MAX_PIPELINE = 100
+
+STATE_FILE = 'crm_engine_state.json'
+STATE_VERSION = 2  # Subir si cambia la forma de calcular los aportes o las huellas
+MB = 1024 * 1024
+
+# Columnas del historial que usa el motor (firma, aportes y feed de actividad)
+COLUMNAS_FIRMA = ('To Email', 'Type', 'Step', 'Subject')
+COLUMNAS_EVENTO = COLUMNAS_FIRMA + ('Task Status', 'Contact Name', 'Account', 'Sequence',
+                                    'Completed Date (PST)', 'Due Date (PST)')
 
-def generate_full_data():
-    print("Generating Specialized CRM KPIs...")
 
-    # 1. Leer Datos
-    contactos_base = []
-    with open('TablaBase.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            contactos_base.append(row)
+def leer_contactos(path):
+    """Genera las filas de TablaBase.csv sin materializar la lista"""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
 
-    historial_eventos = []
+
+def firma_evento(row):
+    return f"{row.get('To Email')}_{row.get('Type')}_{row.get('Step')}_{row.get('Subject')}"
+
+
+def _primeras_por_codigos(codigos, cardinalidades):
+    """Posiciones (ordenadas) de la primera aparición de cada combinación de códigos"""
+    import numpy as np  # Solo con snapshot o backend pandas, que ya lo cargan
+    # Los códigos combinados en un solo entero (si caben en 63 bits)
+    if sum(max(1, n - 1).bit_length() for n in cardinalidades) <= 63:
+        claves = np.zeros(len(codigos[0]), dtype=np.int64)
+        for columna, n in zip(codigos, cardinalidades):
+            claves *= n
+            claves += columna
+        _, primeras = np.unique(claves, return_index=True)
+    else:
+        claves = np.stack([columna.astype(np.int64) for columna in codigos], axis=1)
+        _, primeras = np.unique(claves, axis=0, return_index=True)
+    primeras.sort()
+    return primeras
+
+
+def _eventos_snapshot(snapshot):
+    """
+    leer_eventos desde el snapshot: np.unique sobre los códigos de la firma
+    deja la primera aparición de cada combinación y solo esas filas se
+    convierten en dicts (con las columnas de COLUMNAS_EVENTO)
+    """
+    if snapshot.filas == 0:
+        return
+    primeras = _primeras_por_codigos([snapshot.codigos(c) for c in COLUMNAS_FIRMA],
+                                     [len(snapshot.valores(c)) for c in COLUMNAS_FIRMA])
+    seen_signatures = set()  # Dos combinaciones distintas pueden dar la misma firma en texto
+    for row in snapshot.filas_dict(list(COLUMNAS_EVENTO), primeras):
+        signature = firma_evento(row)
+        if signature not in seen_signatures:
+            seen_signatures.add(signature)
+            yield signature, row
+
+
+def leer_eventos(path):
+    """Genera (firma, fila) del historial eliminando duplicados exactos (KPIs limpios)"""
+    snapshot = eventos_columnar.abrir(path)
+    if snapshot is not None and snapshot.tiene(COLUMNAS_EVENTO):
+        try:
+            yield from _eventos_snapshot(snapshot)
+        finally:
+            snapshot.cerrar()
+        return
     try:
-        with open('steps_apollo_resultado.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            # Eliminar duplicados exactos en el historial para KPIs limpios
+        with open(path, 'r', encoding='utf-8') as f:
             seen_signatures = set()
-            for row in reader:
-                signature = f"{row.get('To Email')}_{row.get('Type')}_{row.get('Step')}_{row.get('Subject')}"
+            for row in csv.DictReader(f):
+                signature = firma_evento(row)
                 if signature not in seen_signatures:
-                    historial_eventos.append(row)
                     seen_signatures.add(signature)
-    except:
+                    yield signature, row
+    except Exception:
         print("Warning: steps_apollo_resultado.csv issue.")
 
-    # 2. Calcular KPIs Específicos
-    stats = {
-        "email": {"sent": 0, "replied": 0, "total": 0},
-        "calls": {"realized": 0, "answered": 0, "meetings": 0},
-        "linkedin": {"sent": 0, "replied": 0},
-        "other": {"sent": 0, "replied": 0}
+
+def huella(row):
+    """Huella estable del contenido de una fila (para detectar cambios entre ejecuciones)"""
+    return hashlib.blake2b('\x1f'.join(map(str, row.values())).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def huella_evento(h):
+    """Huella de las columnas que usa el motor: igual venga la fila del CSV o del snapshot"""
+    return huella({c: h.get(c, '') for c in COLUMNAS_EVENTO})
+
+
+def firma_archivo(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+@lru_cache(maxsize=4096)
+def _parsear_fecha(d):
+    # Pocas fechas distintas y muchos eventos: cada texto se parsea una vez
+    try: return datetime.strptime(d, "%B %d, %Y %H:%M")
+    except: return datetime.min
+
+
+def fecha_evento(h):
+    return _parsear_fecha(h.get('Completed Date (PST)') or h.get('Due Date (PST)', ''))
+
+
+class TopN:
+    """
+    Los N mayores por clave, alimentado en streaming.
+    Mismo resultado que sorted(items, key=key, reverse=True)[:n]
+    (a igualdad de clave gana el que llegó antes).
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.heap = []
+        self.seq = count()
+
+    def push(self, key, item):
+        entry = (key, -next(self.seq), item)
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self):
+        return [item for _, _, item in sorted(self.heap, key=lambda e: e[:2], reverse=True)]
+
+
+# ---------- Perfil por etapas (--profile) ----------
+
+class Perfil:
+    """
+    Tiempo, filas y pico de memoria por etapa. Las sub-etapas (p.ej.
+    'historial.lectura') acumulan tiempo y filas/llamadas dentro de su etapa;
+    las filas de una etapa son las de su sub-etapa '.lectura'.
+    tracemalloc ralentiza el cálculo: los tiempos sirven para comparar
+    ejecuciones con --profile entre sí, no con ejecuciones normales.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+        self.inicio = time.perf_counter()
+        self._propio = not tracemalloc.is_tracing()
+        if self._propio:
+            tracemalloc.start()
+
+    def _registro(self, nombre):
+        return self.etapas.setdefault(nombre, {'segundos': 0.0, 'filas': 0})
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide un bloque (tiempo y pico de memoria mientras dura)"""
+        registro = self.etapas.setdefault(nombre, {'segundos': 0.0})
+        tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['segundos'] += time.perf_counter() - inicio
+            pico = tracemalloc.get_traced_memory()[1] / MB
+            registro['pico_memoria_mb'] = max(registro.get('pico_memoria_mb', 0.0), pico)
+
+    def iterar(self, nombre, iterable):
+        """Genera los elementos de `iterable` contando el tiempo que tarda en producirlos"""
+        registro = self._registro(nombre)
+        iterador = iter(iterable)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                registro['segundos'] += time.perf_counter() - inicio
+                return
+            registro['segundos'] += time.perf_counter() - inicio
+            registro['filas'] += 1
+            yield elemento
+
+    def cronometrar(self, nombre, funcion):
+        """Envuelve `funcion` acumulando su tiempo y número de llamadas"""
+        def medida(*args):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args)
+            finally:
+                registro = self._registro(nombre)
+                registro['segundos'] += time.perf_counter() - inicio
+                registro['filas'] += 1
+        return medida
+
+    def resultado(self):
+        etapas = {nombre: {k: round(v, 4) if isinstance(v, float) else v for k, v in r.items()}
+                  for nombre, r in self.etapas.items()}
+        for nombre, registro in etapas.items():
+            lectura = etapas.get(f"{nombre}.lectura")
+            if lectura is not None:
+                registro['filas'] = lectura['filas']
+        picos = [r['pico_memoria_mb'] for r in self.etapas.values() if 'pico_memoria_mb' in r]
+        resultado = {
+            'total_segundos': round(time.perf_counter() - self.inicio, 4),
+            'pico_memoria_mb': round(max(picos, default=0.0), 2),
+            'python': sys.version.split()[0],
+            'etapas': etapas
+        }
+        try:
+            import resource
+            # ru_maxrss: KB en Linux
+            resultado['rss_max_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            pass
+        return resultado
+
+    def cerrar(self):
+        if self._propio:
+            tracemalloc.stop()
+
+
+def _medido(perfil, nombre, funcion):
+    return funcion if perfil is None else perfil.cronometrar(nombre, funcion)
+
+
+def _iterado(perfil, nombre, iterable):
+    return iterable if perfil is None else perfil.iterar(nombre, iterable)
+
+
+@contextmanager
+def _etapa(perfil, nombre):
+    if perfil is None:
+        yield
+    else:
+        with perfil.etapa(nombre):
+            yield
+
+
+# ---------- Aportes por fila (lo único que se recalcula en modo incremental) ----------
+
+def aporte_evento(h):
+    """Lo que un evento del historial suma a los KPIs"""
+    m_type = h.get('Type', '').lower()
+    status = h.get('Task Status', '').lower()
+    email_total = email_sent = email_replied = li_sent = li_replied = 0
+
+    # 1. Emails
+    if 'email' in m_type:
+        email_total = 1
+        # Incluir scheduled como emails enviados/programados
+        if status in STATUS_EMAIL_ENVIADO:
+            email_sent = 1
+        if 'replied' in status or 'respondido' in status:
+            email_replied = 1
+
+    # 2. LinkedIn
+    elif 'linkedin' in m_type:
+        li_sent = 1
+        if 'replied' in status:
+            li_replied = 1
+
+    return {
+        'email': h.get('To Email', '').lower(),
+        'kpis': [email_total, email_sent, email_replied, li_sent, li_replied]
     }
 
-    # Procesar Historial (Apollo)
-    for h in historial_eventos:
-        m_type = h.get('Type', '').lower()
-        status = h.get('Task Status', '').lower()
-
-        # 1. Emails
-        if 'email' in m_type:
-            stats["email"]["total"] += 1
-            # Incluir scheduled como emails enviados/programados
-            if status in ['sent', 'completed', 'opened', 'clicked', 'replied', 'scheduled']:
-                stats["email"]["sent"] += 1
-            if 'replied' in status or 'respondido' in status:
-                stats["email"]["replied"] += 1
-
-        # 2. LinkedIn
-        elif 'linkedin' in m_type:
-            stats["linkedin"]["sent"] += 1
-            if 'replied' in status:
-                stats["linkedin"]["replied"] += 1
-
-    # Procesar contactos de Apollo en TablaBase
-    for c in contactos_base:
-        apollo_status = c.get('apollo_status', '').lower()
-
-        # Contar emails de Apollo
-        if apollo_status == 'scheduled':
-            # Evitar contar duplicados si ya están en historial_eventos
-            email = c.get('EMAIL_LIMPIO', '').strip().lower()
-            en_historial = any(h.get('To Email', '').lower() == email for h in historial_eventos)
-            if not en_historial:
-                stats["email"]["total"] += 1
-                stats["email"]["sent"] += 1
-
-    # Procesar Tabla Base (Manual Actions & States)
-    for c in contactos_base:
-        step = c.get('STEP', '').upper()
-        estado = c.get('ESTADO', '').upper()
-        
-        # 2. Llamadas
-        if 'LLAMADA' in step:
-            stats["calls"]["realized"] += 1
-            # Si el estado no es "NO CONTESTA" o "APAGADO", asumimos contestada
-            if estado not in ['NO CONTESTA', 'APAGADO', 'REPICADOR', 'BUZON']:
-                if estado != 'SIN GESTION' and estado != '':
-                    stats["calls"]["answered"] += 1
-        
-        if 'AGENDADO' in estado or 'REUNION' in estado:
-            stats["calls"]["meetings"] += 1
-
-    # 3. Análisis de Steps y Conversiones
-    steps_metrics = defaultdict(lambda: {
-        'total': 0, 'interesado': 0, 'agendado': 0,
-        'no_interesado': 0, 'no_contesta': 0, 'sin_respuesta': 0
-    })
-
-    observaciones_recientes = []
-
-    for c in contactos_base:
-        step = c.get('STEP', '')
-        estado = c.get('ESTADO', '').upper()
-
-        if step and step not in ['SIN GESTION', '']:
-            steps_metrics[step]['total'] += 1
-
-            if 'INTERESADO' in estado:
-                steps_metrics[step]['interesado'] += 1
-            elif 'AGENDADO' in estado:
-                steps_metrics[step]['agendado'] += 1
-            elif 'NO INTERESADO' in estado or 'NO PERFIL' in estado:
-                steps_metrics[step]['no_interesado'] += 1
-            elif 'NO CONTESTA' in estado or 'APAGADO' in estado:
-                steps_metrics[step]['no_contesta'] += 1
-            else:
-                steps_metrics[step]['sin_respuesta'] += 1
-
-        # Capturar observaciones con contenido real
-        obs = c.get('observaciones', '').strip()
-        if obs and len(obs) > 10:
-            observaciones_recientes.append({
-                'contacto': c.get('Contacto', 'Sin nombre'),
-                'empresa': c.get('Empresa', ''),
-                'observacion': obs,
-                'estado': c.get('ESTADO', ''),
-                'step': c.get('STEP', ''),
-                'fecha': c.get('fecha gestion envio secuencia 2025- 2026', '')
-            })
 
-    # Ordenar observaciones por fecha (las más recientes primero)
-    observaciones_recientes = sorted(
-        observaciones_recientes,
-        key=lambda x: x.get('fecha', ''),
-        reverse=True
-    )[:30]
-
-    # 3. Pipeline Mapping
-    pipeline = {
-        'NUEVOS': [],
-        'EN_SECUENCIA': [],
-        'INTERESADOS': [],
-        'AGENDADOS': [],
-        'RECHAZADOS': []
+def item_actividad(h):
+    return {
+        'contact': h.get('Contact Name'),
+        'account': h.get('Account'),
+        'type': h.get('Type'),
+        'status': h.get('Task Status'),
+        'sequence': h.get('Sequence') or 'Sin secuencia',
+        'step': h.get('Step') or '-',
+        'date': h.get('Completed Date (PST)') or h.get('Due Date (PST)')
     }
 
-    status_counts = Counter()
-    for c in contactos_base:
-        estado = c.get('ESTADO', 'SIN GESTION').upper()
-        category = 'NUEVOS'
-        if 'INTERESADO' in estado: category = 'INTERESADOS'
-        elif 'AGENDADO' in estado: category = 'AGENDADOS'
-        elif 'NO_INTERESADO' in estado: category = 'RECHAZADOS'
-        elif c.get('campaña'): category = 'EN_SECUENCIA'
-        
-        # Usar apollo_name si Contacto está vacío
-        contact_name = c.get('Contacto') or c.get('apollo_name') or 'Sin Nombre'
-        
-        pipeline[category].append({
-            'name': contact_name,
+
+def aporte_contacto(c, campanas=None):
+    """Lo que un contacto de TablaBase suma a los KPIs (`campanas`: {id: nombre} del catálogo)"""
+    step = c.get('STEP', '')
+    step_upper = step.upper()
+    estado_raw = c.get('ESTADO', '')
+    estado = estado_raw.upper()
+
+    # Emails de Apollo programados (solo cuentan si no están ya en el historial)
+    programado = None
+    if c.get('apollo_status', '').lower() == 'scheduled':
+        programado = c.get('EMAIL_LIMPIO', '').strip().lower()
+
+    # Llamadas
+    realized = answered = meetings = 0
+    if 'LLAMADA' in step_upper:
+        realized = 1
+        # Si el estado no es "NO CONTESTA" o "APAGADO", asumimos contestada
+        if estado not in ESTADOS_SIN_CONTESTAR:
+            if estado != 'SIN GESTION' and estado != '':
+                answered = 1
+
+    if 'AGENDADO' in estado or 'REUNION' in estado:
+        meetings = 1
+
+    # Análisis de Steps y Conversiones
+    bucket = None
+    if step and step not in ['SIN GESTION', '']:
+        if 'INTERESADO' in estado:
+            bucket = 'interesado'
+        elif 'AGENDADO' in estado:
+            bucket = 'agendado'
+        elif 'NO INTERESADO' in estado or 'NO PERFIL' in estado:
+            bucket = 'no_interesado'
+        elif 'NO CONTESTA' in estado or 'APAGADO' in estado:
+            bucket = 'no_contesta'
+        else:
+            bucket = 'sin_respuesta'
+
+    # Capturar observaciones con contenido real
+    observacion = None
+    obs = c.get('observaciones', '').strip()
+    if obs and len(obs) > 10:
+        observacion = {
+            'contacto': c.get('Contacto', 'Sin nombre'),
+            'empresa': c.get('Empresa', ''),
+            'observacion': obs,
+            'estado': estado_raw,
+            'step': step,
+            'fecha': c.get('fecha gestion envio secuencia 2025- 2026', '')
+        }
+
+    # Campaña: la de la hoja o, si solo hay id de secuencia, la del catálogo
+    campana = c.get('campaña') or (campanas or {}).get(c.get('apollo_sequence_id', ''), '')
+
+    # Pipeline Mapping
+    category = 'NUEVOS'
+    if 'INTERESADO' in estado: category = 'INTERESADOS'
+    elif 'AGENDADO' in estado: category = 'AGENDADOS'
+    elif 'NO_INTERESADO' in estado: category = 'RECHAZADOS'
+    elif campana: category = 'EN_SECUENCIA'
+
+    return {
+        'programado': programado,
+        'calls': [realized, answered, meetings],
+        'step': step if bucket else None,
+        'bucket': bucket,
+        'observacion': observacion,
+        'categoria': category,
+        'pipeline': {
+            # Usar apollo_name si Contacto está vacío
+            'name': c.get('Contacto') or c.get('apollo_name') or 'Sin Nombre',
             'company': c.get('Empresa') or c.get('apollo_org') or '-',
             'email': c.get('EMAIL_LIMPIO'),
             'apollo_status': c.get('estado_apollo') or c.get('apollo_status') or c.get('ESTADO'),
-            'current_campaign': c.get('campaña') or '',
+            'current_campaign': campana,
             'current_step': c.get('step_numero') or c.get('STEP') or ''
-        })
-        status_counts[category] += 1
-
-    # Recent Activity (para el feed)
-    def get_date(x):
-        d = x.get('Completed Date (PST)') or x.get('Due Date (PST)', '')
-        try: return datetime.strptime(d, "%B %d, %Y %H:%M")
-        except: return datetime.min
-
-    historial_ordenado = sorted(historial_eventos, key=get_date, reverse=True)
-
-    # 4. Final Data Structure
-    final_data = {
-        'timestamp': datetime.now().isoformat(),
-        'kpis_v2': stats,
-        'steps_metrics': dict(steps_metrics),
-        'observaciones': observaciones_recientes,
-        'pipeline': {k: v[:100] for k, v in pipeline.items()},
-        'recent_activity': [{
-            'contact': h.get('Contact Name'),
-            'account': h.get('Account'),
-            'type': h.get('Type'),
-            'status': h.get('Task Status'),
-            'sequence': h.get('Sequence') or 'Sin secuencia',
-            'step': h.get('Step') or '-',
-            'date': h.get('Completed Date (PST)') or h.get('Due Date (PST)')
-        } for h in historial_ordenado[:30]],
-        'counts': dict(status_counts)
+        }
     }
 
-    with open('crm_dashboard_data_full.json', 'w', encoding='utf-8') as f:
-        json.dump(final_data, f, indent=2, ensure_ascii=False)
 
+class AgregadorKPIs:
+    """
+    Acumula los KPIs del dashboard aplicando aportes con signo
+    (+n al añadir filas, -n al retirarlas), y arma los feeds top-N
+    recorriendo las filas en orden.
+    """
+
+    def __init__(self, agregados=None, feeds=None):
+        agregados = agregados or {}
+        feeds = feeds or {}
+        self.kpis = agregados.get('kpis', [0] * 8)  # email total/sent/replied, linkedin sent/replied, calls
+        self.steps_metrics = agregados.get('steps_metrics', {})
+        self.status_counts = Counter(agregados.get('counts', {}))
+        # Índice de emails del historial para lookups O(1) por contacto
+        self.eventos_por_email = Counter(agregados.get('eventos_por_email', {}))
+        self.programados_por_email = Counter(agregados.get('programados_por_email', {}))
+        # Programados en TablaBase cuyo email no aparece en el historial
+        self.programados_fuera = agregados.get('programados_fuera', 0)
+
+        self.observaciones = TopN(TOP_OBSERVACIONES)
+        self.actividad = TopN(TOP_ACTIVIDAD)
+        self.pipeline = {
+            'NUEVOS': [],
+            'EN_SECUENCIA': [],
+            'INTERESADOS': [],
+            'AGENDADOS': [],
+            'RECHAZADOS': []
+        }
+        # Feeds ya calculados de una fuente que no cambió (modo incremental)
+        self.actividad_previa = feeds.get('actividad')
+        self.contactos_previos = feeds.get('contactos')
+
+    # ---------- Agregados ----------
+
+    def aplicar_evento(self, aporte, n=1):
+        for i, v in enumerate(aporte['kpis']):
+            self.kpis[i] += v * n
+
+        email = aporte['email']
+        antes = self.eventos_por_email[email] > 0
+        self.eventos_por_email[email] += n
+        despues = self.eventos_por_email[email] > 0
+        if not despues:
+            del self.eventos_por_email[email]
+        if antes != despues:
+            programados = self.programados_por_email[email]
+            self.programados_fuera += -programados if despues else programados
+
+    def aplicar_contacto(self, aporte, n=1):
+        email = aporte['programado']
+        if email is not None:
+            self.programados_por_email[email] += n
+            if not self.programados_por_email[email]:
+                del self.programados_por_email[email]
+            if email not in self.eventos_por_email:
+                self.programados_fuera += n
+
+        for i, v in enumerate(aporte['calls']):
+            self.kpis[5 + i] += v * n
+
+        if aporte['bucket']:
+            metrics = self.steps_metrics.setdefault(aporte['step'], {
+                'total': 0, 'interesado': 0, 'agendado': 0,
+                'no_interesado': 0, 'no_contesta': 0, 'sin_respuesta': 0
+            })
+            metrics['total'] += n
+            metrics[aporte['bucket']] += n
+            if not metrics['total']:
+                del self.steps_metrics[aporte['step']]
+
+        categoria = aporte['categoria']
+        self.status_counts[categoria] += n
+        if not self.status_counts[categoria]:
+            del self.status_counts[categoria]
+
+    # ---------- Feeds (en orden de fila) ----------
+
+    def feed_evento(self, h):
+        # Recent Activity (para el feed)
+        self.actividad.push(fecha_evento(h), h)
+
+    def feed_contacto(self, aporte):
+        # Ordenar observaciones por fecha (las más recientes primero)
+        if aporte['observacion']:
+            self.observaciones.push(aporte['observacion']['fecha'], aporte['observacion'])
+        lista = self.pipeline[aporte['categoria']]
+        if len(lista) < MAX_PIPELINE:
+            lista.append(aporte['pipeline'])
+
+    def agregados(self):
+        return {
+            'kpis': self.kpis,
+            'steps_metrics': self.steps_metrics,
+            'counts': dict(self.status_counts),
+            'eventos_por_email': dict(self.eventos_por_email),
+            'programados_por_email': dict(self.programados_por_email),
+            'programados_fuera': self.programados_fuera
+        }
+
+    def feeds(self):
+        resultado = self.resultado()
+        return {
+            'actividad': resultado['recent_activity'],
+            'contactos': {'observaciones': resultado['observaciones'], 'pipeline': resultado['pipeline']}
+        }
+
+    def resultado(self):
+        k = self.kpis
+        stats = {
+            "email": {"sent": k[1] + self.programados_fuera, "replied": k[2],
+                      "total": k[0] + self.programados_fuera},
+            "calls": {"realized": k[5], "answered": k[6], "meetings": k[7]},
+            "linkedin": {"sent": k[3], "replied": k[4]},
+            "other": {"sent": 0, "replied": 0}
+        }
+        if self.actividad_previa is not None:
+            actividad = self.actividad_previa
+        else:
+            actividad = [item_actividad(h) for h in self.actividad.items()]
+        contactos = self.contactos_previos or {
+            'observaciones': self.observaciones.items(),
+            'pipeline': self.pipeline
+        }
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'kpis_v2': stats,
+            'steps_metrics': {step: dict(m) for step, m in self.steps_metrics.items()},
+            'observaciones': contactos['observaciones'],
+            'pipeline': contactos['pipeline'],
+            'recent_activity': actividad,
+            'counts': dict(self.status_counts)
+        }
+
+
+# ---------- Backend vectorizado (--backend pandas) ----------
+# Mismo resultado que AgregadorKPIs en una ejecución completa: los agregados
+# salen de operaciones por columna y groupbys, y solo las pocas filas que
+# entran en los feeds (top-N y pipeline) pasan por las funciones de arriba.
+
+BACKENDS = ('loop', 'pandas')
+BUCKETS = ('interesado', 'agendado', 'no_interesado', 'no_contesta', 'sin_respuesta')
+# Columnas de TablaBase que lee aporte_contacto
+COLUMNAS_CONTACTO = ('STEP', 'ESTADO', 'apollo_status', 'EMAIL_LIMPIO', 'observaciones', 'Contacto',
+                     'Empresa', 'fecha gestion envio secuencia 2025- 2026', 'campaña',
+                     'apollo_sequence_id', 'apollo_name', 'apollo_org', 'estado_apollo', 'step_numero')
+
+
+def _leer_df(path, columnas, dtype=str):
+    """CSV como DataFrame de texto con las `columnas` que tenga (mismo texto que csv.DictReader)"""
+    import pandas as pd  # Solo lo usa este backend y su import no es gratis
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            return pd.read_csv(f, dtype=dtype, na_filter=False, usecols=lambda c: c in columnas)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+
+def _col(df, columna, defecto=None):
+    """df[columna], o `defecto` en todas las filas si no existe (como row.get)"""
+    import pandas as pd
+    return df[columna] if columna in df else pd.Series(defecto, index=df.index, dtype=object)
+
+
+def _o(a, b):
+    """`a or b` fila a fila (texto vacío o None son falsos)"""
+    return a.where(a.notna() & a.ne(''), b)
+
+
+def _contiene(serie, texto):
+    return serie.str.contains(texto, regex=False)
+
+
+def _primeras_por_fecha(claves, n):
+    """Posiciones de las n mayores `claves`; a igualdad, la fila anterior primero (como TopN)"""
+    import numpy as np
+    return np.lexsort((np.arange(len(claves)), -claves))[:n]
+
+
+def _historial_df(steps_path):
+    """
+    El historial sin duplicados exactos (misma firma que leer_eventos) en
+    columnas categóricas: se deduplica sobre los códigos y los .str operan
+    sobre los valores distintos, no fila a fila
+    """
+    import pandas as pd
+    snapshot = eventos_columnar.abrir(steps_path)
+    if snapshot is not None and snapshot.tiene(COLUMNAS_EVENTO):
+        try:
+            df = pd.DataFrame({c: pd.Categorical.from_codes(snapshot.codigos(c), snapshot.valores(c))
+                               for c in COLUMNAS_EVENTO})
+        finally:
+            snapshot.cerrar()
+    else:
+        try:
+            df = _leer_df(steps_path, COLUMNAS_EVENTO, dtype='category')
+        except Exception:
+            print("Warning: steps_apollo_resultado.csv issue.")
+            return pd.DataFrame()
+    if df.empty:
+        return df
+    firma = [c for c in COLUMNAS_FIRMA if c in df]
+    if not firma:
+        return df.iloc[:1]  # Sin columnas de firma todas las filas tienen la misma
+    df = df.iloc[_primeras_por_codigos([df[c].cat.codes.to_numpy() for c in firma],
+                                       [len(df[c].cat.categories) for c in firma])]
+    # Dos combinaciones distintas pueden dar la misma firma en texto
+    texto = _col(df, COLUMNAS_FIRMA[0]).astype(str)
+    for columna in COLUMNAS_FIRMA[1:]:
+        texto = texto + '_' + _col(df, columna).astype(str)
+    return df[~texto.duplicated()].reset_index(drop=True)
+
+
+def _kpis_historial(ev):
+    """kpis[0:5] de aporte_evento sumados y los emails del historial"""
+    tipo = _col(ev, 'Type', '').str.lower()
+    status = _col(ev, 'Task Status', '').str.lower()
+    es_email = _contiene(tipo, 'email')
+    es_linkedin = ~es_email & _contiene(tipo, 'linkedin')
+    replied = _contiene(status, 'replied')
+    kpis = [es_email, es_email & status.isin(STATUS_EMAIL_ENVIADO),
+            es_email & (replied | _contiene(status, 'respondido')),
+            es_linkedin, es_linkedin & replied]
+    return [int(k.sum()) for k in kpis], _col(ev, 'To Email', '').str.lower().unique()
+
+
+def _actividad_pandas(ev):
+    """recent_activity: TopN por fecha_evento sobre todo el historial"""
+    import numpy as np
+    import pandas as pd
+    if ev.empty:
+        return []
+    texto = _o(_col(ev, 'Completed Date (PST)').astype(object), _col(ev, 'Due Date (PST)', '').astype(object))
+    codigos, distintos = pd.factorize(texto)
+    # Pocas fechas distintas: cada una se parsea una vez, igual que en el motor
+    fechas = np.array([_parsear_fecha(d) for d in distintos], dtype='datetime64[m]')
+    claves = fechas.astype(np.int64)[codigos]
+    filas = ev.iloc[_primeras_por_fecha(claves, TOP_ACTIVIDAD)].to_dict('records')
+    return [item_actividad(h) for h in filas]
+
+
+def _steps_metrics_pandas(step, estado, con_step):
+    import numpy as np
+    estado = estado[con_step]
+    bucket = np.select([_contiene(estado, 'INTERESADO'), _contiene(estado, 'AGENDADO'),
+                        _contiene(estado, 'NO INTERESADO') | _contiene(estado, 'NO PERFIL'),
+                        _contiene(estado, 'NO CONTESTA') | _contiene(estado, 'APAGADO')],
+                       BUCKETS[:-1], BUCKETS[-1])
+    step = step[con_step]
+    tabla = (step.to_frame('step').assign(bucket=bucket)
+             .groupby('step', sort=False)['bucket'].value_counts().unstack(fill_value=0)
+             .reindex(index=step.unique(), columns=list(BUCKETS), fill_value=0))  # Orden de aparición
+    return {step: {'total': int(sum(fila)), **dict(zip(BUCKETS, map(int, fila)))}
+            for step, fila in zip(tabla.index, tabla.itertuples(index=False))}
+
+
+def calcular_dashboard_pandas(tabla_path, steps_path, perfil=None):
+    """calcular_dashboard (ejecución completa) con el backend vectorizado"""
+    import numpy as np
+    campanas = CatalogoLocal().nombres()
+
+    # 1. Historial
+    with _etapa(perfil, 'historial'):
+        ev = _historial_df(steps_path)
+        kpis, emails_historial = _kpis_historial(ev)
+        actividad = _actividad_pandas(ev)
+        del ev
+
+    # 2. Tabla Base
+    with _etapa(perfil, 'tabla'):
+        t = _leer_df(tabla_path, COLUMNAS_CONTACTO)
+        step = _col(t, 'STEP', '')
+        estado = _col(t, 'ESTADO', '').str.upper()
+
+        programado = _col(t, 'apollo_status', '').str.lower() == 'scheduled'
+        emails_programados = _col(t, 'EMAIL_LIMPIO', '')[programado].str.strip().str.lower()
+        programados_fuera = int((~emails_programados.isin(emails_historial)).sum())
+
+        realized = _contiene(step.str.upper(), 'LLAMADA')
+        answered = realized & ~estado.isin(ESTADOS_SIN_CONTESTAR) & estado.ne('SIN GESTION') & estado.ne('')
+        meetings = _contiene(estado, 'AGENDADO') | _contiene(estado, 'REUNION')
+        kpis += [int(realized.sum()), int(answered.sum()), int(meetings.sum())]
+
+        steps_metrics = _steps_metrics_pandas(step, estado, ~step.isin(['SIN GESTION', '']))
+
+        campana = _o(_col(t, 'campaña'), _col(t, 'apollo_sequence_id', '').map(campanas).fillna(''))
+        categoria = np.select([_contiene(estado, 'INTERESADO'), _contiene(estado, 'AGENDADO'),
+                               _contiene(estado, 'NO_INTERESADO'), campana.ne('')],
+                              ['INTERESADOS', 'AGENDADOS', 'RECHAZADOS', 'EN_SECUENCIA'], 'NUEVOS')
+        counts = {c: int(n) for c, n in t.groupby(categoria, sort=False).size().items()}
+
+        # Feeds: solo sus filas pasan por aporte_contacto
+        obs = _col(t, 'observaciones', '').str.strip()
+        con_obs = np.flatnonzero(obs.str.len().gt(10))
+        fechas = _col(t, 'fecha gestion envio secuencia 2025- 2026', '').iloc[con_obs]
+        claves = fechas.rank(method='dense').to_numpy()  # Orden de los textos como números
+        filas = t.iloc[con_obs[_primeras_por_fecha(claves, TOP_OBSERVACIONES)]].to_dict('records')
+        observaciones = [aporte_contacto(c, campanas)['observacion'] for c in filas]
+        pipeline = {c: [] for c in ('NUEVOS', 'EN_SECUENCIA', 'INTERESADOS', 'AGENDADOS', 'RECHAZADOS')}
+        for c in t.groupby(categoria, sort=False).head(MAX_PIPELINE).to_dict('records'):
+            aporte = aporte_contacto(c, campanas)
+            pipeline[aporte['categoria']].append(aporte['pipeline'])
+
+    with _etapa(perfil, 'resultado'):
+        agregador = AgregadorKPIs({'kpis': kpis, 'steps_metrics': steps_metrics, 'counts': counts,
+                                   'programados_fuera': programados_fuera},
+                                  {'actividad': actividad,
+                                   'contactos': {'observaciones': observaciones, 'pipeline': pipeline}})
+        return agregador.resultado()
+
+
+# ---------- Estado persistido (modo incremental) ----------
+# crm_engine_state.json guarda agregados y feeds (pequeño); las huellas por fila
+# van en un archivo por fuente y solo se leen/escriben si esa fuente cambió.
+
+def _ruta_seccion(state_path, seccion):
+    base, ext = os.path.splitext(state_path)
+    return f"{base}.{seccion}{ext}"
+
+
+def _leer_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    os.replace(tmp, path)
+
+
+def cargar_estado(state_path):
+    estado = _leer_json(state_path)
+    if estado and estado.get('version') == STATE_VERSION:
+        return estado
+    return None
+
+
+def cargar_seccion(state_path, estado, seccion, fuente):
+    """Huellas por fila de una fuente; {} si no coinciden con el estado principal"""
+    data = _leer_json(_ruta_seccion(state_path, seccion))
+    if data and data.get('archivo') == estado['archivos'].get(fuente):
+        return data['filas']
+    return None
+
+
+def guardar_seccion(state_path, seccion, firma, filas):
+    _escribir_json(_ruta_seccion(state_path, seccion), {'archivo': firma, 'filas': filas})
+
+
+def procesar_historial(agregador, steps_path, previo, incremental, perfil=None):
+    """
+    Una pasada por el historial. Devuelve el estado de eventos para persistir
+    ({firma: [huella, aporte]}) y el número de eventos con cambios.
+    """
+    agregador.actividad_previa = None
+    eventos_previos = dict(previo)
+    eventos = {}
+    cambios = 0
+    calcular_huella = _medido(perfil, 'historial.huellas', huella_evento)
+    calcular_aporte = _medido(perfil, 'historial.aportes', aporte_evento)
+    feed = _medido(perfil, 'historial.feeds', agregador.feed_evento)
+    for signature, h in _iterado(perfil, 'historial.lectura', leer_eventos(steps_path)):
+        fp = calcular_huella(h) if incremental else None
+        anterior = eventos_previos.pop(signature, None)
+        if anterior is not None and anterior[0] == fp:
+            aporte = anterior[1]
+        else:
+            aporte = calcular_aporte(h)
+            if anterior is not None:
+                agregador.aplicar_evento(anterior[1], -1)
+            agregador.aplicar_evento(aporte)
+            cambios += 1
+        if incremental:
+            eventos[signature] = [fp, aporte]
+        feed(h)
+
+    for _, aporte in eventos_previos.values():  # Eventos que ya no están
+        agregador.aplicar_evento(aporte, -1)
+        cambios += 1
+    return eventos, cambios
+
+
+def procesar_tabla(agregador, tabla_path, previo, incremental, catalogo, perfil=None):
+    """
+    Una pasada por TablaBase. Contactos idénticos comparten huella y se
+    cuentan por multiplicidad. Devuelve ({huella: [n, aporte]}, cambios).
+    La versión del catálogo entra en la huella: si cambia, se recalculan todos.
+    """
+    campanas = catalogo.nombres()
+    agregador.contactos_previos = None
+    contactos_previos = dict(previo)
+    contactos = {}
+    calcular_huella = _medido(perfil, 'tabla.huellas', huella)
+    calcular_aporte = _medido(perfil, 'tabla.aportes', aporte_contacto)
+    feed = _medido(perfil, 'tabla.feeds', agregador.feed_contacto)
+    for c in _iterado(perfil, 'tabla.lectura', leer_contactos(tabla_path)):
+        if not incremental:
+            aporte = calcular_aporte(c, campanas)
+            agregador.aplicar_contacto(aporte)
+            feed(aporte)
+            continue
+        fp = calcular_huella(c) + catalogo.version
+        entrada = contactos.get(fp)
+        if entrada is None:
+            anterior = contactos_previos.get(fp)
+            entrada = contactos[fp] = [0, anterior[1] if anterior else calcular_aporte(c, campanas)]
+        entrada[0] += 1
+        feed(entrada[1])
+
+    cambios = 0
+    for fp, (n, aporte) in contactos.items():
+        n_previo = contactos_previos.pop(fp, [0])[0]
+        if n != n_previo:
+            agregador.aplicar_contacto(aporte, n - n_previo)
+            cambios += abs(n - n_previo)
+    for n_previo, aporte in contactos_previos.values():  # Contactos que ya no están
+        agregador.aplicar_contacto(aporte, -n_previo)
+        cambios += n_previo
+    return contactos, cambios
+
+
+def calcular_dashboard(tabla_path='TablaBase.csv', steps_path='steps_apollo_resultado.csv',
+                       incremental=False, state_path=STATE_FILE, perfil=None, backend='loop'):
+    """
+    Calcula la estructura del dashboard y la devuelve sin escribir el JSON de salida.
+    Con `perfil` (un Perfil) registra el coste de cada etapa.
+    `backend`: 'loop' (streaming, admite incremental) o 'pandas' (vectorizado, siempre completo).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend!r} (usar {' o '.join(BACKENDS)})")
+    if backend == 'pandas' and incremental:
+        raise ValueError("El modo incremental solo existe con el backend 'loop'")
+    print("Generating Specialized CRM KPIs...")
+    if backend == 'pandas':
+        return calcular_dashboard_pandas(tabla_path, steps_path, perfil)
+
+    with _etapa(perfil, 'estado_carga'):
+        estado = cargar_estado(state_path) if incremental else None
+        catalogo = CatalogoLocal()  # Solo lectura: el motor no llama a Apollo
+        firmas = {'historial': firma_archivo(steps_path), 'tabla': firma_archivo(tabla_path)}
+        if firmas['tabla'] is not None:
+            firmas['tabla'] += f":{catalogo.version}"  # Un catálogo nuevo cambia los aportes de la tabla
+        sin_cambios = {k: estado is not None and v is not None and estado['archivos'].get(k) == v
+                       for k, v in firmas.items()}
+
+        # Huellas previas de las fuentes que sí cambiaron
+        previos = {}
+        for fuente, seccion in (('historial', 'eventos'), ('tabla', 'contactos')):
+            if estado is not None and not sin_cambios[fuente]:
+                previos[fuente] = cargar_seccion(state_path, estado, seccion, fuente)
+                if previos[fuente] is None:
+                    estado = None
+    if incremental and estado is None:
+        print("No previous engine state: full rebuild.")
+        sin_cambios = dict.fromkeys(firmas, False)
+        previos = {}
+
+    agregador = AgregadorKPIs(*(estado and (estado['agregados'], estado['feeds']) or ()))
+    cambios = 0
+
+    # 1. Historial primero: el chequeo 'scheduled' de contactos necesita sus emails
+    if not sin_cambios['historial']:
+        with _etapa(perfil, 'historial'):
+            eventos, n = procesar_historial(agregador, steps_path, previos.get('historial') or {},
+                                            incremental, perfil)
+        cambios += n
+
+    # 2. Tabla Base
+    if not sin_cambios['tabla']:
+        with _etapa(perfil, 'tabla'):
+            contactos, n = procesar_tabla(agregador, tabla_path, previos.get('tabla') or {},
+                                          incremental, catalogo, perfil)
+        cambios += n
+
+    # 3. Final Data Structure
+    with _etapa(perfil, 'resultado'):
+        final_data = agregador.resultado()
+
+    if incremental:
+        with _etapa(perfil, 'estado_guardado'):
+            if not sin_cambios['historial']:
+                guardar_seccion(state_path, 'eventos', firmas['historial'], eventos)
+            if not sin_cambios['tabla']:
+                guardar_seccion(state_path, 'contactos', firmas['tabla'], contactos)
+            _escribir_json(state_path, {
+                'version': STATE_VERSION,
+                'archivos': firmas,
+                'agregados': agregador.agregados(),
+                'feeds': agregador.feeds()
+            })
+        print(f"Incremental: {cambios} filas cambiadas aplicadas.")
+
+    return final_data
+
+
+def guardar_dashboard(data, output_path='crm_dashboard_data_full.json', perfil=None, compacto=False):
+    """
+    Escritura atómica: los servidores pueden estar leyendo el archivo a la vez.
+    `compacto`: JSON sin indentación más sus hermanos .gz/.br en la misma pasada.
+    Con `perfil`, mide la serialización y la escritura y termina el JSON con
+    la sección `_profile`, que también se añade a `data`.
+    En modo compacto devuelve (JSON, {encoding: bytes}) tal como se escribieron.
+    """
+    if compacto:
+        return _guardar_compacto(data, output_path, perfil)
+
+    borrar_hermanos(output_path)  # Los .gz/.br de una escritura compacta anterior ya no valen
+    tmp = f"{output_path}.tmp"
+    if perfil is None:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, output_path)
+        return
+
+    with perfil.etapa('serializacion'):
+        texto = json.dumps(data, indent=2, ensure_ascii=False)
+    with open(tmp, 'w', encoding='utf-8') as f:
+        with perfil.etapa('escritura'):
+            f.write(texto[:-2])  # Sin el "\n}" final: la última clave será _profile
+            f.flush()
+        data['_profile'] = perfil.resultado()
+        seccion = json.dumps(data['_profile'], indent=2, ensure_ascii=False).replace('\n', '\n  ')
+        f.write(f',\n  "_profile": {seccion}\n}}')
+    os.replace(tmp, output_path)
+
+
+def _guardar_compacto(data, output_path, perfil):
+    escritor = EscritorPayload(output_path)
+    try:
+        with _etapa(perfil, 'escritura_compacta'):  # Serializar, comprimir y escribir van a la par
+            for clave, valor in data.items():
+                escritor.escribir_clave(clave, valor)
+        if perfil is not None:
+            data['_profile'] = perfil.resultado()
+            escritor.escribir_clave('_profile', data['_profile'])
+        return escritor.cerrar()
+    except BaseException:
+        escritor.descartar()
+        raise
+
+
+def generate_full_data(tabla_path='TablaBase.csv', steps_path='steps_apollo_resultado.csv',
+                       output_path='crm_dashboard_data_full.json', incremental=False,
+                       state_path=STATE_FILE, profile=False, compacto=False, backend='loop', cache=None):
+    """
+    Calcula el dashboard, lo escribe en output_path y lo devuelve.
+    `cache` (DashboardCache de output_path): se le publica lo escrito, sin releerlo.
+    """
+    perfil = Perfil() if profile else None
+    try:
+        with metricas.ENGINE_DURACION.cronometrar(modo='incremental' if incremental else 'completo'):
+            final_data = calcular_dashboard(tabla_path, steps_path, incremental=incremental,
+                                            state_path=state_path, perfil=perfil, backend=backend)
+            escrito = guardar_dashboard(final_data, output_path, perfil, compacto)
+        if cache is not None:
+            cache.publicar(*(escrito or (serializar(final_data), None)))
+    finally:
+        if perfil is not None:
+            perfil.cerrar()
     print("Success: KPIs updated with user specific requirements.")
+    if perfil is not None:
+        imprimir_perfil(final_data['_profile'])
+    return final_data
+
+
+def imprimir_perfil(perfil):
+    print(f"{'Etapa':<20} {'Segundos':>9} {'Filas':>9} {'Pico MB':>8}")
+    for nombre, etapa in perfil['etapas'].items():
+        pico = etapa.get('pico_memoria_mb')
+        print(f"{nombre:<20} {etapa['segundos']:>9.3f} {etapa.get('filas', ''):>9} "
+              f"{'' if pico is None else f'{pico:.1f}':>8}")
+    print(f"{'total':<20} {perfil['total_segundos']:>9.3f} {'':>9} {perfil['pico_memoria_mb']:>8.1f}")
 
 if __name__ == "__main__":
-    generate_full_data()
+    parser = argparse.ArgumentParser(description="Genera crm_dashboard_data_full.json")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"Aplicar solo los cambios desde la última ejecución ({STATE_FILE})")
+    parser.add_argument('--profile', action='store_true',
+                        help="Medir tiempo, filas y memoria por etapa (sección _profile del JSON)")
+    parser.add_argument('--compact', action='store_true',
+                        help="JSON sin indentación + .gz/.br precomprimidos para los servidores")
+    parser.add_argument('--backend', choices=BACKENDS, default='loop',
+                        help="loop: streaming por filas; pandas: vectorizado (sin --incremental)")
+    args = parser.parse_args()
+    if args.backend == 'pandas' and args.incremental:
+        parser.error("--incremental solo funciona con --backend loop")
+    generate_full_data(incremental=args.incremental, profile=args.profile, compacto=args.compact,
+                       backend=args.backend)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Dashboard Cache - Payload del dashboard en memoria
+Guarda los bytes de crm_dashboard_data_full.json listos para servir: el JSON
+compacto, sus versiones gzip y brotli y un ETag fuerte. Si crm_engine lo
+escribió en modo compacto (EscritorPayload), los .gz/.br hermanos ya
+existen y se sirven tal cual, sin parsear nada; si el archivo es el JSON con
+indentación de siempre, se parsea y se comprime una vez por versión.
+Se recarga cuando cambia el archivo (mtime + tamaño) o tras invalidar();
+el proceso que acaba de escribirlo lo entrega con publicar(), sin releerlo.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Optional, Tuple
+
+import metricas
+
+# orjson y brotli están en requirements.txt (la imagen de producción los trae);
+# sin ellos (p.ej. un entorno local a medias) se usa json y solo hay gzip
+try:
+    import orjson  # Serializa bastante más rápido que json
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configuración
+GZIP_LEVEL = 6
+GZIP_MIN_BYTES = 1024  # Por debajo de esto no compensa comprimir
+BROTLI_QUALITY = 9  # 11 es el máximo pero tarda varias veces más
+EXTENSIONES = {'br': '.br', 'gzip': '.gz'}  # En orden de preferencia
+
+
+def _firma_archivo(path) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def _leer(path) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def serializar(obj) -> bytes:
+    """JSON compacto en UTF-8 (orjson si está instalado)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def comprimir(body: bytes) -> Dict[str, bytes]:
+    """{encoding: bytes} de las codificaciones disponibles ({} si no compensa)"""
+    if len(body) < GZIP_MIN_BYTES:
+        return {}
+    comprimidos = {'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        comprimidos['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return comprimidos
+
+
+def _gzip_coincide(comprimido: bytes, body: bytes) -> bool:
+    """Compara el trailer del gzip (CRC32 + tamaño) con el JSON, sin descomprimir"""
+    if len(comprimido) < 18:
+        return False
+    crc, tamano = struct.unpack('<II', comprimido[-8:])
+    return crc == zlib.crc32(body) and tamano == len(body) & 0xFFFFFFFF
+
+
+def borrar_hermanos(path):
+    """Quita los .gz/.br de una versión anterior (p.ej. al volver a escribir con indentación)"""
+    for ext in EXTENSIONES.values():
+        try:
+            os.remove(f"{path}{ext}")
+        except FileNotFoundError:
+            pass
+
+
+class EscritorPayload:
+    """
+    Escribe el JSON compacto de un dict clave a clave y, en la misma pasada,
+    sus hermanos .gz y .br (compresores en streaming). Todo va a archivos
+    temporales y a memoria; cerrar() publica los archivos con os.replace
+    (.gz, .br y el JSON el último) y devuelve los bytes para la caché.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.claves = 0
+        self._archivos = {'json': open(f"{self.path}.tmp", 'wb')}
+        # El .gz va primero: cerrar() lo publica antes que el .br (ver _cargar)
+        self._compresores = {'gzip': zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)}  # 31: formato gzip
+        if brotli is not None:
+            self._compresores['br'] = brotli.Compressor(quality=BROTLI_QUALITY)
+        for encoding in self._compresores:
+            self._archivos[encoding] = open(f"{self.path}{EXTENSIONES[encoding]}.tmp", 'wb')
+        self._trozos = {nombre: [] for nombre in self._archivos}
+        self._escribir(b'{')
+
+    def _anadir(self, nombre: str, trozo: bytes):
+        self._archivos[nombre].write(trozo)
+        self._trozos[nombre].append(trozo)
+
+    def _escribir(self, trozo: bytes):
+        self._anadir('json', trozo)
+        self._anadir('gzip', self._compresores['gzip'].compress(trozo))
+        if 'br' in self._compresores:
+            self._anadir('br', self._compresores['br'].process(trozo))
+
+    def escribir_clave(self, clave: str, valor):
+        self._escribir((b',' if self.claves else b'') + serializar(clave) + b':' + serializar(valor))
+        self.claves += 1
+
+    def cerrar(self) -> Tuple[bytes, Dict[str, bytes]]:
+        """Publica los archivos y devuelve (JSON, {encoding: bytes}) como los tendría Payload"""
+        self._escribir(b'}')
+        self._anadir('gzip', self._compresores['gzip'].flush())
+        if 'br' in self._compresores:
+            self._anadir('br', self._compresores['br'].finish())
+        for f in self._archivos.values():
+            f.close()
+        borrar_hermanos(self.path)  # Un .br viejo no debe sobrevivir si ahora no hay brotli
+        for encoding in self._compresores:
+            destino = f"{self.path}{EXTENSIONES[encoding]}"
+            os.replace(f"{destino}.tmp", destino)
+        os.replace(f"{self.path}.tmp", self.path)
+
+        body = b''.join(self._trozos['json'])
+        if len(body) < GZIP_MIN_BYTES:
+            return body, {}
+        return body, {encoding: b''.join(self._trozos[encoding]) for encoding in self._compresores}
+
+    def descartar(self):
+        """Cierra y borra los temporales (tras un error a medio escribir)"""
+        for f in self._archivos.values():
+            f.close()
+            try:
+                os.remove(f.name)
+            except FileNotFoundError:
+                pass
+
+
+class Payload:
+    """Una versión del JSON del dashboard lista para servir"""
+
+    def __init__(self, body: bytes, generacion: int, comprimidos: Optional[Dict[str, bytes]] = None):
+        self.body = body
+        self.generacion = generacion
+        self.comprimidos = comprimir(body) if comprimidos is None else comprimidos
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        metricas.DASHBOARD_BYTES.set(len(self.body), encoding='identity')
+        for encoding, datos in self.comprimidos.items():
+            metricas.DASHBOARD_BYTES.set(len(datos), encoding=encoding)
+
+    @classmethod
+    def desde_datos(cls, data: Dict, generacion: int) -> 'Payload':
+        return cls(serializar(data), generacion)
+
+    def coincide(self, if_none_match: Optional[str]) -> bool:
+        """True si el navegador ya tiene esta versión (cabecera If-None-Match)"""
+        if not if_none_match:
+            return False
+        etags = [e.strip() for e in if_none_match.split(',')]
+        return '*' in etags or any(e.removeprefix('W/') == self.etag for e in etags)
+
+    def codificar(self, accept_encoding: Optional[str]) -> Tuple[Optional[str], bytes]:
+        """(Content-Encoding o None, bytes) según la cabecera Accept-Encoding del cliente"""
+        aceptadas = set()
+        for parte in (accept_encoding or '').split(','):
+            nombre, _, parametros = parte.partition(';')
+            try:
+                q = float(parametros.strip().removeprefix('q=')) if parametros.strip() else 1.0
+            except ValueError:
+                q = 1.0
+            if q > 0:
+                aceptadas.add(nombre.strip().lower())
+        for encoding in EXTENSIONES:
+            if encoding in aceptadas and encoding in self.comprimidos:
+                return encoding, self.comprimidos[encoding]
+        return None, self.body
+
+
+def _cargar(path, generacion: int) -> Payload:
+    """Payload desde disco: hermanos precomprimidos si son de este JSON; si no, se recalcula"""
+    body = _leer(path)
+    if body is None:
+        raise FileNotFoundError(str(path))
+
+    gz = _leer(f"{path}{EXTENSIONES['gzip']}")
+    if gz is not None and _gzip_coincide(gz, body):
+        comprimidos = {'gzip': gz} if len(body) >= GZIP_MIN_BYTES else {}
+        if comprimidos and brotli is not None:
+            # EscritorPayload borra los hermanos y publica el .gz antes que el .br y el JSON:
+            # si el .gz es de este JSON, el .br que haya también (brotli no trae CRC que mirar)
+            br = _leer(f"{path}{EXTENSIONES['br']}")
+            comprimidos['br'] = br if br is not None else brotli.compress(body, quality=BROTLI_QUALITY)
+        return Payload(body, generacion, comprimidos)
+
+    # JSON con indentación (o hermanos de otra versión): compactar y comprimir aquí
+    return Payload.desde_datos(json.loads(body), generacion)
+
+
+class DashboardCache:
+    """Caché thread-safe del payload; una lectura de disco por versión del archivo"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.generacion = 0
+        self._payload = None
+        self._firma = None
+        self._generacion_cargada = -1
+
+    def invalidar(self):
+        """Fuerza la recarga en la próxima petición (p.ej. tras regenerar los datos)"""
+        with self.lock:
+            self.generacion += 1
+
+    def publicar(self, body: bytes, comprimidos: Optional[Dict[str, bytes]] = None) -> Payload:
+        """
+        Sustituye el payload por el que se acaba de escribir en el archivo (sin
+        releerlo). Toma la firma del archivo ya escrito, así que el siguiente
+        obtener() es un hit.
+        """
+        with self.lock:
+            self.generacion += 1
+            self._payload = Payload(body, self.generacion, comprimidos)
+            self._firma = _firma_archivo(self.path)
+            self._generacion_cargada = self.generacion
+            return self._payload
+
+    def obtener(self) -> Payload:
+        """Devuelve el payload vigente; lanza FileNotFoundError si no hay archivo"""
+        firma = _firma_archivo(self.path)
+        if firma is None:
+            raise FileNotFoundError(str(self.path))
+        with self.lock:
+            if (self._payload is None or firma != self._firma
+                    or self.generacion != self._generacion_cargada):
+                self._payload = _cargar(self.path, self.generacion)
+                self._firma = firma
+                self._generacion_cargada = self.generacion
+                metricas.DASHBOARD_CACHE.inc(resultado='recarga')
+            else:
+                metricas.DASHBOARD_CACHE.inc(resultado='hit')
+            return self._payload
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Eventos Columnar - Snapshot por columnas de steps_apollo_resultado.csv
+Guarda el historial en un .npz junto al CSV: cada columna codificada por
+diccionario (códigos enteros + valores distintos en UTF-8) y las fechas ya
+parseadas a datetime64. Los lectores (crm_engine, merge_steps_to_base,
+analizar_duplicados) cargan solo las columnas que usan y deduplican o
+agrupan sobre los códigos, sin parsear el CSV ni crear un dict por fila.
+El snapshot lleva la firma (mtime + tamaño) del CSV del que salió; si el
+CSV cambió después, abrir() devuelve None y se lee el CSV como siempre.
+Uso: python eventos_columnar.py [steps_apollo_resultado.csv]
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# numpy es opcional (sin él no hay snapshot y se lee el CSV) y solo se importa
+# al escribir o abrir un snapshot: sin snapshot, los lectores no pagan su import
+NUMPY = importlib.util.find_spec('numpy') is not None
+np = None
+
+STEPS_FILE = 'steps_apollo_resultado.csv'
+FORMATO_VERSION = 1
+COLUMNAS_FECHA = ('Due Date (PST)', 'Completed Date (PST)', 'fecha_programada', 'fecha_envio')
+FORMATOS_FECHA = ("%B %d, %Y %H:%M",)  # El de obtener_steps_apollo.formatear_fecha; si no, ISO
+
+
+def ruta_snapshot(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + '.npz'
+
+
+def _firma_archivo(path) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def _parsear_fecha(valor: str):
+    valor = valor.strip()
+    if not valor:
+        return None
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            pass
+    try:
+        dt = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=None)
+
+
+def _numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def _tipo_codigos(n_valores: int):
+    for tipo in (np.uint8, np.uint16, np.uint32):
+        if n_valores <= np.iinfo(tipo).max + 1:
+            return tipo
+    return np.int64
+
+
+def escribir_snapshot(csv_path: str = STEPS_FILE, destino: Optional[str] = None) -> int:
+    """Lee el CSV una vez y escribe el snapshot (atómico). Devuelve las filas escritas."""
+    if not NUMPY:
+        raise RuntimeError("numpy no está instalado")
+    _numpy()
+    destino = destino or ruta_snapshot(csv_path)
+    firma = _firma_archivo(csv_path)
+
+    with open(csv_path, 'r', encoding='utf-8') as f:  # Igual que los DictReader de los lectores
+        reader = csv.reader(f)
+        columnas = next(reader, [])
+        diccionarios = [{} for _ in columnas]
+        codigos = [[] for _ in columnas]
+        filas = 0
+        for row in reader:
+            row += [''] * (len(columnas) - len(row))
+            for i, valor in enumerate(row[:len(columnas)]):
+                diccionario = diccionarios[i]
+                codigo = diccionario.get(valor)
+                if codigo is None:
+                    codigo = diccionario[valor] = len(diccionario)
+                codigos[i].append(codigo)
+            filas += 1
+
+    arrays = {}
+    for i, columna in enumerate(columnas):
+        valores = list(diccionarios[i])  # En orden de código
+        textos = [v.encode('utf-8') for v in valores]
+        arrays[f"c{i}"] = np.array(codigos[i], dtype=_tipo_codigos(len(valores)))
+        arrays[f"c{i}_texto"] = np.frombuffer(b''.join(textos), dtype=np.uint8)
+        arrays[f"c{i}_offsets"] = np.cumsum([0] + [len(t) for t in textos], dtype=np.int64)
+        if columna in COLUMNAS_FECHA:
+            # Cada valor distinto se parsea una sola vez
+            arrays[f"c{i}_fechas"] = np.array([_parsear_fecha(v) for v in valores],
+                                              dtype='datetime64[m]')
+    meta = {'version': FORMATO_VERSION, 'columnas': columnas, 'filas': filas, 'csv_firma': firma}
+    arrays['_meta'] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+    tmp = f"{destino}.tmp.npz"  # np.savez añade .npz si el nombre no lo lleva
+    np.savez(tmp, **arrays)
+    os.replace(tmp, destino)
+    return filas
+
+
+class SnapshotEventos:
+    """Lectura perezosa: cada columna se carga del .npz la primera vez que se pide"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._npz = _numpy().load(path)
+        self.meta = json.loads(self._npz['_meta'].tobytes().decode('utf-8'))
+        self.columnas = self.meta['columnas']
+        self.filas = self.meta['filas']
+        self._indice = {c: i for i, c in enumerate(self.columnas)}
+        self._valores = {}
+
+    def tiene(self, columnas: Iterable[str]) -> bool:
+        return all(c in self._indice for c in columnas)
+
+    def codigos(self, columna: str):
+        """Código por fila (índice en valores(columna))"""
+        return self._npz[f"c{self._indice[columna]}"]
+
+    def valores(self, columna: str) -> List[str]:
+        """Valores distintos de la columna, en orden de código"""
+        if columna not in self._valores:
+            i = self._indice[columna]
+            texto = self._npz[f"c{i}_texto"].tobytes()
+            offsets = self._npz[f"c{i}_offsets"].tolist()
+            self._valores[columna] = [texto[a:b].decode('utf-8') for a, b in zip(offsets, offsets[1:])]
+        return self._valores[columna]
+
+    def fechas(self, columna: str):
+        """datetime64[m] por fila (NaT si vacía o no parseable); solo COLUMNAS_FECHA"""
+        return self._npz[f"c{self._indice[columna]}_fechas"][self.codigos(columna)]
+
+    def filas_dict(self, columnas: List[str], indices=None) -> Iterator[Dict[str, str]]:
+        """Filas como dicts con solo `columnas` (todas las filas o las de `indices`, en ese orden)"""
+        valores = [self.valores(c) for c in columnas]
+        codigos = [(self.codigos(c) if indices is None else self.codigos(c)[indices]).tolist() for c in columnas]
+        for fila in zip(*codigos):
+            yield {c: v[k] for c, v, k in zip(columnas, valores, fila)}
+
+    def cerrar(self):
+        self._npz.close()
+
+
+def abrir(csv_path: str = STEPS_FILE) -> Optional[SnapshotEventos]:
+    """El snapshot del CSV si existe y está al día; None si hay que leer el CSV"""
+    path = ruta_snapshot(csv_path)
+    if not NUMPY or not os.path.exists(path):
+        return None
+    try:
+        snapshot = SnapshotEventos(path)
+    except (OSError, ValueError, KeyError):
+        return None  # Snapshot corrupto o de otro formato: se ignora
+    if snapshot.meta.get('version') != FORMATO_VERSION or \
+            snapshot.meta.get('csv_firma') != _firma_archivo(csv_path):
+        snapshot.cerrar()
+        return None
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escribe el snapshot por columnas del historial de steps")
+    parser.add_argument('csv', nargs='?', default=STEPS_FILE)
+    args = parser.parse_args()
+    if not NUMPY:
+        print("✗ numpy no está instalado: no se puede escribir el snapshot")
+        sys.exit(1)
+
+    filas = escribir_snapshot(args.csv)
+    destino = ruta_snapshot(args.csv)
+    print(f"✓ {filas} filas en {destino} ({os.path.getsize(destino) / 1024:.0f} KB, "
+          f"CSV {os.path.getsize(args.csv) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Generador de Datos Sintéticos - TablaBase.csv y steps_apollo_resultado.csv a escala
+Perfila los CSV reales (columnas, filas de ejemplo, emails duplicados, eventos
+por contacto y eventos repetidos) y escribe N contactos con sus eventos
+siguiendo ese perfil. Cada fila sintética parte de una fila real elegida al
+azar, así ESTADO, STEP, apollo_status, fechas, etc. conservan sus
+vocabularios y sus combinaciones reales; solo se reemplazan los datos de
+identidad (email, contacto, empresa, teléfonos) para que sean únicos.
+Escribe en streaming: 1M de contactos no se cargan en memoria.
+Uso: python generar_datos_sinteticos.py --contactos 100000 --destino /tmp/escala
+"""
+
+import argparse
+import csv
+import os
+import random
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Tuple
+
+TABLA_FILE = 'TablaBase.csv'
+STEPS_FILE = 'steps_apollo_resultado.csv'
+
+# Columnas de identidad que se sintetizan en vez de copiarse de la fila real
+COLUMNAS_EMAIL_TABLA = ('EMAIL', 'EMAIL_LIMPIO')
+COLUMNAS_SUFIJO_TABLA = ('Contacto', 'Empresa', 'apollo_name')
+
+
+def _firma_evento(row: Dict) -> Tuple:
+    """Misma firma que analizar_duplicados para decidir si dos eventos son el mismo"""
+    return (row.get('Type'), row.get('Sequence'), row.get('Step'), row.get('Subject'), row.get('Due Date (PST)'))
+
+
+def perfilar(tabla_path: str = TABLA_FILE, steps_path: str = STEPS_FILE) -> Dict:
+    """Lo que el generador necesita de los CSV reales"""
+    with open(tabla_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        contactos = list(reader)
+        columnas_tabla = reader.fieldnames
+    with open(steps_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        eventos = list(reader)
+        columnas_steps = reader.fieldnames
+
+    emails = Counter(c.get('EMAIL_LIMPIO', '').strip().lower() for c in contactos)
+    emails.pop('', None)
+    por_email = defaultdict(list)
+    for e in eventos:
+        por_email[e.get('To Email', '').strip().lower()].append(e)
+    por_email.pop('', None)
+
+    return {
+        'columnas_tabla': columnas_tabla,
+        'columnas_steps': columnas_steps,
+        'contactos': contactos,
+        'eventos': eventos,
+        # Fracción de filas cuyo email ya apareció antes en la tabla
+        'fraccion_email_duplicado': sum(n - 1 for n in emails.values()) / max(1, sum(emails.values())),
+        # Fracción de emails de la tabla que tienen historial en Apollo
+        'fraccion_con_eventos': len(set(emails) & set(por_email)) / max(1, len(emails)),
+        # Distribuciones empíricas por email con historial: total de eventos y eventos distintos
+        'eventos_por_email': [len(lista) for lista in por_email.values()],
+        'distintos_por_email': [len(set(map(_firma_evento, lista))) for lista in por_email.values()],
+    }
+
+
+def _email(plantilla: str, i: int) -> str:
+    local, _, dominio = plantilla.strip().lower().partition('@')
+    return f"{local or 'contacto'}.{i}@{dominio or 'example.com'}"
+
+
+def _celular(rnd: random.Random) -> str:
+    return '3' + ''.join(rnd.choices('0123456789', k=9))
+
+
+def _contacto(plantilla: Dict, i: int, email: str, rnd: random.Random) -> Dict:
+    fila = dict(plantilla)
+    for col in COLUMNAS_EMAIL_TABLA:
+        if col in fila:
+            fila[col] = email
+    if fila.get('email', '').strip():
+        fila['email'] = email
+    for col in COLUMNAS_SUFIJO_TABLA:
+        if fila.get(col, '').strip():
+            fila[col] = f"{fila[col].strip()} {i}"
+    for col in ('CELULAR1', 'CELULAR 2'):
+        if fila.get(col, '').strip():
+            fila[col] = _celular(rnd)
+    return fila
+
+
+def _eventos(contacto: Dict, perfil: Dict, escala_eventos: float, rnd: random.Random):
+    """Historial de un contacto: k eventos distintos repetidos hasta completar n"""
+    n = max(1, round(rnd.choice(perfil['eventos_por_email']) * escala_eventos))
+    k = min(n, rnd.choice(perfil['distintos_por_email']))
+    distintos = []
+    for j in range(k):
+        evento = dict(rnd.choice(perfil['eventos']))
+        evento['To Email'] = contacto['EMAIL_LIMPIO']
+        evento['Account'] = contacto.get('Empresa', '')
+        if evento.get('Contact Name', '').strip():
+            evento['Contact Name'] = contacto.get('Contacto', '') or contacto.get('apollo_name', '')
+        if k > 1:
+            evento['Step'] = str(j + 1)  # Eventos distintos de verdad (firma distinta)
+        distintos.append(evento)
+    for j in range(n):
+        yield distintos[j % k]
+
+
+def generar(destino: str, contactos: int, eventos: Optional[int] = None, seed: int = 0,
+            perfil: Optional[Dict] = None) -> Tuple[int, int]:
+    """
+    Escribe destino/TablaBase.csv y destino/steps_apollo_resultado.csv.
+    `eventos` ajusta el volumen del historial (aprox.); None = la proporción real.
+    Devuelve (contactos, eventos) escritos.
+    """
+    perfil = perfil or perfilar()
+    rnd = random.Random(seed)
+    media = sum(perfil['eventos_por_email']) / max(1, len(perfil['eventos_por_email']))
+    esperados = contactos * (1 - perfil['fraccion_email_duplicado']) * perfil['fraccion_con_eventos'] * media
+    escala_eventos = 1.0 if eventos is None or esperados == 0 else eventos / esperados
+
+    os.makedirs(destino, exist_ok=True)
+    escritos = 0
+    emails = []  # Solo se guardan si hay que duplicar alguno
+    with open(os.path.join(destino, TABLA_FILE), 'w', newline='', encoding='utf-8') as ft, \
+            open(os.path.join(destino, STEPS_FILE), 'w', newline='', encoding='utf-8') as fs:
+        tabla = csv.DictWriter(ft, fieldnames=perfil['columnas_tabla'])
+        steps = csv.DictWriter(fs, fieldnames=perfil['columnas_steps'])
+        tabla.writeheader()
+        steps.writeheader()
+        for i in range(contactos):
+            plantilla = rnd.choice(perfil['contactos'])
+            duplicado = emails and rnd.random() < perfil['fraccion_email_duplicado']
+            email = rnd.choice(emails) if duplicado else _email(plantilla.get('EMAIL_LIMPIO', ''), i)
+            if perfil['fraccion_email_duplicado'] > 0 and not duplicado:
+                emails.append(email)
+            contacto = _contacto(plantilla, i, email, rnd)
+            tabla.writerow(contacto)
+            if not duplicado and rnd.random() < perfil['fraccion_con_eventos']:
+                for evento in _eventos(contacto, perfil, escala_eventos, rnd):
+                    steps.writerow(evento)
+                    escritos += 1
+    return contactos, escritos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera TablaBase.csv y steps_apollo_resultado.csv sintéticos")
+    parser.add_argument('--contactos', type=int, required=True, help="Filas de TablaBase.csv")
+    parser.add_argument('--eventos', type=int, help="Filas aprox. de steps (por defecto, la proporción real)")
+    parser.add_argument('--destino', required=True, help="Directorio de salida (no sobrescribir los CSV reales)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.abspath(args.destino) == os.path.abspath('.'):
+        parser.error("--destino no puede ser el directorio actual: sobrescribiría los CSV reales")
+
+    perfil = perfilar()
+    print("="*80)
+    print("PERFIL DE LOS DATOS REALES")
+    print("="*80)
+    print(f"Contactos: {len(perfil['contactos'])}  Eventos: {len(perfil['eventos'])}")
+    print(f"Emails duplicados en la tabla: {perfil['fraccion_email_duplicado']:.2%}")
+    print(f"Contactos con historial: {perfil['fraccion_con_eventos']:.2%}")
+    total = sum(perfil['eventos_por_email'])
+    print(f"Eventos repetidos (misma firma): {1 - sum(perfil['distintos_por_email']) / max(1, total):.2%}")
+
+    n_contactos, n_eventos = generar(args.destino, args.contactos, args.eventos, args.seed, perfil)
+    print(f"\n✓ {n_contactos} contactos y {n_eventos} eventos en {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
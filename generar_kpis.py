@@ -1,25 +1,27 @@
 #!/usr/bin/env python3
 """
 Genera KPIs y métricas de análisis del CRM
+Backend 'loop' (por defecto): una pasada por fila con Counters.
+Backend 'pandas' (--backend pandas): los mismos KPIs con operaciones por
+columna y groupbys; mismo JSON, incluido el orden de los empates.
 """
 
+import argparse
 import csv
 import json
 from collections import defaultdict, Counter
 from datetime import datetime
 
-def analizar_crm():
-    """Analiza todos los datos y genera KPIs completos"""
+TABLA_FILE = 'TablaBase.csv'
+BACKENDS = ('loop', 'pandas')
+COLUMNA_FECHA = 'fecha gestion envio secuencia 2025- 2026'
+# Columnas de TablaBase que usan los KPIs (el backend pandas solo lee estas)
+COLUMNAS_KPIS = ('EMAIL_LIMPIO', 'CELULAR1', 'apollo_last_message_id', 'campaña', 'ESTADO', 'Responsable',
+                 'STEP', 'Fuente', 'Contacto', 'Empresa', COLUMNA_FECHA)
 
-    # Leer TablaBase.csv (fuente principal)
-    with open('TablaBase.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        contactos = list(reader)
 
-    print("="*80)
-    print("ANÁLISIS COMPLETO DEL CRM - GENERANDO KPIS")
-    print("="*80)
-    print(f"Total de contactos en la base: {len(contactos)}")
+def kpis_loop(contactos):
+    """dashboard_data y total de contactos con estado, fila a fila"""
 
     # ========== KPIs PRINCIPALES ==========
     kpis = {
@@ -100,6 +102,128 @@ def analizar_crm():
         },
         'timeline': dict(sorted(fechas.items())[:30])
     }
+    return dashboard_data, total_con_estado
+
+
+# ========== BACKEND VECTORIZADO ==========
+
+def _col(df, columna, defecto=None):
+    """df[columna], o `defecto` en todas las filas si no existe (como c.get)"""
+    import pandas as pd
+    return df[columna] if columna in df else pd.Series(defecto, index=df.index, dtype=object)
+
+
+def _verdadero(serie):
+    """Filas con texto no vacío (lo que `if c.get(...)` da por cierto)"""
+    return serie.notna() & serie.ne('')
+
+
+def _conteo(serie):
+    """Counter(serie).most_common() como dict: por cantidad y, a igualdad, por primera aparición"""
+    import numpy as np
+    tamanos = serie.groupby(serie.to_numpy(), sort=False).size()
+    orden = np.lexsort((np.arange(len(tamanos)), -tamanos.to_numpy()))
+    return {k: int(n) for k, n in tamanos.iloc[orden].items()}
+
+
+def _primeros(conteo, n):
+    return dict(list(conteo.items())[:n])
+
+
+def kpis_pandas(path=TABLA_FILE):
+    """Mismo resultado que kpis_loop leyendo TablaBase.csv como DataFrame"""
+    import pandas as pd  # Solo lo usa este backend
+    with open(path, 'r', encoding='utf-8') as f:  # Mismo texto que csv.DictReader
+        try:
+            c = pd.read_csv(f, dtype=str, na_filter=False, usecols=lambda col: col in COLUMNAS_KPIS)
+        except pd.errors.EmptyDataError:
+            c = pd.DataFrame()
+
+    kpis = {
+        'total_contactos': len(c),
+        'con_email': int(_col(c, 'EMAIL_LIMPIO', '').str.strip().ne('').sum()),
+        'con_telefono': int(_col(c, 'CELULAR1', '').str.strip().ne('').sum()),
+        'con_apollo_info': int((_col(c, 'apollo_last_message_id', '').str.strip().ne('') |
+                                _col(c, 'campaña', '').str.strip().ne('')).sum()),
+    }
+
+    estado = _col(c, 'ESTADO')
+    con_estado = _verdadero(estado)
+    estados = _conteo(estado[con_estado].str.strip().str.upper())
+    responsables = _conteo(_col(c, 'Responsable', 'SIN ASIGNAR').str.strip())
+    step = _col(c, 'STEP')
+    steps = _conteo(step[_verdadero(step)].str.strip().str.upper())
+    campana = _col(c, 'campaña')
+    campanas = _conteo(campana[_verdadero(campana) & campana.str.strip().ne('SIN CAMPAÑA')].str.strip())
+    fuente = _col(c, 'Fuente')
+    fuentes = _conteo(fuente[_verdadero(fuente)].str.strip())
+
+    # Contactos por estado: solo los 10 estados mayores y sus 5 primeras filas
+    estado_todos = _col(c, 'ESTADO', 'SIN ESTADO').str.strip().str.upper()
+    por_estado = _primeros(_conteo(estado_todos), 10)
+    detalle = pd.DataFrame({
+        'nombre': _col(c, 'Contacto', 'Sin nombre'),
+        'empresa': _col(c, 'Empresa', 'Sin empresa'),
+        'email': _col(c, 'EMAIL_LIMPIO', ''),
+        'responsable': _col(c, 'Responsable', ''),
+        'step': _col(c, 'STEP', ''),
+        'fecha': _col(c, COLUMNA_FECHA, ''),
+    }, index=c.index)
+    top_5 = detalle.groupby(estado_todos.to_numpy(), sort=False).head(5)
+    estado_top_5 = estado_todos[top_5.index]
+
+    total_con_estado = int(con_estado.sum())
+
+    def tasa(*claves):
+        cantidad = sum(estados.get(k, 0) for k in claves)
+        return cantidad / total_con_estado * 100 if total_con_estado > 0 else 0
+
+    fecha = _col(c, COLUMNA_FECHA)
+    fechas = _conteo(fecha[_verdadero(fecha)])
+
+    dashboard_data = {
+        'timestamp': datetime.now().isoformat(),
+        'kpis_principales': {
+            'Total Contactos': kpis['total_contactos'],
+            'Con Email': kpis['con_email'],
+            'Con Teléfono': kpis['con_telefono'],
+            'En Apollo': kpis['con_apollo_info'],
+        },
+        'estados': _primeros(estados, 10),
+        'responsables': responsables,
+        'steps': _primeros(steps, 10),
+        'campanas': campanas,
+        'fuentes': fuentes,
+        'metricas_conversion': {
+            'Tasa de Interés/Agendados': round(tasa('INTERESADO', 'AGENDADO'), 2),
+            'Tasa de No Contacto': round(tasa('NO CONTESTA', 'APAGADO'), 2),
+            'Tasa de Rechazo': round(tasa('NO INTERESADO'), 2),
+            'Tasa LinkedIn': round(tasa('LINKEDIN'), 2),
+        },
+        'contactos_por_estado': {
+            e: {'cantidad': n, 'top_5': top_5[(estado_top_5 == e).to_numpy()].to_dict('records')}
+            for e, n in por_estado.items()
+        },
+        'timeline': dict(sorted(fechas.items())[:30])
+    }
+    return dashboard_data, total_con_estado
+
+
+def analizar_crm(backend='loop'):
+    """Analiza todos los datos y genera KPIs completos"""
+    if backend == 'pandas':
+        dashboard_data, total_con_estado = kpis_pandas(TABLA_FILE)
+    else:
+        # Leer TablaBase.csv (fuente principal)
+        with open(TABLA_FILE, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            contactos = list(reader)
+        dashboard_data, total_con_estado = kpis_loop(contactos)
+
+    print("="*80)
+    print("ANÁLISIS COMPLETO DEL CRM - GENERANDO KPIS")
+    print("="*80)
+    print(f"Total de contactos en la base: {dashboard_data['kpis_principales']['Total Contactos']}")
 
     # Guardar JSON para el dashboard
     with open('crm_dashboard_data.json', 'w', encoding='utf-8') as f:
@@ -121,20 +245,20 @@ def analizar_crm():
     print("\n" + "="*80)
     print("👥 TOP 5 ESTADOS")
     print("="*80)
-    for estado, cantidad in list(estados.most_common(5)):
+    for estado, cantidad in list(dashboard_data['estados'].items())[:5]:
         porcentaje = (cantidad / total_con_estado * 100) if total_con_estado > 0 else 0
         print(f"{estado:30s}: {cantidad:4d} ({porcentaje:5.1f}%)")
 
     print("\n" + "="*80)
     print("🎯 TOP RESPONSABLES")
     print("="*80)
-    for responsable, cantidad in responsables.most_common(5):
+    for responsable, cantidad in list(dashboard_data['responsables'].items())[:5]:
         print(f"{responsable:30s}: {cantidad:4d} contactos")
 
     print("\n" + "="*80)
     print("📧 CAMPAÑAS ACTIVAS")
     print("="*80)
-    for campana, cantidad in campanas.most_common():
+    for campana, cantidad in dashboard_data['campanas'].items():
         print(f"{campana:50s}: {cantidad:4d} contactos")
 
     print("\n✓ Datos guardados en: crm_dashboard_data.json")
@@ -143,4 +267,8 @@ def analizar_crm():
     return dashboard_data
 
 if __name__ == "__main__":
-    analizar_crm()
+    parser = argparse.ArgumentParser(description="Genera crm_dashboard_data.json")
+    parser.add_argument('--backend', choices=BACKENDS, default='loop',
+                        help="loop: Counters fila a fila; pandas: operaciones por columna")
+    args = parser.parse_args()
+    analizar_crm(args.backend)
@@ -5,75 +5,106 @@ Merge Steps to Base v2 - Fix mapping for steps_apollo_resultado.csv
 
 import csv
 
+import eventos_columnar
+from tabla_store import TablaStore
+
+STEPS_FILE = 'steps_apollo_resultado.csv'
+COLUMNAS_MERGE = ['To Email', 'Sequence', 'Step', 'Task Status', 'Completed Date (PST)', 'Due Date (PST)']
+
+
+def _numero_step(valor):
+    try:
+        return int(valor)
+    except:
+        return 0
+
+
+def steps_desde_snapshot(snapshot):
+    """
+    {email: fila} con el step más alto de cada email (a igualdad, la última
+    fila, como el bucle sobre el CSV), calculado sobre los códigos del
+    snapshot por columnas; solo las filas elegidas se convierten en dict.
+    """
+    np = eventos_columnar.np
+    emails = {}
+    id_por_codigo = np.array([emails.setdefault(v.strip().lower(), len(emails))
+                              for v in snapshot.valores('To Email')], dtype=np.int64)
+    email_id = id_por_codigo[snapshot.codigos('To Email')]
+    step = np.array([_numero_step(v) for v in snapshot.valores('Step')],
+                    dtype=np.int64)[snapshot.codigos('Step')]
+
+    # Orden por (email, step, posición): la última fila de cada email es la elegida
+    orden = np.lexsort((np.arange(snapshot.filas), step, email_id))
+    ultimas = orden[np.append(email_id[orden][1:] != email_id[orden][:-1], True)] if snapshot.filas else orden
+    if '' in emails:
+        ultimas = ultimas[email_id[ultimas] != emails['']]
+    ultimas.sort()  # Orden de fila, como el recorrido del CSV
+
+    return {row['To Email'].strip().lower(): row
+            for row in snapshot.filas_dict(COLUMNAS_MERGE, ultimas)}
+
+
+def steps_desde_csv(path=STEPS_FILE):
+    """{email: fila} con el step más alto de cada email (a igualdad, la última fila)"""
+    steps_por_email = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            email = row.get('To Email', '').strip().lower()
+            if not email:
+                continue
+
+            anterior = steps_por_email.get(email)
+            if anterior is None or _numero_step(row.get('Step', 0)) >= _numero_step(anterior.get('Step', 0)):
+                steps_por_email[email] = row
+    return steps_por_email
+
+
 def merge():
     print("="*80)
     print("MERGING STEPS TO TABLA BASE")
     print("="*80)
 
-    # 1. Leer steps_apollo_resultado.csv
-    steps_por_email = {}
+    # 1. Leer steps_apollo_resultado.csv (o su snapshot por columnas si está al día)
     try:
-        with open('steps_apollo_resultado.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                email = row.get('To Email', '').strip().lower()
-                if not email:
-                    continue
-                
-                try:
-                    current_step = int(row.get('Step', 0))
-                except:
-                    current_step = 0
-                
-                if email not in steps_por_email:
-                    steps_por_email[email] = row
-                else:
-                    try:
-                        existing_step = int(steps_por_email[email].get('Step', 0))
-                    except:
-                        existing_step = 0
-                    if current_step >= existing_step:
-                        steps_por_email[email] = row
-        print(f"Info de Apollo en steps_apollo_resultado.csv: {len(steps_por_email)} emails")
+        snapshot = eventos_columnar.abrir(STEPS_FILE)
+        if snapshot is not None and snapshot.tiene(COLUMNAS_MERGE):
+            steps_por_email = steps_desde_snapshot(snapshot)
+            snapshot.cerrar()
+            origen = eventos_columnar.ruta_snapshot(STEPS_FILE)
+        else:
+            steps_por_email = steps_desde_csv(STEPS_FILE)
+            origen = STEPS_FILE
+        print(f"Info de Apollo en {origen}: {len(steps_por_email)} emails")
     except Exception as e:
         print(f"Error: {e}")
         return
 
-    # 2. Leer TablaBase.csv
+    # 2. Abrir TablaBase (store embebido)
     try:
-        with open('TablaBase.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            contactos = list(reader)
-            fieldnames = reader.fieldnames
+        store = TablaStore()
     except Exception as e:
         print(f"Error: {e}")
         return
 
-    # 3. Actualizar contactos
+    # 3. Actualizar contactos (upsert por email, todo en una transacción)
     actualizados = 0
-    for contacto in contactos:
-        email = contacto.get('EMAIL_LIMPIO', '').strip().lower()
-        if email in steps_por_email:
-            info = steps_por_email[email]
-            
+    with store.transaccion():
+        for email, info in steps_por_email.items():
             # Map correctly based on existing columns in steps_apollo_resultado.csv
-            contacto['campaña'] = info.get('Sequence', '')
-            contacto['step_numero'] = info.get('Step', '')
-            contacto['apollo_status'] = info.get('Task Status', '')
-            contacto['estado_apollo'] = info.get('Task Status', '')
-            contacto['fecha_envio'] = info.get('Completed Date (PST)', '')
-            contacto['fecha_programada'] = info.get('Due Date (PST)', '')
-            
-            # Use Subject as a proxy for message ID if not present
-            # contacto['apollo_last_message_id'] = info.get('Subject', '') 
-            
-            actualizados += 1
+            actualizados += store.actualizar_por_email(email, {
+                'campaña': info.get('Sequence', ''),
+                'step_numero': info.get('Step', ''),
+                'apollo_status': info.get('Task Status', ''),
+                'estado_apollo': info.get('Task Status', ''),
+                'fecha_envio': info.get('Completed Date (PST)', ''),
+                'fecha_programada': info.get('Due Date (PST)', ''),
+                # Use Subject as a proxy for message ID if not present
+                # 'apollo_last_message_id': info.get('Subject', ''),
+            })
 
     # 4. Guardar
-    with open('TablaBase.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(contactos)
+    store.exportar_csv()
 
     print(f"Se actualizaron {actualizados} contactos.")
     print("="*80)
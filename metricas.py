@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Métricas - Contadores, medidores e histogramas en formato Prometheus
+Registro en memoria, thread-safe y sin dependencias. Los servidores lo
+exponen en /metrics; los scripts de sync, que son procesos aparte, vuelcan
+su registro a METRICAS_DIR/<script>.json cada pocos segundos y al salir, y
+el servidor añade esos volcados a su /metrics con la etiqueta `script`.
+Los contadores de un volcado empiezan en cero en cada ejecución del script
+(Prometheus lo trata como un reinicio del contador).
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Configuración
+METRICAS_DIR = os.getenv("METRICAS_DIR", "metricas")
+VOLCADO_SEGUNDOS = 10  # Cada cuánto un script reescribe su volcado
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formatear_valor(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.lock = threading.Lock()
+        self._valores = {}
+
+    def _clave(self, etiquetas: Dict) -> Tuple:
+        return tuple(str(etiquetas.get(e, '')) for e in self.etiquetas)
+
+    def _etiquetas(self, clave: Tuple) -> Dict[str, str]:
+        return dict(zip(self.etiquetas, clave))
+
+    def muestras(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """[(sufijo, etiquetas, valor)] en el orden en que se exponen"""
+        with self.lock:
+            return [('', self._etiquetas(k), v) for k, v in self._valores.items()]
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self.lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+
+class Medidor(_Metrica):
+    tipo = 'gauge'
+
+    def set(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self.lock:
+            self._valores[clave] = valor
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self.lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                serie = self._valores[clave] = [0] * (len(self.buckets) + 1) + [0.0]  # buckets, +Inf, suma
+            serie[bisect.bisect_left(self.buckets, valor)] += 1
+            serie[-1] += valor
+
+    @contextmanager
+    def cronometrar(self, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **etiquetas)
+
+    def muestras(self):
+        resultado = []
+        with self.lock:
+            series = [(self._etiquetas(k), list(v)) for k, v in self._valores.items()]
+        for etiquetas, serie in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float('inf'),), serie):
+                acumulado += n
+                resultado.append(('_bucket', dict(etiquetas, le=_formatear_valor(limite)), acumulado))
+            resultado.append(('_sum', etiquetas, serie[-1]))
+            resultado.append(('_count', etiquetas, acumulado))
+        return resultado
+
+
+class Registro:
+    """Conjunto de métricas de un proceso; pedir dos veces la misma devuelve la misma"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metricas = {}
+
+    def _obtener(self, clase, nombre, *args, **kwargs):
+        with self.lock:
+            metrica = self.metricas.get(nombre)
+            if metrica is None:
+                metrica = self.metricas[nombre] = clase(nombre, *args, **kwargs)
+            return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._obtener(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Medidor:
+        return self._obtener(Medidor, nombre, ayuda, etiquetas)
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                   buckets: Sequence[float] = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._obtener(Histograma, nombre, ayuda, etiquetas, buckets)
+
+    def instantanea(self) -> Dict[str, Dict]:
+        """{nombre: {tipo, ayuda, muestras}}: lo que se vuelca a disco y se expone"""
+        with self.lock:
+            metricas = list(self.metricas.values())
+        return {m.nombre: {'tipo': m.tipo, 'ayuda': m.ayuda, 'muestras': m.muestras()} for m in metricas}
+
+
+REGISTRO = Registro()
+
+
+# ---------- Exposición ----------
+
+def exponer(familias: Dict[str, Dict]) -> str:
+    """Texto de exposición de Prometheus (una cabecera HELP/TYPE por métrica)"""
+    lineas = []
+    for nombre, familia in familias.items():
+        lineas.append(f"# HELP {nombre} {_escapar(familia['ayuda'])}")
+        lineas.append(f"# TYPE {nombre} {familia['tipo']}")
+        for sufijo, etiquetas, valor in familia['muestras']:
+            texto = ','.join(f'{k}="{_escapar(v)}"' for k, v in etiquetas.items())
+            lineas.append(f"{nombre}{sufijo}{{{texto}}} {_formatear_valor(valor)}" if texto
+                          else f"{nombre}{sufijo} {_formatear_valor(valor)}")
+    return '\n'.join(lineas) + '\n'
+
+
+def _fusionar(familias: Dict[str, Dict], otras: Dict[str, Dict], extra: Dict[str, str]):
+    for nombre, familia in otras.items():
+        destino = familias.setdefault(nombre, {'tipo': familia['tipo'], 'ayuda': familia['ayuda'], 'muestras': []})
+        if destino['tipo'] != familia['tipo']:
+            continue  # Mismo nombre con otro tipo: se ignora antes que romper el scrape
+        destino['muestras'] = destino['muestras'] + [
+            (sufijo, dict(etiquetas, **extra), valor) for sufijo, etiquetas, valor in familia['muestras']]
+
+
+def leer_volcados(directorio: str = METRICAS_DIR) -> Iterable[Tuple[str, Dict[str, Dict]]]:
+    """Genera (script, familias) de cada volcado en `directorio`"""
+    try:
+        nombres = sorted(os.listdir(directorio))
+    except FileNotFoundError:
+        return
+    for archivo in nombres:
+        if not archivo.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, archivo), 'r', encoding='utf-8') as f:
+                yield archivo[:-5], json.load(f)
+        except (OSError, ValueError):
+            continue  # Volcado a medio escribir o ilegible: se omite en este scrape
+
+
+def exponer_todo(registro: Registro = REGISTRO, directorio: Optional[str] = METRICAS_DIR) -> str:
+    """Métricas del proceso más las volcadas por los scripts (etiqueta script=...)"""
+    familias = registro.instantanea()
+    if directorio:
+        for script, volcado in leer_volcados(directorio):
+            _fusionar(familias, volcado, {'script': script})
+    return exponer(familias)
+
+
+# ---------- Volcado desde scripts ----------
+
+def volcar(script: str, registro: Registro = REGISTRO, directorio: str = METRICAS_DIR):
+    """Escribe el registro en directorio/<script>.json (atómico: el servidor puede estar leyendo)"""
+    registro.medidor('metricas_volcado_timestamp_seconds',
+                     "Momento del último volcado de métricas del script").set(time.time())
+    os.makedirs(directorio, exist_ok=True)
+    destino = os.path.join(directorio, f"{script}.json")
+    tmp = f"{destino}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(registro.instantanea(), f, ensure_ascii=False)
+    os.replace(tmp, destino)
+
+
+def iniciar_volcado(script: str, registro: Registro = REGISTRO, directorio: str = METRICAS_DIR,
+                    cada: float = VOLCADO_SEGUNDOS):
+    """Vuelca cada `cada` segundos en un hilo de fondo y una última vez al salir"""
+    def bucle():
+        while True:
+            time.sleep(cada)
+            try:
+                volcar(script, registro, directorio)
+            except OSError as e:
+                print(f"⚠️  No se pudieron volcar las métricas: {e}")
+
+    threading.Thread(target=bucle, name=f"metricas-{script}", daemon=True).start()
+    atexit.register(volcar, script, registro, directorio)
+
+
+# ---------- Métricas compartidas ----------
+
+APOLLO_PETICIONES = REGISTRO.contador(
+    'apollo_requests_total', "Peticiones a la API de Apollo", ('endpoint', 'status'))
+APOLLO_DURACION = REGISTRO.histograma(
+    'apollo_request_duration_seconds', "Latencia de las peticiones a Apollo", ('endpoint',))
+APOLLO_429 = REGISTRO.contador(
+    'apollo_rate_limited_total', "Respuestas 429 de Apollo", ('endpoint',))
+APOLLO_REINTENTOS = REGISTRO.contador(
+    'apollo_retries_total', "Reintentos de una operación contra Apollo", ('motivo',))
+APOLLO_CUOTA = REGISTRO.medidor(
+    'apollo_quota_remaining', "Peticiones restantes según las cabeceras de Apollo", ('ventana',))
+APOLLO_CACHE = REGISTRO.contador(
+    'apollo_cache_lookups_total', "Consultas a la caché local de Apollo", ('endpoint', 'resultado'))
+
+HTTP_DURACION = REGISTRO.histograma(
+    'http_request_duration_seconds', "Latencia de las peticiones HTTP por ruta", ('metodo', 'ruta', 'status'))
+HTTP_BYTES = REGISTRO.histograma(
+    'http_response_size_bytes', "Tamaño del cuerpo de las respuestas HTTP", ('ruta',), BUCKETS_BYTES)
+DASHBOARD_CACHE = REGISTRO.contador(
+    'dashboard_cache_lookups_total', "Lecturas del payload del dashboard (hit o recarga desde disco)",
+    ('resultado',))
+DASHBOARD_BYTES = REGISTRO.medidor(
+    'dashboard_payload_bytes', "Tamaño del payload del dashboard en memoria", ('encoding',))
+ENGINE_DURACION = REGISTRO.histograma(
+    'crm_engine_duration_seconds', "Duración de un cálculo del dashboard", ('modo',))
@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 """
 Script para obtener los steps de Apollo de cada contacto en la base de datos
+Las filas se escriben en steps_apollo_resultado.csv.tmp y cada contacto
+terminado se anota en un diario (sync_journal) con el tamaño del .tmp en ese
+momento. Si la pasada se corta, la siguiente recorta el .tmp a lo último
+anotado y sigue desde ahí, sin volver a pedir los historiales ya escritos.
 """
 
 import csv
-import requests
 import json
+import os
 import time
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from datetime import datetime
 
-# Configuración de Apollo API
-APOLLO_API_KEY = "_KzNd14cLtj4Mpjj7RsJJw"
-APOLLO_API_ENDPOINT = "https://api.apollo.io/api/v1/emailer_messages/search"
+import eventos_columnar
+import metricas
+from apollo_client import ApolloError, get_client
+from sync_journal import SyncJournal
+
+# Configuración
+JOURNAL_FILE = 'obtener_steps_apollo.journal.jsonl'  # Contactos ya escritos en el .tmp de la pasada en curso
 
 def leer_base_datos(archivo_csv: str) -> List[Dict]:
     """Lee el archivo CSV con la base de datos de contactos"""
@@ -23,36 +31,29 @@ def leer_base_datos(archivo_csv: str) -> List[Dict]:
             contactos.append(row)
     return contactos
 
-def buscar_steps_apollo(email: str, contact_name: str, empresa: str) -> List[Dict]:
-    """Busca los steps de un contacto en Apollo usando la API"""
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    # Intentar buscar por email
-    payload = {
-        'email_address': email
-    }
-
-    try:
-        response = requests.post(APOLLO_API_ENDPOINT, headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            data = response.json()
-            messages = data.get('emailer_messages', [])
-            print(f"✓ {contact_name} ({empresa}): {len(messages)} steps encontrados")
-            return messages
-        elif response.status_code == 429:
-            print(f"⚠ Rate limit alcanzado, esperando 60 segundos...")
-            time.sleep(60)
-            return buscar_steps_apollo(email, contact_name, empresa)
-        else:
-            print(f"✗ Error {response.status_code} para {contact_name} ({email}): {response.text}")
-            return []
-    except Exception as e:
-        print(f"✗ Excepción para {contact_name} ({email}): {str(e)}")
-        return []
+def buscar_steps_apollo(email: str, contact_name: str, empresa: str) -> Iterator[Dict]:
+    """Genera los steps de un contacto en Apollo (todas las páginas, en streaming)"""
+    entregados = 0
+    while True:
+        try:
+            # Tras un 429 se vuelve a recorrer, saltando los mensajes ya entregados
+            for n, msg in enumerate(get_client().emailer_messages_paginas(email)):
+                if n >= entregados:
+                    entregados += 1
+                    yield msg
+            print(f"✓ {contact_name} ({empresa}): {entregados} steps encontrados")
+            return
+        except ApolloError as e:
+            if e.status_code == 429:
+                print(f"⚠ Rate limit alcanzado, esperando 60 segundos...")
+                metricas.APOLLO_REINTENTOS.inc(motivo='429')
+                time.sleep(60)
+                continue
+            print(f"✗ Error {e.status_code} para {contact_name} ({email}): {e.response.text}")
+            return
+        except Exception as e:
+            print(f"✗ Excepción para {contact_name} ({email}): {str(e)}")
+            return
 
 def formatear_fecha(fecha_str: Optional[str]) -> str:
     """Formatea una fecha de Apollo al formato deseado"""
@@ -66,10 +67,8 @@ def formatear_fecha(fecha_str: Optional[str]) -> str:
     except:
         return fecha_str
 
-def convertir_a_formato_deseado(messages: List[Dict], contacto: Dict) -> List[Dict]:
-    """Convierte los mensajes de Apollo al formato deseado del CSV"""
-    rows = []
-
+def convertir_a_formato_deseado(messages: Iterator[Dict], contacto: Dict) -> Iterator[Dict]:
+    """Convierte los mensajes de Apollo al formato deseado del CSV (uno a uno)"""
     contact_name = contacto.get('Contacto', '')
     empresa = contacto.get('Empresa', '')
 
@@ -148,9 +147,35 @@ def convertir_a_formato_deseado(messages: List[Dict], contacto: Dict) -> List[Di
             'fecha_envio': formatear_fecha(msg.get('sent_at'))
         }
 
-        rows.append(row)
-
-    return rows
+        yield row
+
+def clave_contacto(posicion: int, email: str) -> str:
+    """Clave del diario: posición + email (un email repetido en la hoja escribe sus filas otra vez)"""
+    return f"{posicion}|{email.strip().lower()}"
+
+def abrir_salida(tmp_file: str, fieldnames: List[str], claves: List[str]):
+    """
+    Abre el .tmp para escribir: (diario, archivo, writer, steps ya escritos).
+    Si el diario es de esta misma lista de contactos y el .tmp llega hasta lo
+    anotado, se reanuda; si no, se empieza de cero.
+    """
+    journal = SyncJournal(JOURNAL_FILE)
+    hechos = journal.hechos.values()
+    offset = max((r['offset'] for r in hechos), default=0)
+    if (len(journal) and set(journal.hechos) <= set(claves)
+            and os.path.exists(tmp_file) and os.path.getsize(tmp_file) >= offset):
+        os.truncate(tmp_file, offset)  # Filas de un contacto a medias cuando se cortó
+        print(f"   Reanudando pasada anterior: {len(journal)} contactos ya escritos ({JOURNAL_FILE})")
+        f = open(tmp_file, 'a', newline='', encoding='utf-8')
+        return journal, f, csv.DictWriter(f, fieldnames=fieldnames), sum(r['steps'] for r in hechos)
+
+    if len(journal):
+        journal.completar()  # Diario de otra lista de contactos o sin su .tmp: no sirve
+        journal = SyncJournal(JOURNAL_FILE)
+    f = open(tmp_file, 'w', newline='', encoding='utf-8')
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    writer.writeheader()
+    return journal, f, writer, 0
 
 def main():
     print("="*80)
@@ -166,55 +191,63 @@ def main():
     contactos_con_email = [c for c in contactos if c.get('EMAIL_LIMPIO', '').strip()][:400]
     print(f"   Contactos con email (limitado a 400 para muestra): {len(contactos_con_email)}")
 
-    # Obtener steps de Apollo
+    # Obtener steps de Apollo y escribirlos según llegan (archivo temporal,
+    # se sustituye el resultado anterior solo si hubo steps)
     print("\n2. Obteniendo steps de Apollo...")
-    todas_las_filas = []
-
-    for i, contacto in enumerate(contactos_con_email, 1):
-        email = contacto.get('EMAIL_LIMPIO', '').strip()
-        contact_name = contacto.get('Contacto', 'Sin nombre')
-        empresa = contacto.get('Empresa', 'Sin empresa')
-
-        print(f"\n   [{i}/{len(contactos_con_email)}] Procesando: {contact_name} - {empresa}")
-
-        # Buscar steps en Apollo
-        messages = buscar_steps_apollo(email, contact_name, empresa)
-
-        # Convertir al formato deseado
-        if messages:
-            filas = convertir_a_formato_deseado(messages, contacto)
-            todas_las_filas.extend(filas)
-            print(f"       → {len(filas)} steps agregados")
-        else:
-            print(f"       → Sin steps encontrados")
-
-        # Pequeña pausa para no saturar la API
-        time.sleep(0.5)
+    output_file = 'steps_apollo_resultado.csv'
+    tmp_file = f"{output_file}.tmp"
+    fieldnames = [
+        'Type', 'Task Assignee', 'Task Status', 'Contact Name', 'Priority',
+        'Due Date (PST)', 'Completed Date (PST)', 'Sequence', 'Step', 'Template',
+        'From Email', 'To Email', 'Subject', 'Email Body', 'Call Purpose',
+        'Call Disposition', 'Task Note', 'Email Note', 'Task Created From',
+        'Contact Stage', 'Account',
+        # Campos adicionales
+        'apollo_step_id', 'contacto', 'campaña', 'step_numero', 'step_nombre',
+        'accion_humana', 'estado_apollo', 'fecha_programada', 'fecha_envio'
+    ]
+    claves = [clave_contacto(i, c.get('EMAIL_LIMPIO', '').strip()) for i, c in enumerate(contactos_con_email, 1)]
+    journal, f, writer, total_steps = abrir_salida(tmp_file, fieldnames, claves)
+
+    with f:
+        for i, contacto in enumerate(contactos_con_email, 1):
+            clave = claves[i - 1]
+            if clave in journal:
+                continue
+            email = contacto.get('EMAIL_LIMPIO', '').strip()
+            contact_name = contacto.get('Contacto', 'Sin nombre')
+            empresa = contacto.get('Empresa', 'Sin empresa')
+
+            print(f"\n   [{i}/{len(contactos_con_email)}] Procesando: {contact_name} - {empresa}")
+
+            # Buscar steps en Apollo y convertirlos al formato deseado
+            messages = buscar_steps_apollo(email, contact_name, empresa)
+            n = 0
+            for fila in convertir_a_formato_deseado(messages, contacto):
+                writer.writerow(fila)
+                n += 1
+            total_steps += n
+            f.flush()  # Las filas llegan al SO antes que su registro en el diario
+            journal.registrar(clave, steps=n, offset=f.tell())
+
+            if n:
+                print(f"       → {n} steps agregados")
+            else:
+                print(f"       → Sin steps encontrados")
 
     # Guardar el archivo CSV
     print(f"\n3. Generando archivo CSV...")
-    print(f"   Total de steps encontrados: {len(todas_las_filas)}")
-
-    if todas_las_filas:
-        output_file = 'steps_apollo_resultado.csv'
-        fieldnames = [
-            'Type', 'Task Assignee', 'Task Status', 'Contact Name', 'Priority',
-            'Due Date (PST)', 'Completed Date (PST)', 'Sequence', 'Step', 'Template',
-            'From Email', 'To Email', 'Subject', 'Email Body', 'Call Purpose',
-            'Call Disposition', 'Task Note', 'Email Note', 'Task Created From',
-            'Contact Stage', 'Account',
-            # Campos adicionales
-            'apollo_step_id', 'contacto', 'campaña', 'step_numero', 'step_nombre',
-            'accion_humana', 'estado_apollo', 'fecha_programada', 'fecha_envio'
-        ]
-
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(todas_las_filas)
+    print(f"   Total de steps encontrados: {total_steps}")
 
+    journal.completar()
+    if total_steps:
+        os.replace(tmp_file, output_file)
         print(f"   ✓ Archivo guardado: {output_file}")
+        if eventos_columnar.NUMPY:
+            eventos_columnar.escribir_snapshot(output_file)
+            print(f"   ✓ Snapshot por columnas: {eventos_columnar.ruta_snapshot(output_file)}")
     else:
+        os.remove(tmp_file)
         print("   ⚠ No se encontraron steps para generar el archivo")
 
     print("\n" + "="*80)
@@ -222,4 +255,5 @@ def main():
     print("="*80)
 
 if __name__ == "__main__":
+    metricas.iniciar_volcado('obtener_steps_apollo')
     main()
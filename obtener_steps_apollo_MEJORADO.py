@@ -5,14 +5,11 @@ Usa el método GET correcto y hace llamadas más específicas
 """
 
 import csv
-import requests
 import json
-import time
 from typing import List, Dict, Optional
 from datetime import datetime
 
-# Configuración de Apollo API
-APOLLO_API_KEY = "_KzNd14cLtj4Mpjj7RsJJw"
+from apollo_client import get_client
 
 def leer_base_datos(archivo_csv: str) -> List[Dict]:
     """Lee el archivo CSV con la base de datos de contactos"""
@@ -28,33 +25,23 @@ def obtener_steps_por_contact_id(contact_email: str) -> Optional[Dict]:
     Obtiene steps usando el endpoint GET correcto
     Primero necesitamos buscar el contact_id
     """
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    # Endpoint 1: Buscar el contacto por email para obtener su ID
-    people_url = "https://api.apollo.io/api/v1/people/match"
-    people_payload = {
-        "email": contact_email
-    }
+    client = get_client()
 
     try:
+        # Endpoint 1: Buscar el contacto por email para obtener su ID
         print(f"   Buscando contact ID para {contact_email}...")
-        response = requests.post(people_url, headers=headers, json=people_payload, timeout=30)
+        response = client.people_match(contact_email)
 
         if response.status_code == 200:
             contact_data = response.json()
-            person = contact_data.get('person', {})
+            person = contact_data.get('person') or {}
             contact_id = person.get('id')
 
             if contact_id:
                 print(f"   ✓ Contact ID encontrado: {contact_id}")
 
                 # Endpoint 2: Ahora obtener sus emailer_messages usando GET
-                messages_url = f"https://api.apollo.io/api/v1/contacts/{contact_id}/emailer_touches"
-
-                response2 = requests.get(messages_url, headers=headers, timeout=30)
+                response2 = client.get(f"contacts/{contact_id}/emailer_touches")
 
                 if response2.status_code == 200:
                     touches_data = response2.json()
@@ -62,12 +49,11 @@ def obtener_steps_por_contact_id(contact_email: str) -> Optional[Dict]:
                 elif response2.status_code == 404:
                     # Probar endpoint alternativo
                     print(f"   Probando endpoint alternativo...")
-                    alt_url = "https://api.apollo.io/api/v1/emailer_messages/search"
                     params = {
                         "contact_ids[]": contact_id,
                         "per_page": 100
                     }
-                    response3 = requests.get(alt_url, headers=headers, params=params, timeout=30)
+                    response3 = client.get("emailer_messages/search", params)
 
                     if response3.status_code == 200:
                         return response3.json()
@@ -96,16 +82,9 @@ def obtener_steps_por_sequence_id(sequence_id: str, contact_email: str) -> Optio
     """
     Obtiene los steps de una secuencia específica para un contacto
     """
-    headers = {
-        'X-Api-Key': APOLLO_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
-    # Endpoint para obtener estadísticas de una secuencia específica
-    url = f"https://api.apollo.io/api/v1/emailer_campaigns/{sequence_id}/contact_export"
-
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        # Endpoint para obtener estadísticas de una secuencia específica
+        response = get_client().get(f"emailer_campaigns/{sequence_id}/contact_export")
 
         if response.status_code == 200:
             return response.json()
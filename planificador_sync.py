@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Planificador de Sync - Qué contactos refrescar con la cuota disponible
+Puntúa cada contacto por lo desactualizado que está (apollo_last_sync_at
+frente a la vida útil de sus datos), su actividad en secuencia
+(apollo_status, step_numero) y su etapa en el pipeline (ESTADO), y devuelve
+los N más urgentes. Así cada hora de cuota va a los contactos cuyos datos
+más probablemente cambiaron, no solo a los que nunca se sincronizaron.
+Uso: python planificador_sync.py --cupo 50
+"""
+
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from tabla_store import TablaStore
+
+# Vida útil de los datos según la actividad en Apollo (horas)
+HORAS_SECUENCIA_ACTIVA = 24        # En secuencia: el estado cambia a diario
+HORAS_SIN_SECUENCIA = 72
+HORAS_SECUENCIA_TERMINADA = 7 * 24
+NUNCA_SINCRONIZADO = 10.0  # Desactualización asignada a un contacto sin sync (= 10 vidas útiles)
+
+ESTADOS_APOLLO_ACTIVOS = {'scheduled', 'active', 'paused', 'sent', 'opened', 'clicked'}
+ESTADOS_APOLLO_TERMINADOS = {'finished', 'completed', 'bounced', 'unsubscribed', 'failed', 'replied'}
+
+# Peso por etapa del pipeline (ESTADO de la hoja)
+PESO_ESTADO = {
+    'INTERESADO': 3.0,
+    'AGENDADO': 3.0,
+    'REPROGRAMADO': 2.0,
+    'NO INTERESADO': 0.3,
+    'NO PERFIL': 0.3,
+    'CERRADO': 0.3,
+}
+PESO_ESTADO_DEFAULT = 1.0
+PESO_SECUENCIA_ACTIVA = 1.5
+
+
+def _fecha(valor: str) -> Optional[datetime]:
+    if not valor:
+        return None
+    try:
+        dt = datetime.fromisoformat(valor.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def estado_apollo(contacto: Dict) -> str:
+    return (contacto.get('apollo_status') or contacto.get('estado_apollo') or '').strip().lower()
+
+
+def en_secuencia(contacto: Dict) -> bool:
+    estado = estado_apollo(contacto)
+    if estado in ESTADOS_APOLLO_TERMINADOS:
+        return False
+    return estado in ESTADOS_APOLLO_ACTIVOS or bool(str(contacto.get('step_numero', '')).strip())
+
+
+def vida_util_horas(contacto: Dict) -> float:
+    if en_secuencia(contacto):
+        return HORAS_SECUENCIA_ACTIVA
+    if estado_apollo(contacto) in ESTADOS_APOLLO_TERMINADOS:
+        return HORAS_SECUENCIA_TERMINADA
+    return HORAS_SIN_SECUENCIA
+
+
+def desactualizacion(contacto: Dict, ahora: datetime) -> float:
+    """Vidas útiles transcurridas desde el último sync (>= 1: toca refrescar)"""
+    ultimo = _fecha(contacto.get('apollo_last_sync_at', ''))
+    if ultimo is None:
+        return NUNCA_SINCRONIZADO
+    horas = max(0.0, (ahora - ultimo).total_seconds() / 3600)
+    return horas / vida_util_horas(contacto)
+
+
+def puntuar(contacto: Dict, ahora: Optional[datetime] = None) -> float:
+    """Urgencia de refresco; 0 si no tiene email o sus datos aún están vigentes"""
+    if not contacto.get('EMAIL_LIMPIO', '').strip():
+        return 0.0
+    ratio = desactualizacion(contacto, ahora or datetime.now())
+    if ratio < 1:
+        return 0.0
+    peso = PESO_ESTADO.get(contacto.get('ESTADO', '').strip().upper(), PESO_ESTADO_DEFAULT)
+    if en_secuencia(contacto):
+        peso *= PESO_SECUENCIA_ACTIVA
+    return ratio * peso
+
+
+def planificar(contactos: List[Dict], cupo: Optional[int] = None,
+               ahora: Optional[datetime] = None) -> List[Dict]:
+    """
+    Contactos a refrescar, del más urgente al menos (empates: orden de la hoja).
+    `cupo` limita la lista a las llamadas disponibles; None = todos los que tocan.
+    """
+    ahora = ahora or datetime.now()
+    puntuados = [(puntuar(c, ahora), i, c) for i, c in enumerate(contactos)]
+    elegidos = sorted((p for p in puntuados if p[0] > 0), key=lambda p: (-p[0], p[1]))
+    if cupo is not None:
+        elegidos = elegidos[:max(0, cupo)]
+    return [c for _, _, c in elegidos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan de refresco de contactos por urgencia")
+    parser.add_argument('--cupo', type=int, default=20, help="Contactos a mostrar")
+    args = parser.parse_args()
+
+    contactos = TablaStore().cargar()
+    ahora = datetime.now()
+    plan = planificar(contactos, args.cupo, ahora)
+
+    print("="*80)
+    print(f"PLAN DE SYNC - {len(planificar(contactos, None, ahora))} contactos por refrescar, mostrando {len(plan)}")
+    print("="*80)
+    for c in plan:
+        print(f"{puntuar(c, ahora):7.2f}  {c.get('ESTADO', '') or '-':<14} {estado_apollo(c) or '-':<10} "
+              f"{c.get('apollo_last_sync_at', '')[:16] or 'nunca':<16}  {c.get('EMAIL_LIMPIO', '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Sync Jobs - Cola persistente (SQLite) de sincronizaciones con Apollo
+Cada POST /api/sync/apollo crea un job con id. Un solo job corre a la vez
+(la cuota de Apollo es de la cuenta), el script de sync reporta su progreso
+por contacto y consulta si le pidieron cancelar. Como el estado vive en
+disco, sobrevive a reinicios y es el mismo para todos los workers de uvicorn:
+un job 'ejecutando' sin latido reciente vuelve a 'pendiente' y se reanuda.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Configuración
+DB_FILE = os.getenv("SYNC_JOBS_DB_FILE", "sync_jobs.sqlite3")
+STALE_SECONDS = 120  # Sin latido durante este tiempo = proceso muerto, se reanuda
+SALIDA_MAX = 8000  # Caracteres de salida del script guardados por job
+
+PENDIENTE = 'pendiente'
+EJECUTANDO = 'ejecutando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+CANCELADO = 'cancelado'
+TERMINALES = (COMPLETADO, ERROR, CANCELADO)
+
+
+class SyncJobs:
+    """Acceso thread-safe (y multi-proceso, vía SQLite) a la tabla de jobs"""
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                estado TEXT NOT NULL,
+                limite INTEGER NOT NULL,
+                total INTEGER,
+                procesados INTEGER NOT NULL DEFAULT 0,
+                errores INTEGER NOT NULL DEFAULT 0,
+                procesados_inicio INTEGER NOT NULL DEFAULT 0,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                cancelar INTEGER NOT NULL DEFAULT 0,
+                creado_en REAL NOT NULL,
+                iniciado_en REAL,
+                latido_en REAL,
+                terminado_en REAL,
+                error TEXT,
+                salida TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_estado ON jobs (estado, creado_en)")
+
+    @contextmanager
+    def _transaccion(self):
+        """BEGIN IMMEDIATE: bloquea escritores de otros procesos mientras se decide"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    # ---------- API del servidor ----------
+
+    def crear(self, limite: int) -> Dict:
+        job_id = uuid.uuid4().hex[:12]
+        with self._transaccion() as conn:
+            conn.execute("INSERT INTO jobs (id, estado, limite, creado_en) VALUES (?, ?, ?, ?)",
+                         (job_id, PENDIENTE, limite, time.time()))
+        return self.obtener(job_id)
+
+    def tomar_siguiente(self) -> Optional[Dict]:
+        """Pasa el job pendiente más antiguo a 'ejecutando' si no hay otro corriendo"""
+        ahora = time.time()
+        with self._transaccion() as conn:
+            conn.execute("UPDATE jobs SET estado = ?, latido_en = NULL WHERE estado = ? AND latido_en < ?",
+                         (PENDIENTE, EJECUTANDO, ahora - STALE_SECONDS))
+            if conn.execute("SELECT 1 FROM jobs WHERE estado = ?", (EJECUTANDO,)).fetchone():
+                return None
+            row = conn.execute("SELECT id FROM jobs WHERE estado = ? ORDER BY creado_en LIMIT 1",
+                               (PENDIENTE,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("""
+                UPDATE jobs SET estado = ?, iniciado_en = ?, latido_en = ?,
+                       procesados_inicio = procesados, intentos = intentos + 1
+                WHERE id = ?
+            """, (EJECUTANDO, ahora, ahora, row['id']))
+        return self.obtener(row['id'])
+
+    def latido(self, job_id: str, salida: Optional[str] = None):
+        """Marca el job como vivo (y guarda la cola de la salida del script)"""
+        with self._transaccion() as conn:
+            if salida is None:
+                conn.execute("UPDATE jobs SET latido_en = ? WHERE id = ?", (time.time(), job_id))
+            else:
+                conn.execute("UPDATE jobs SET latido_en = ?, salida = ? WHERE id = ?",
+                             (time.time(), salida[-SALIDA_MAX:], job_id))
+
+    def solicitar_cancelacion(self, job_id: str) -> Optional[Dict]:
+        """Un job pendiente se cancela ya; uno en curso se detiene tras el contacto actual"""
+        with self._transaccion() as conn:
+            conn.execute("UPDATE jobs SET estado = ?, terminado_en = ? WHERE id = ? AND estado = ?",
+                         (CANCELADO, time.time(), job_id, PENDIENTE))
+            conn.execute("UPDATE jobs SET cancelar = 1 WHERE id = ? AND estado = ?", (job_id, EJECUTANDO))
+        return self.obtener(job_id)
+
+    def terminar(self, job_id: str, estado: str, error: Optional[str] = None):
+        """Estado final; no pisa uno ya terminal (el script puede cerrarlo antes)"""
+        with self._transaccion() as conn:
+            conn.execute("""
+                UPDATE jobs SET estado = ?, error = COALESCE(?, error), terminado_en = ?, latido_en = ?
+                WHERE id = ? AND estado NOT IN (?, ?, ?)
+            """, (estado, error, time.time(), time.time(), job_id, *TERMINALES))
+
+    def obtener(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _con_metricas(dict(row)) if row else None
+
+    def listar(self, n: int = 20) -> List[Dict]:
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY creado_en DESC LIMIT ?", (n,)).fetchall()
+        return [_con_metricas(dict(r)) for r in rows]
+
+    # ---------- API del script de sync ----------
+
+    def restantes(self, job_id: str) -> int:
+        """Contactos que faltan para cumplir el límite (al reanudar tras un reinicio)"""
+        job = self.obtener(job_id)
+        return max(0, job['limite'] - job['procesados']) if job else 0
+
+    def fijar_total(self, job_id: str, pendientes: int):
+        with self._transaccion() as conn:
+            conn.execute("UPDATE jobs SET total = procesados + ?, latido_en = ? WHERE id = ?",
+                         (pendientes, time.time(), job_id))
+
+    def avanzar(self, job_id: str, error: bool = False) -> bool:
+        """Cuenta un contacto procesado. Devuelve True si hay que cancelar"""
+        with self._transaccion() as conn:
+            conn.execute("""
+                UPDATE jobs SET procesados = procesados + 1, errores = errores + ?, latido_en = ?
+                WHERE id = ?
+            """, (int(error), time.time(), job_id))
+            row = conn.execute("SELECT cancelar FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancelar'])
+
+    def cancelacion_solicitada(self, job_id: str) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT cancelar FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancelar'])
+
+    def cerrar(self):
+        self.conn.close()
+
+
+def _con_metricas(job: Dict) -> Dict:
+    """Añade progreso, ritmo (contactos/min) y ETA calculados a partir de los contadores"""
+    total = job['total'] if job['total'] is not None else job['limite']
+    hechos_ahora = job['procesados'] - job['procesados_inicio']
+    ritmo = None
+    eta = None
+    if job['estado'] == EJECUTANDO and job['iniciado_en'] and hechos_ahora > 0:
+        transcurrido = max(time.time() - job['iniciado_en'], 1e-6)
+        ritmo = hechos_ahora / transcurrido
+        eta = max(0, total - job['procesados']) / ritmo
+    job['cancelar'] = bool(job['cancelar'])
+    job['progreso'] = round(job['procesados'] / total * 100, 1) if total else 0.0
+    job['contactos_por_minuto'] = round(ritmo * 60, 2) if ritmo else None
+    job['eta_segundos'] = round(eta, 1) if eta is not None else None
+    return job
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Sync Journal - Diario append-only (JSONL) de contactos procesados
+Cada script de sync escribe una línea por contacto terminado y hace fsync
+por lotes. Al arrancar relee el diario y se salta los emails ya hechos, así
+que tras un crash o un corte por rate limit se reanuda sin volver a gastar
+cuota. Cuando la pasada termina completa, el diario se vacía.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+# Configuración
+FSYNC_EVERY = 25  # Registros entre fsync (flush al SO en cada uno)
+
+
+def _email(email: str) -> str:
+    return (email or '').strip().lower()
+
+
+class SyncJournal:
+    """Diario de una pasada de sync: {email: registro} + escritura append-only"""
+
+    def __init__(self, path: str, fsync_every: int = FSYNC_EVERY):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.lock = threading.Lock()
+        self.hechos = self._releer()
+        self._pendientes_fsync = 0
+        self._f = open(path, 'a', encoding='utf-8')
+
+    def _releer(self) -> Dict[str, Dict]:
+        hechos = {}
+        if not os.path.exists(self.path):
+            return hechos
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    continue  # Última línea a medias tras un crash
+                hechos[registro['email']] = registro
+        return hechos
+
+    def __contains__(self, email: str) -> bool:
+        return _email(email) in self.hechos
+
+    def __len__(self) -> int:
+        return len(self.hechos)
+
+    def obtener(self, email: str) -> Optional[Dict]:
+        return self.hechos.get(_email(email))
+
+    def registrar(self, email: str, ok: bool = True, **datos):
+        """Anota un contacto terminado (no llamar para los cortados por rate limit)"""
+        registro = {'email': _email(email), 'ok': ok, 'ts': datetime.now().isoformat(), **datos}
+        linea = json.dumps(registro, ensure_ascii=False) + '\n'
+        with self.lock:
+            self._f.write(linea)
+            self._f.flush()
+            self.hechos[registro['email']] = registro
+            self._pendientes_fsync += 1
+            if self._pendientes_fsync >= self.fsync_every:
+                os.fsync(self._f.fileno())
+                self._pendientes_fsync = 0
+
+    def sincronizar(self):
+        with self.lock:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._pendientes_fsync = 0
+
+    def cerrar(self):
+        with self.lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+    def completar(self):
+        """La pasada terminó entera: se borra el diario (la próxima empieza de cero)"""
+        self.cerrar()
+        self.hechos = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Tabla Store - Almacenamiento embebido (SQLite) de TablaBase.csv
+Upserts por contacto y commits transaccionales en lugar de reescribir el CSV
+completo en cada checkpoint. El CSV sigue siendo el formato de intercambio:
+si alguien lo edita a mano se reimporta al abrir el store, y cada script lo
+exporta (de forma atómica) al terminar. Los campos escritos desde el último
+import/export quedan anotados como pendientes: si el CSV cambió en disco antes
+de exportarlos (p.ej. un sync que murió a medias), se reaplican sobre el CSV
+reimportado en vez de perderse.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterable, List
+
+# Configuración
+DB_FILE = os.getenv("TABLA_DB_FILE", "TablaBase.sqlite3")
+CSV_FILE = 'TablaBase.csv'
+
+
+def _firma_archivo(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+class TablaStore:
+    """
+    Contactos indexados por EMAIL_LIMPIO.
+    Cada fila conserva su posición original (`fila`), porque la hoja tiene
+    contactos distintos que comparten email.
+    """
+
+    def __init__(self, db_path: str = DB_FILE, csv_path: str = CSV_FILE):
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS contactos (
+                fila INTEGER PRIMARY KEY,
+                email TEXT NOT NULL,
+                datos TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_email ON contactos (email)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        # Campos escritos y aún no exportados al CSV, por fila (nuevo=1: fila añadida por upsert)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pendientes (
+                fila INTEGER PRIMARY KEY,
+                email TEXT NOT NULL,
+                campos TEXT NOT NULL,
+                nuevo INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._filas = {}  # id(dict) -> fila, para los contactos entregados por cargar()
+        self._en_transaccion = False
+        self.sincronizar_desde_csv()
+
+    # ---------- meta ----------
+
+    def _meta(self, clave: str, default=None):
+        row = self.conn.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, clave: str, valor):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (clave, json.dumps(valor, ensure_ascii=False)))
+
+    @property
+    def fieldnames(self) -> List[str]:
+        return self._meta('fieldnames', [])
+
+    def agregar_columnas(self, columnas: Iterable[str]):
+        """Añade columnas nuevas al final (como hacía enrichment con fieldnames.append)"""
+        fieldnames = self.fieldnames
+        nuevas = [c for c in columnas if c not in fieldnames]
+        if nuevas:
+            self._set_meta('fieldnames', fieldnames + nuevas)
+
+    # ---------- CSV ----------
+
+    def sincronizar_desde_csv(self):
+        """
+        Reimporta el CSV si la base está vacía o el CSV cambió desde el último
+        import/export, reaplicando encima los cambios pendientes de exportar
+        """
+        if not os.path.exists(self.csv_path):
+            return
+        vacia = self.conn.execute("SELECT COUNT(*) FROM contactos").fetchone()[0] == 0
+        if not vacia and self._meta('csv_firma') == _firma_archivo(self.csv_path):
+            return
+        pendientes = self.conn.execute("SELECT fila, email, campos, nuevo FROM pendientes ORDER BY fila").fetchall()
+        with self.transaccion():
+            self.importar_csv()
+            if pendientes:
+                self._reaplicar(pendientes)
+
+    def _reaplicar(self, pendientes):
+        """
+        Cambios sin exportar sobre el CSV recién importado: en la misma fila si
+        conserva el email, si no en las filas con ese email; las filas nuevas
+        van al final. Los de contactos que ya no están en el CSV se pierden.
+        """
+        reaplicados = perdidos = 0
+        for fila, email, campos, nuevo in pendientes:
+            campos = json.loads(campos)
+            self.agregar_columnas(campos)
+            if nuevo:
+                self._insertar(campos)
+                reaplicados += 1
+                continue
+            misma = self.conn.execute("SELECT 1 FROM contactos WHERE fila = ? AND email = ?",
+                                      (fila, email)).fetchone()
+            if misma:
+                self._actualizar_fila(fila, campos)
+                tocadas = 1
+            else:
+                tocadas = self.actualizar_por_email(email, campos) if email else 0
+            if tocadas:
+                reaplicados += 1
+            else:
+                perdidos += 1
+        print(f"⚠️  {self.csv_path} cambió en disco con {len(pendientes)} filas sin exportar: "
+              f"{reaplicados} reaplicadas, {perdidos} perdidas (su contacto ya no está en el CSV)")
+
+    def importar_csv(self, path: str = None):
+        path = path or self.csv_path
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            filas = [(i, row.get('EMAIL_LIMPIO', '').strip().lower(), json.dumps(row, ensure_ascii=False))
+                     for i, row in enumerate(reader)]
+            fieldnames = list(reader.fieldnames or [])
+
+        with self.transaccion():
+            self.conn.execute("DELETE FROM contactos")
+            self.conn.execute("DELETE FROM pendientes")
+            self.conn.executemany("INSERT INTO contactos VALUES (?, ?, ?)", filas)
+            self._set_meta('fieldnames', fieldnames)
+            self._set_meta('csv_firma', _firma_archivo(path))
+        self._filas.clear()
+
+    def exportar_csv(self, path: str = None):
+        """Escribe el CSV completo de forma atómica (archivo temporal + os.replace)"""
+        path = path or self.csv_path
+        fieldnames = self.fieldnames
+        directorio = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix='.TablaBase.', suffix='.csv.tmp', dir=directorio)
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                for (datos,) in self.conn.execute("SELECT datos FROM contactos ORDER BY fila"):
+                    row = json.loads(datos)
+                    writer.writerow({k: row.get(k, '') for k in fieldnames})
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if path == self.csv_path:
+            with self.transaccion():
+                self._set_meta('csv_firma', _firma_archivo(path))
+                self.conn.execute("DELETE FROM pendientes")
+
+    # ---------- contactos ----------
+
+    def cargar(self) -> List[Dict]:
+        """Devuelve todos los contactos en el orden de la hoja"""
+        fieldnames = self.fieldnames
+        contactos = []
+        self._filas.clear()
+        for fila, datos in self.conn.execute("SELECT fila, datos FROM contactos ORDER BY fila"):
+            row = json.loads(datos)
+            contacto = {k: row.get(k, '') for k in fieldnames}
+            self._filas[id(contacto)] = fila
+            contactos.append(contacto)
+        return contactos
+
+    def buscar_por_email(self, email: str) -> List[Dict]:
+        return [json.loads(datos) for (datos,) in self.conn.execute(
+            "SELECT datos FROM contactos WHERE email = ? ORDER BY fila", (email.strip().lower(),))]
+
+    def _anotar_pendiente(self, fila: int, email: str, campos: Dict, nuevo: bool = False):
+        """Acumula los campos escritos en la fila hasta el próximo import/export"""
+        row = self.conn.execute("SELECT campos, nuevo FROM pendientes WHERE fila = ?", (fila,)).fetchone()
+        if row:
+            campos = dict(json.loads(row[0]), **campos)
+            nuevo = bool(row[1])
+        self.conn.execute("INSERT OR REPLACE INTO pendientes VALUES (?, ?, ?, ?)",
+                          (fila, email, json.dumps(campos, ensure_ascii=False), int(nuevo)))
+
+    def _insertar(self, contacto: Dict) -> int:
+        email = contacto.get('EMAIL_LIMPIO', '').strip().lower()
+        cur = self.conn.execute("INSERT INTO contactos (email, datos) VALUES (?, ?)",
+                                (email, json.dumps(contacto, ensure_ascii=False)))
+        self._anotar_pendiente(cur.lastrowid, email, dict(contacto), nuevo=True)
+        return cur.lastrowid
+
+    def _actualizar_fila(self, fila: int, campos: Dict):
+        (datos,) = self.conn.execute("SELECT datos FROM contactos WHERE fila = ?", (fila,)).fetchone()
+        row = json.loads(datos)
+        cambios = {k: v for k, v in campos.items() if row.get(k) != v}
+        if not cambios:
+            return
+        row.update(cambios)
+        email = row.get('EMAIL_LIMPIO', '').strip().lower()
+        self.conn.execute("UPDATE contactos SET email = ?, datos = ? WHERE fila = ?",
+                          (email, json.dumps(row, ensure_ascii=False), fila))
+        self._anotar_pendiente(fila, email, cambios)
+
+    def upsert(self, contacto: Dict):
+        """Guarda un contacto: actualiza su fila si vino de cargar(), si no lo añade al final"""
+        fila = self._filas.get(id(contacto))
+        if fila is None:
+            self._filas[id(contacto)] = self._insertar(contacto)
+        else:
+            self._actualizar_fila(fila, contacto)
+
+    def upsert_many(self, contactos: Iterable[Dict]):
+        """Guarda varios contactos en una sola transacción"""
+        with self.transaccion():
+            for contacto in contactos:
+                self.upsert(contacto)
+
+    def actualizar_por_email(self, email: str, campos: Dict) -> int:
+        """Aplica `campos` a todas las filas con ese email. Devuelve cuántas se tocaron"""
+        email = email.strip().lower()
+        filas = self.conn.execute("SELECT fila FROM contactos WHERE email = ?", (email,)).fetchall()
+        for (fila,) in filas:
+            self._actualizar_fila(fila, campos)
+        return len(filas)
+
+    @contextmanager
+    def transaccion(self):
+        """Agrupa escrituras en un commit; si algo falla no queda nada a medias"""
+        if self._en_transaccion:
+            yield
+            return
+        self._en_transaccion = True
+        self.conn.execute("BEGIN")
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._en_transaccion = False
+
+    def cerrar(self):
+        self.conn.close()
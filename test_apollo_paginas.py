@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test de ApolloClient.emailer_messages_paginas sin red
+Sustituye emailer_messages_search por un stub que responde cada página con
+un mensaje que lleva su número y comprueba que el generador devuelve todas
+las páginas de 1 a total_pages exactamente una vez y en orden, también con
+más páginas que max_workers + 1, y que cada página se pide una sola vez.
+Uso: python test_apollo_paginas.py   (o con pytest)
+Devuelve 1 si algún caso falla.
+"""
+
+import sys
+import threading
+from collections import Counter
+
+from apollo_client import ApolloClient
+
+
+class RespuestaStub:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class ClienteStub(ApolloClient):
+    """ApolloClient cuyo emailer_messages_search no sale a la red"""
+
+    def __init__(self, total_pages):
+        super().__init__(api_key='stub')
+        self.total_pages = total_pages
+        self.pedidas = Counter()
+        self._lock = threading.Lock()
+
+    def emailer_messages_search(self, email, page=None, per_page=None, timeout=None, refrescar=False):
+        with self._lock:
+            self.pedidas[page] += 1
+        return RespuestaStub({'emailer_messages': [{'id': f"{email}-{page}", 'pagina': page}],
+                              'pagination': {'page': page, 'total_pages': self.total_pages}})
+
+
+def paginas_devueltas(total_pages, max_workers):
+    cliente = ClienteStub(total_pages)
+    paginas = [m['pagina'] for m in cliente.emailer_messages_paginas('a@b.com', max_workers=max_workers)]
+    return paginas, cliente.pedidas
+
+
+def test_todas_las_paginas_una_vez():
+    for max_workers in (1, 2, 4):
+        for total_pages in (1, 2, max_workers + 1, max_workers + 2, 8, 25):
+            paginas, pedidas = paginas_devueltas(total_pages, max_workers)
+            esperadas = list(range(1, total_pages + 1))
+            assert paginas == esperadas, f"total_pages={total_pages} max_workers={max_workers}: {paginas}"
+            assert pedidas == Counter(esperadas), f"total_pages={total_pages} max_workers={max_workers}: {pedidas}"
+
+
+def test_corte_del_consumidor():
+    cliente = ClienteStub(20)
+    generador = cliente.emailer_messages_paginas('a@b.com', max_workers=3)
+    primeras = [next(generador)['pagina'] for _ in range(5)]
+    generador.close()
+    assert primeras == [1, 2, 3, 4, 5]
+    assert all(n == 1 for n in cliente.pedidas.values())
+
+
+def main():
+    fallos = 0
+    for test in (test_todas_las_paginas_una_vez, test_corte_del_consumidor):
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            fallos += 1
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test de paridad de los backends 'loop' y 'pandas'
+Calcula con los dos backends el dashboard de crm_engine (kpis_v2,
+steps_metrics, counts y feeds) y los KPIs de generar_kpis (conteos y tasas
+de conversión) sobre una copia de los CSV reales y sobre datasets
+sintéticos pequeños con semilla fija (generar_datos_sinteticos), y exige el
+mismo JSON, incluido el orden de las claves. crm_engine se compara leyendo
+el historial del CSV y, si numpy está instalado, también del snapshot por
+columnas. Sin argumentos tarda unos segundos; los tiempos de cada backend
+los mide benchmark_pipeline.
+Uso: python test_paridad_backends.py [--escalas 200 2000] [--seeds 0 1 2]   (o con pytest)
+Devuelve 1 si algún caso no coincide.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+import crm_engine
+import eventos_columnar
+import generar_kpis
+from generar_datos_sinteticos import STEPS_FILE, TABLA_FILE, generar, perfilar
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+ESCALAS = (200, 2000)  # Contactos de cada dataset sintético
+SEEDS = (0, 1, 2)
+
+
+def primera_diferencia(a, b, ruta='$'):
+    """Ruta del primer valor distinto entre a y b (el orden de las claves cuenta); None si son iguales"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        if list(a) != list(b):
+            return f"{ruta} (claves: {list(a)[:5]}... vs {list(b)[:5]}...)"
+        for k in a:
+            diferencia = primera_diferencia(a[k], b[k], f"{ruta}.{k}")
+            if diferencia:
+                return diferencia
+        return None
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return f"{ruta} (longitud {len(a)} vs {len(b)})"
+        for i, (x, y) in enumerate(zip(a, b)):
+            diferencia = primera_diferencia(x, y, f"{ruta}[{i}]")
+            if diferencia:
+                return diferencia
+        return None
+    if type(a) is not type(b) or a != b:
+        return f"{ruta} ({a!r} vs {b!r})"
+    return None
+
+
+def _silencioso(funcion, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcion(*args, **kwargs)
+
+
+def _sin_timestamp(data):
+    data = dict(data)
+    data.pop('timestamp', None)
+    return data
+
+
+def comparar_motor(directorio):
+    tabla = os.path.join(directorio, TABLA_FILE)
+    steps = os.path.join(directorio, STEPS_FILE)
+    resultados = [_sin_timestamp(_silencioso(crm_engine.calcular_dashboard, tabla, steps, backend=backend))
+                  for backend in crm_engine.BACKENDS]
+    return primera_diferencia(*resultados)
+
+
+def comparar_kpis(directorio):
+    tabla = os.path.join(directorio, TABLA_FILE)
+    with open(tabla, 'r', encoding='utf-8') as f:
+        data_loop, total_loop = _silencioso(generar_kpis.kpis_loop, list(csv.DictReader(f)))
+    data_pandas, total_pandas = _silencioso(generar_kpis.kpis_pandas, tabla)
+    diferencia = primera_diferencia(_sin_timestamp(data_loop), _sin_timestamp(data_pandas))
+    if diferencia is None and total_loop != total_pandas:
+        diferencia = f"total_con_estado ({total_loop} vs {total_pandas})"
+    return diferencia
+
+
+def comparar_directorio(nombre, directorio):
+    """Casos de un directorio con TablaBase.csv y el historial: [(caso, script, diferencia)]"""
+    casos = [(nombre, 'crm_engine', comparar_motor(directorio))]
+    if eventos_columnar.NUMPY:
+        eventos_columnar.escribir_snapshot(os.path.join(directorio, STEPS_FILE))
+        casos.append((f"{nombre}+snapshot", 'crm_engine', comparar_motor(directorio)))
+    casos.append((nombre, 'generar_kpis', comparar_kpis(directorio)))
+    return casos
+
+
+def copiar_reales(destino):
+    """Copia de los CSV del repo (el snapshot no se escribe junto a los reales)"""
+    os.makedirs(destino)
+    for nombre in (TABLA_FILE, STEPS_FILE):
+        shutil.copy2(os.path.join(DIRECTORIO, nombre), destino)
+    return destino
+
+
+def casos_sinteticos(tmp, escalas=ESCALAS, seeds=SEEDS):
+    """Genera un dataset por escala y semilla: [(nombre, directorio)]"""
+    perfil = perfilar(os.path.join(DIRECTORIO, TABLA_FILE), os.path.join(DIRECTORIO, STEPS_FILE))
+    directorios = []
+    for escala in escalas:
+        for seed in seeds:
+            destino = os.path.join(tmp, f'sintetico_{escala}_s{seed}')
+            generar(destino, escala, seed=seed, perfil=perfil)
+            directorios.append((f"sintetico_{escala}_s{seed}", destino))
+    return directorios
+
+
+def _sin_diferencias(directorios):
+    fallos = [f"{caso} {script}: {diferencia}" for nombre, directorio in directorios
+              for caso, script, diferencia in comparar_directorio(nombre, directorio) if diferencia is not None]
+    assert not fallos, "\n".join(fallos)
+
+
+def test_paridad_reales():
+    with tempfile.TemporaryDirectory() as tmp:
+        _sin_diferencias([('real', copiar_reales(os.path.join(tmp, 'real')))])
+
+
+def test_paridad_sinteticos():
+    with tempfile.TemporaryDirectory() as tmp:
+        _sin_diferencias(casos_sinteticos(tmp))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad de los backends loop y pandas")
+    parser.add_argument('--escalas', type=int, nargs='*', default=list(ESCALAS),
+                        help="Contactos de cada dataset sintético")
+    parser.add_argument('--seeds', type=int, nargs='+', default=list(SEEDS))
+    parser.add_argument('--sin-real', action='store_true', help="No comparar sobre los CSV del repo")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("PARIDAD DE BACKENDS (loop vs pandas)")
+    print("="*80)
+    fallos = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        directorios = [] if args.sin_real else [('real', copiar_reales(os.path.join(tmp, 'real')))]
+        if args.escalas:
+            directorios += casos_sinteticos(tmp, args.escalas, args.seeds)
+
+        for nombre, directorio in directorios:
+            for caso, script, diferencia in comparar_directorio(nombre, directorio):
+                print(f"{caso:<28} {script:<14} {'✓' if diferencia is None else '❌'}")
+                if diferencia is not None:
+                    print(f"   ↳ primera diferencia: {diferencia}")
+                    fallos += 1
+
+    print("="*80)
+    print(f"❌ {fallos} casos distintos" if fallos else "✓ Los dos backends dan el mismo resultado")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())